@@ -24,7 +24,7 @@ options:
   state:
     description:
     - "'present' authenticates the node while 'absent' will remove the node authentification"
-    - "node from which this is run is (de)authenticated agains the node specified in 'node_name'"
+    - "node from which this is run is (de)authenticated agains the node specified in 'node_name' or nodes specified in 'node_names'"
     required: false
     default: present
     choices: [ 'present', 'absent' ]
@@ -32,8 +32,16 @@ options:
   node_name:
     description:
       - hostname of node for authentication
-    required: true
+      - Mutually exclusive with C(node_names)
+    required: false
     type: str
+  node_names:
+    description:
+      - "list of hostnames of nodes for authentication, all nodes that are not authenticated are (de)authenticated with one 'pcs' command"
+      - Mutually exclusive with C(node_name)
+    required: false
+    type: list
+    elements: str
   username:
     description:
       - "username of 'cluster user' for cluster authentication"
@@ -45,9 +53,21 @@ options:
       - "password of 'cluster user' for cluster authentication"
     required: false
     type: str
+  check_timeout:
+    description:
+      - "timeout in seconds for checking the token of node with 'pcsd' on the node, all nodes are checked concurrently"
+    required: false
+    default: 5
+    type: int
 notes:
   - This module is (de)authenticating nodes only 1-way == authenticating node 1 agains
     node 2 doesn't mean that node 2 is authenticated agains node 1!
+  - "Nodes without token in '/var/lib/pcsd/known-hosts' ('/var/lib/pcsd/tokens' with pcs-0.9) are authenticated
+    without contacting them first. Token of other nodes is checked concurrently with request to '/remote/check_auth'
+    of 'pcsd' on the node (port 2224 unless other port is in the file) and nodes that don't accept the token are
+    authenticated again. Module fails without authenticating any node when some node doesn't respond within I(check_timeout)
+    or its 'pcsd' responds with error other than 401 or 403.
+    Authenticated nodes are reported in 'authorized_nodes' and de-authenticated nodes in 'deauthorized_nodes'."
   - Tested on CentOS 6.8, 7.3
   - Tested on Red Hat Enterprise Linux 7.3, 7.4, 7.6
   - Experimental support for Red Hat Enterprise Linux 8.0 Beta and pcs 0.10
@@ -61,9 +81,8 @@ EXAMPLES = '''
 
 - name: authorize all nodes in ansible play to each other
   pcs_auth:
-    node_name: "{{ hostvars[item]['ansible_hostname'] }}"
+    node_names: "{{ play_hosts | map('extract', hostvars, 'ansible_hostname') | list }}"
     password: 'testtest'
-  with_items: "{{ play_hosts }}"
 
 - name: de-authorize all nodes from each other in ansible play
   pcs_auth:
@@ -75,23 +94,75 @@ EXAMPLES = '''
 
 import os.path
 import json
+import threading
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.urls import open_url
+
+PCSD_PORT = 2224
+
+
+def token_destination(pcs_version, tokens_data, node):
+    """Return (token, address, port) of node from tokens_data, token is None when node has no token."""
+    if pcs_version == '0.9':
+        return tokens_data['tokens'].get(node), node, tokens_data.get('ports', {}).get(node) or PCSD_PORT
+    host = tokens_data['known_hosts'].get(node) or {}
+    dest_list = host.get('dest_list') or [{}]
+    return host.get('token'), dest_list[0].get('addr') or node, dest_list[0].get('port') or PCSD_PORT
+
+
+def check_auth(node, address, port, token, timeout, results):
+    """Check token of node with pcsd on the node - runs concurrently for all nodes."""
+    if ':' in address:
+        address = '[%s]' % address
+    try:
+        # pcsd uses self-signed certificate by default
+        open_url('https://%s:%s/remote/check_auth' % (address, port), method='GET', headers={'Cookie': 'token=' + token},
+                 validate_certs=False, timeout=timeout)
+        results[node] = 'authorized'
+    except HTTPError as e:
+        # 401 for unknown or expired token, other codes come from pcsd that is not working properly
+        results[node] = 'unauthorized' if e.code in [401, 403] else 'error'
+    except Exception:
+        results[node] = 'unreachable'
+
+
+def check_auth_nodes(pcs_version, tokens_data, nodes, timeout):
+    """Return dictionary with node name as key and 'authorized', 'unauthorized', 'unreachable' or 'error' as value."""
+    results = {}
+    threads = []
+    for node in nodes:
+        token, address, port = token_destination(pcs_version, tokens_data, node)
+        thread = threading.Thread(target=check_auth, args=(node, address, port, token, timeout, results))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
 
 
 def run_module():
     module = AnsibleModule(
         argument_spec=dict(
             state=dict(default="present", choices=['present', 'absent']),
-            node_name=dict(required=True),
+            node_name=dict(required=False),
+            node_names=dict(required=False, type='list', elements='str'),
             username=dict(required=False, default="hacluster"),
-            password=dict(required=False, no_log=True)
+            password=dict(required=False, no_log=True),
+            check_timeout=dict(required=False, default=5, type='int'),
         ),
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_one_of=[('node_name', 'node_names')],
+        mutually_exclusive=[('node_name', 'node_names')],
     )
 
     state = module.params['state']
-    node_name = module.params['node_name']
+    node_names = [module.params['node_name']] if module.params['node_name'] else []
+    for node in module.params['node_names'] or []:
+        if node not in node_names:
+            node_names.append(node)
 
     if state == 'present' and not module.params['password']:
         module.fail_json(msg="Missing password parameter needed for authorizing the node")
@@ -109,65 +180,71 @@ def run_module():
     else:
         module.fail_json(msg="pcs --version exited with non-zero exit code (" + rc + "): " + out + err)
 
+    if pcs_version not in ['0.9', '0.10', '0.11', '0.12']:
+        module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
+
+    # tokens are read only once for all nodes
+    tokens_data = None
+    tokens = {}
     if os.path.isfile('/var/lib/pcsd/tokens') and pcs_version == '0.9':
         tokens_file = open('/var/lib/pcsd/tokens', 'r+')
         # load JSON tokens
         tokens_data = json.load(tokens_file)
-        result['tokens_data'] = tokens_data['tokens']
+        tokens = tokens_data['tokens']
+        result['tokens_data'] = tokens
     if os.path.isfile('/var/lib/pcsd/known-hosts') and pcs_version in ['0.10', '0.11', '0.12']:
         tokens_file = open('/var/lib/pcsd/known-hosts', 'r+')
         # load JSON tokens
         tokens_data = json.load(tokens_file)
-        result['tokens_data'] = tokens_data['known_hosts']
+        tokens = tokens_data['known_hosts']
+        result['tokens_data'] = tokens
 
-    if pcs_version in ['0.9', '0.10', '0.11']:
-        rc, out, err = module.run_command('pcs cluster pcsd-status %(node_name)s' % module.params)
-    elif pcs_version in ['0.12']:
-        rc, out, err = module.run_command('pcs pcsd status %(node_name)s' % module.params)
-
-    if state == 'present' and rc != 0:
-        # WARNING: this will also consider nodes to which we cannot connect as unauthorized
-        result['changed'] = True
-        if not module.check_mode:
+    if state == 'present':
+        # nodes without token are authorized right away, nodes with token are authorized again when pcsd on them doesn't accept the token
+        nodes_to_auth = [node for node in node_names if node not in tokens]
+        nodes_with_token = [node for node in node_names if node in tokens]
+        if nodes_with_token:
+            # all nodes are checked at once so unreachable nodes cost only one timeout
+            result['token_check'] = check_auth_nodes(pcs_version, tokens_data, nodes_with_token, module.params['check_timeout'])
+            unreachable_nodes = [node for node in nodes_with_token if result['token_check'][node] == 'unreachable']
+            if unreachable_nodes:
+                module.fail_json(msg="pcsd on nodes %s is not reachable within %s seconds" % (', '.join(unreachable_nodes), module.params['check_timeout']),
+                                 **result)
+            error_nodes = [node for node in nodes_with_token if result['token_check'][node] == 'error']
+            if error_nodes:
+                module.fail_json(msg="pcsd on nodes %s failed to check the token" % ', '.join(error_nodes), **result)
+            nodes_to_auth.extend(node for node in nodes_with_token if result['token_check'][node] != 'authorized')
+        result['authorized_nodes'] = [node for node in node_names if node in nodes_to_auth]
+        result['changed'] = len(nodes_to_auth) > 0
+        if nodes_to_auth and not module.check_mode:
+            auth_params = dict(module.params, node_list=' '.join(result['authorized_nodes']))
             if pcs_version == '0.9':
-                cmd_auth = 'pcs cluster auth %(node_name)s -u %(username)s -p %(password)s --local' % module.params
-            elif pcs_version in ['0.10', '0.11', '0.12']:
-                cmd_auth = 'pcs host auth %(node_name)s -u %(username)s -p %(password)s' % module.params
+                cmd_auth = 'pcs cluster auth %(node_list)s -u %(username)s -p %(password)s --local' % auth_params
             else:
-                module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
+                cmd_auth = 'pcs host auth %(node_list)s -u %(username)s -p %(password)s' % auth_params
             rc, out, err = module.run_command(cmd_auth)
-            if rc == 0:
-                module.exit_json(**result)
-            else:
-                module.fail_json(msg="Failed to authenticate node using command '" + cmd_auth + "'", output=out, error=err)
-
-    elif (state == 'absent' and tokens_data and (
-            (pcs_version == '0.9' and node_name in tokens_data['tokens']) or
-            (pcs_version in ['0.10', '0.11', '0.12'] and node_name in tokens_data['known_hosts'])
-    )):
-        result['changed'] = True
-        if not module.check_mode:
+            if rc != 0:
+                module.fail_json(msg="Failed to authenticate nodes using command '" + cmd_auth + "'", output=out, error=err)
+
+    else:
+        nodes_to_deauth = [node for node in node_names if node in tokens]
+        result['deauthorized_nodes'] = nodes_to_deauth
+        result['changed'] = len(nodes_to_deauth) > 0
+        if nodes_to_deauth and not module.check_mode:
             if pcs_version == '0.9':
-                del tokens_data['tokens'][node_name]
-                del tokens_data['ports'][node_name]
+                for node in nodes_to_deauth:
+                    del tokens_data['tokens'][node]
+                    tokens_data['ports'].pop(node, None)
                 tokens_data['data_version'] += 1
                 # write the change into token file
                 tokens_file.seek(0)
                 json.dump(tokens_data, tokens_file, indent=4)
                 tokens_file.truncate()
-            elif pcs_version in ['0.10', '0.11', '0.12']:
-                cmd_deauth = 'pcs host deauth %(node_name)s' % module.params
-                rc, out, err = module.run_command(cmd_deauth)
-                if rc == 0:
-                    module.exit_json(**result)
-                else:
-                    module.fail_json(msg="Failed to de-authenticate node using command '" + cmd_deauth + "'", output=out, error=err)
             else:
-                module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
-
-    else:
-        result['changed'] = False
-        module.exit_json(**result)
+                cmd_deauth = 'pcs host deauth ' + ' '.join(nodes_to_deauth)
+                rc, out, err = module.run_command(cmd_deauth)
+                if rc != 0:
+                    module.fail_json(msg="Failed to de-authenticate nodes using command '" + cmd_deauth + "'", output=out, error=err)
 
     # END of module
     module.exit_json(**result)
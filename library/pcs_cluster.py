@@ -16,7 +16,7 @@ DOCUMENTATION = '''
 ---
 author: "Ondrej Famera (@OndrejHome)"
 module: pcs_cluster
-short_description: "wrapper module for 'pcs cluster setup/destroy/node add/node remove'"
+short_description: "wrapper module for 'pcs cluster setup/destroy/start/node add/node remove'"
 description:
   - "module for creating/destroying/extending/shrinking clusters using 'pcs' utility"
 version_added: "2.4"
@@ -24,10 +24,11 @@ options:
   state:
     description:
       - "'present' - ensure that cluster exists"
+      - "'started' - ensure that cluster exists and it is running on all nodes from I(node_list)"
       - "'absent' - ensure cluster doesn't exist"
     required: false
     default: present
-    choices: ['present', 'absent']
+    choices: ['present', 'started', 'absent']
     type: str
   node_list:
     description:
@@ -44,6 +45,18 @@ options:
       - sets time in milliseconds until a token loss is declared after not receiving a token
     required: false
     type: int
+  totem:
+    description:
+      - "dictionary of totem options (for example 'token', 'consensus', 'join', 'token_retransmits_before_loss_const')"
+      - "Options are used when creating the cluster. On existing cluster the options are compared with 'totem' section
+         of corosync.conf and changed ones are updated with 'pcs cluster config update' (pcs-0.10.8 and newer) followed
+         by 'pcs cluster reload corosync' when all changed options can be reloaded at runtime."
+      - "When changed option cannot be reloaded (for example 'cluster_name' or crypto options) the result
+         contains 'restart_required=true' and cluster needs to be restarted to use the new value."
+      - "With pcs-0.9 only 'token', 'join', 'consensus', 'miss_count_const', 'fail_recv_const' and 'token_coefficient'
+         are supported and only when creating the cluster."
+    required: false
+    type: dict
   transport:
     description:
       - "'default' - use default transport protocol ('udp' in CentOS/RHEL 6, 'udpu' in CentOS/RHEL 7), 'knet' in Fedora 29"
@@ -59,6 +72,47 @@ options:
       - "additional options for transports (available only with pcs-0.10), this option can be used only when `transport` option is specified (non-default)"
     required: false
     type: str
+  link_mode:
+    description:
+      - "knet link mode (pcs-0.10 and newer, only with knet transport)"
+      - "On existing cluster the knet options are changed with 'pcs cluster config update' (pcs-0.10.8 and newer) followed
+         by 'pcs cluster reload corosync', changed crypto or compression options require restart of the cluster."
+    required: false
+    choices: ['passive', 'active', 'rr']
+    type: str
+  knet_compression_model:
+    description:
+      - "knet compression model, for example 'zlib', 'lz4' or 'none' (pcs-0.10 and newer, only with knet transport)"
+    required: false
+    type: str
+  knet_compression_threshold:
+    description:
+      - "minimal size of packet in bytes that is compressed (pcs-0.10 and newer, only with knet transport)"
+    required: false
+    type: int
+  crypto_cipher:
+    description:
+      - "knet crypto cipher (pcs-0.10 and newer, only with knet transport)"
+    required: false
+    choices: ['none', 'aes256', 'aes192', 'aes128']
+    type: str
+  crypto_hash:
+    description:
+      - "knet crypto hash (pcs-0.10 and newer, only with knet transport)"
+    required: false
+    choices: ['none', 'md5', 'sha1', 'sha256', 'sha384', 'sha512']
+    type: str
+  knet_links:
+    description:
+      - "list of knet links, each link is dictionary with 'linknumber', optional 'addresses' (dictionary with node name
+         as key and link address as value) and optional 'options' (dictionary of link options like 'link_priority')"
+      - "When creating cluster only 'options' are used, addresses are taken from I(node_list)."
+      - "On existing cluster missing links are added ('pcs cluster link add'), links with different addresses or options
+         are updated ('pcs cluster link update', pcs-0.10.3 and newer) and links that are not listed are removed
+         ('pcs cluster link delete'), adding and removing links requires pcs-0.10.2 or newer."
+    required: false
+    type: list
+    elements: dict
   allowed_node_changes:
     description:
       - "'none' - node list must match existing cluster if cluster should be present"
@@ -68,6 +122,31 @@ options:
     required: false
     choices: ['none', 'add', 'remove']
     type: str
+  standby_timeout:
+    description:
+      - "timeout in seconds for waiting on resources to move away from nodes that are put into standby before their removal from cluster"
+    required: false
+    default: 300
+    type: int
+  prepare_timeout:
+    description:
+      - "timeout in seconds for checking reachability of 'pcsd' on nodes that are going to be added to cluster"
+    required: false
+    default: 5
+    type: int
+  enabled:
+    description:
+      - "'true' - ensure that cluster is started on boot on all nodes ('pcs cluster enable --all')"
+      - "'false' - ensure that cluster is not started on boot on any node ('pcs cluster disable --all')"
+      - "When not specified the start on boot is not changed."
+    required: false
+    type: bool
+  start_timeout:
+    description:
+      - "timeout in seconds for waiting on cluster to become quorate with all nodes online after starting it with I(state=started)"
+    required: false
+    default: 300
+    type: int
 notes:
    - Tested on CentOS 6.8, 6.9, 7.3, 7.4, 7.5
    - Tested on Red Hat Enterprise Linux 7.3, 7.4, 7.6
@@ -76,6 +155,18 @@ notes:
      themselves may not remove all needed cluster information
      - https://bugzilla.redhat.com/show_bug.cgi?id=1360882"
    - redundant link support tested on CentOS 7.8 with 2 links and on CentOS 8.2 with 3 links and knet
+   - "All missing nodes are added in one run. Before adding any node, the addresses of all new nodes are resolved,
+     reachability of 'pcsd' on them is checked and their authorization is verified concurrently. Nodes are then added
+     one after another and result of each addition is reported in 'added_nodes'."
+   - "All nodes that should be removed are removed in one run. Module first checks that cluster will stay quorate
+     (votes of remaining online nodes and connected qdevice against expected votes, 'two_node' and 'expected_votes'
+     from quorum section of corosync.conf are honoured, 'last_man_standing' and 'auto_tie_breaker' are not supported),
+     then puts all online nodes that are removed into standby at once, waits for resources to move away and removes
+     offline nodes first and online nodes after them, checking the quorum before each removal. Result of each removal is reported in 'removed_nodes'."
+   - "With I(state=started) the cluster is started on all nodes at once ('pcs cluster start --all') when it is not quorate
+      or some node from I(node_list) is not online. Module then checks 'corosync-quorumtool -s' and 'crm_node -l' with
+      increasing delay until cluster is quorate and all nodes are online and reports the waiting time in 'time_to_quorum'."
+   - "Whether cluster starts on boot is detected on node where module runs."
 '''
 
 EXAMPLES = '''
@@ -85,6 +176,14 @@ EXAMPLES = '''
     cluster_name: 'test-cluster'
   run_once: True
 
+- name: Setup cluster, start it on all nodes on boot and wait until it is quorate with all nodes online
+  pcs_cluster:
+    node_list: "{% for item in play_hosts %}{{ hostvars[item]['ansible_hostname'] }} {% endfor %}"
+    cluster_name: 'test-cluster'
+    state: 'started'
+    enabled: true
+  run_once: True
+
 - name: Create cluster with totem token timeout of 5000 ms and UDP unicast transport protocol
   pcs_cluster:
     node_list: "{% for item in play_hosts %}{{ hostvars[item]['ansible_hostname'] }} {% endfor %}"
@@ -93,6 +192,16 @@ EXAMPLES = '''
     transport: 'udpu'
   run_once: True
 
+- name: Change totem timings of existing cluster without restarting it
+  pcs_cluster:
+    node_list: "{% for item in play_hosts %}{{ hostvars[item]['ansible_hostname'] }} {% endfor %}"
+    cluster_name: 'test-cluster'
+    totem:
+      token: 5000
+      consensus: 6000
+      join: 100
+  run_once: True
+
 - name: Create cluster with redundant corosync links
   pcs_cluster:
     cluster_name: 'test-cluster'
@@ -112,6 +221,28 @@ EXAMPLES = '''
     transport_options: link_mode=passive link linknumber=0 transport=udp link_priority=1 link linknumber=1 transport=udp link_priority=2'
   run_once: True
 
+- name: Tune knet transport of existing cluster and add third link
+  pcs_cluster:
+    node_list: 'node1 node2'
+    cluster_name: 'test-cluster'
+    link_mode: 'passive'
+    knet_compression_model: 'lz4'
+    knet_compression_threshold: 100
+    knet_links:
+      - linknumber: 0
+        options:
+          link_priority: 10
+      - linknumber: 1
+        options:
+          link_priority: 5
+      - linknumber: 2
+        addresses:
+          node1: '192.168.3.11'
+          node2: '192.168.3.12'
+        options:
+          link_priority: 1
+  run_once: True
+
 - name: Add new nodes to existing cluster
   pcs_cluster:
     node_list: 'existing-node-1 existing-node-2 new-node-3 new-node-4'
@@ -133,22 +264,355 @@ EXAMPLES = '''
     state: 'absent'
 '''
 
+import json
 import os.path
 import re
+import socket
+import threading
+import time
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.corosync_conf import (
+    CorosyncConfParseError,
+    get_nodes,
+    get_options,
+    get_quorum_device,
+    load_corosync_conf,
+)
+from ansible.module_utils.pcs_utils import (
+    get_pcs_version,
+    version_tuple,
+)
+
+PCSD_PORT = 2224
+# first pcs version with 'pcs cluster config update'
+PCS_CONFIG_UPDATE_VERSION = (0, 10, 8)
+# first pcs versions with 'pcs cluster link add/delete' and 'pcs cluster link update'
+PCS_LINK_ADD_VERSION = (0, 10, 2)
+PCS_LINK_UPDATE_VERSION = (0, 10, 3)
+# totem options that 'pcs cluster setup' of pcs-0.9 accepts as '--<option>'
+PCS09_TOTEM_OPTIONS = ['token', 'join', 'consensus', 'miss_count_const', 'fail_recv_const', 'token_coefficient']
+# totem options that corosync can't change at runtime
+TOTEM_RESTART_OPTIONS = ['cluster_name', 'version', 'transport', 'ip_version', 'secauth', 'crypto_cipher', 'crypto_hash',
+                         'crypto_model', 'netmtu', 'knet_compression_model', 'knet_compression_threshold', 'knet_compression_level']
+
+
+def update_totem(module, result, current_totem):
+    """Update changed totem options of existing cluster in place."""
+    requested = dict((key, str(value)) for key, value in module.params['totem'].items())
+    changes = dict((key, value) for key, value in requested.items() if current_totem.get(key) != value)
+    result['detected_totem'] = get_options(current_totem)
+    result['changed_totem'] = changes
+    if not changes:
+        return
+    pcs_version = get_pcs_version(module)
+    if version_tuple(pcs_version) < PCS_CONFIG_UPDATE_VERSION:
+        module.fail_json(msg="pcs-%s can't change totem options of existing cluster, pcs-0.10.8 or newer is required" % pcs_version, **result)
+    result['changed'] = True
+    result['restart_required'] = any(key in TOTEM_RESTART_OPTIONS for key in changes)
+    if module.check_mode:
+        return
+    cmds = ['pcs cluster config update totem ' + ' '.join('%s=%s' % (key, value) for key, value in sorted(changes.items()))]
+    if not result['restart_required']:
+        cmds.append('pcs cluster reload corosync')
+    for cmd in cmds:
+        rc, out, err = module.run_command(cmd)
+        if rc != 0:
+            module.fail_json(msg="Failed to update totem options using command '" + cmd + "'", output=out, error=err, **result)
+
+
+def get_authorized_nodes(pcs_version):
+    """Return set of nodes to which local 'pcs' is authorized (known hosts or tokens of 'pcsd')."""
+    tokens_path, key = ('/var/lib/pcsd/tokens', 'tokens') if pcs_version == '0.9' else ('/var/lib/pcsd/known-hosts', 'known_hosts')
+    try:
+        with open(tokens_path, 'r') as tokens_file:
+            return set(json.load(tokens_file).get(key, {}).keys())
+    except (IOError, OSError, ValueError):
+        return set()
+
+
+def prepare_node(node, addresses, authorized_nodes, timeout, results):
+    """Check that node can be added to cluster - runs concurrently for all added nodes."""
+    preparation = {'node': node, 'addresses': {}, 'pcsd_reachable': False, 'authorized': node in authorized_nodes, 'errors': []}
+    for link, address in sorted(addresses.items()):
+        try:
+            preparation['addresses'][link] = socket.getaddrinfo(address, None)[0][4][0]
+        except socket.error as e:
+            preparation['errors'].append("cannot resolve address '%s': %s" % (address, e))
+    try:
+        connection = socket.create_connection((node, PCSD_PORT), timeout)
+        connection.close()
+        preparation['pcsd_reachable'] = True
+    except (socket.error, socket.timeout) as e:
+        preparation['errors'].append("pcsd on port %s is not reachable: %s" % (PCSD_PORT, e))
+    if not preparation['authorized']:
+        preparation['errors'].append("node is not authorized, authorize it first (for example with pcs_auth module)")
+    results[node] = preparation
+
+
+def prepare_nodes(nodes, node_list_set_detailed, pcs_version, timeout):
+    results = {}
+    authorized_nodes = get_authorized_nodes(pcs_version)
+    threads = []
+    for node in nodes:
+        thread = threading.Thread(target=prepare_node, args=(node, node_list_set_detailed[node], authorized_nodes, timeout, results))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return [results[node] for node in nodes]
+
+
+def parse_member_nodes(crm_node_output):
+    online_nodes = set()
+    for line in crm_node_output.splitlines():
+        # <nodeid> <name> <state>
+        fields = line.split()
+        if len(fields) >= 3 and fields[2] == 'member':
+            online_nodes.add(fields[1])
+    return online_nodes
+
+
+def get_online_nodes(module):
+    """Return set of nodes that are members of cluster according to 'crm_node -l'."""
+    rc, out, err = module.run_command('crm_node -l')
+    if rc != 0:
+        module.fail_json(msg="Failed to get cluster membership using 'crm_node -l'", output=out, error=err)
+    return parse_member_nodes(out)
+
+
+def get_cluster_status(module):
+    """Return (quorate, online nodes) of running cluster, (False, empty set) when corosync or pacemaker doesn't run yet."""
+    rc, out, err = module.run_command('corosync-quorumtool -s')
+    if not re.search(r'^Quorate:\s*Yes', out, re.M):
+        return False, set()
+    rc, out, err = module.run_command('crm_node -l')
+    if rc != 0:
+        return True, set()
+    return True, parse_member_nodes(out)
+
+
+def wait_for_cluster(module, result, expected_nodes, timeout):
+    """Wait with increasing delay between checks until cluster is quorate and all expected nodes are online.
+
+    Returns number of seconds it took, fails when cluster is not ready before timeout.
+    """
+    start = time.time()
+    deadline = start + timeout
+    delay = 0.5
+    while True:
+        quorate, online_nodes = get_cluster_status(module)
+        if quorate and expected_nodes <= online_nodes:
+            return round(time.time() - start, 1)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            module.fail_json(msg="Cluster didn't become quorate with all nodes online within %s seconds" % timeout,
+                             quorate=quorate, online_nodes=sorted(online_nodes), missing_nodes=sorted(expected_nodes - online_nodes), **result)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 5)
+
+
+def ensure_enabled(module, result, enabled):
+    """Enable/disable start of cluster on boot on all nodes, current state is detected on node where module runs."""
+    rc, out, err = module.run_command('systemctl is-enabled corosync pacemaker')
+    services_state = out.split()
+    is_enabled = len(services_state) == 2 and all(service_state == 'enabled' for service_state in services_state)
+    is_disabled = not any(service_state == 'enabled' for service_state in services_state)
+    if (enabled and is_enabled) or (not enabled and is_disabled):
+        return
+    result['changed'] = True
+    result['enabled'] = enabled
+    cmd = 'pcs cluster %s --all' % ('enable' if enabled else 'disable')
+    if module.check_mode:
+        return
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        module.fail_json(msg="Failed to %s cluster using command '%s'" % ('enable' if enabled else 'disable', cmd), output=out, error=err, **result)
+
+
+def ensure_started(module, result, expected_nodes):
+    """Start cluster on all nodes and wait for quorum and membership of all expected nodes."""
+    quorate, online_nodes = get_cluster_status(module)
+    if quorate and expected_nodes <= online_nodes:
+        return
+    result['changed'] = True
+    result['started_nodes'] = sorted(expected_nodes - online_nodes)
+    if module.check_mode:
+        return
+    # pcs starts cluster on all nodes in parallel
+    cmd = 'pcs cluster start --all'
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        module.fail_json(msg="Failed to start cluster using command '" + cmd + "'", output=out, error=err, **result)
+    result['time_to_quorum'] = wait_for_cluster(module, result, expected_nodes, module.params['start_timeout'])
+
+
+def exit_present(module, result, expected_nodes, no_change_msg=None):
+    """Finish module for cluster that is present - enable it and start it when requested."""
+    if module.params['enabled'] is not None:
+        ensure_enabled(module, result, module.params['enabled'])
+    if module.params['state'] == 'started':
+        ensure_started(module, result, expected_nodes)
+    if not result.get('changed'):
+        result['changed'] = False
+        if no_change_msg is not None:
+            result['msg'] = no_change_msg
+    module.exit_json(**result)
+
+
+def is_quorate(nodes, online_nodes, node_votes, qdevice, quorum_options):
+    """Check if cluster consisting of 'nodes' has quorum with only 'online_nodes' running (votequorum rules).
+
+    'wait_for_all' only delays the first quorum after all nodes were down, it doesn't change quorum of running cluster.
+    """
+    qdevice_votes = 0
+    if qdevice is not None:
+        # explicit 'votes' or default of the algorithm (1 for 'ffsplit', number of nodes - 1 for 'lms')
+        qdevice_votes = qdevice['votes'] if qdevice['votes'] is not None else (len(nodes) - 1 if qdevice['algorithm'] == 'lms' else 1)
+    expected_votes = sum(node_votes.get(node, 1) for node in nodes) + qdevice_votes
+    if quorum_options.get('expected_votes') and qdevice is None:
+        expected_votes = int(quorum_options['expected_votes'])
+    present_votes = sum(node_votes.get(node, 1) for node in nodes if node in online_nodes)
+    # qdevice votes count only when the qdevice is connected and votes for this partition
+    if qdevice is not None and qdevice['voting']:
+        present_votes += qdevice_votes
+    # 'pcs' sets 'two_node' automatically for clusters with two nodes and no qdevice, one vote is enough then
+    if len(nodes) == 2 and (quorum_options.get('two_node') == '1' or qdevice is None):
+        return present_votes >= 1
+    return present_votes >= expected_votes // 2 + 1
+
+
+def is_qdevice_voting(module):
+    """Check if qdevice is connected and casts its vote according to flags from 'corosync-quorumtool -s'."""
+    rc, out, err = module.run_command('corosync-quorumtool -s')
+    return re.search(r'^Flags:.*\bQdeviceCastVote\b', out, re.M) is not None
+
+
+def knet_transport_params(params):
+    """Return (transport options, compression options, crypto options) for 'pcs' from structured knet parameters."""
+    transport = {}
+    if params['link_mode'] is not None:
+        transport['link_mode'] = params['link_mode']
+    compression = {}
+    if params['knet_compression_model'] is not None:
+        compression['model'] = params['knet_compression_model']
+    if params['knet_compression_threshold'] is not None:
+        compression['threshold'] = str(params['knet_compression_threshold'])
+    crypto = {}
+    if params['crypto_cipher'] is not None:
+        crypto['cipher'] = params['crypto_cipher']
+    if params['crypto_hash'] is not None:
+        crypto['hash'] = params['crypto_hash']
+    return transport, compression, crypto
+
+
+def options_string(options):
+    return ' '.join('%s=%s' % (key, value) for key, value in sorted(options.items()))
+
+
+def update_knet(module, result, current_totem, detected_links):
+    """Update knet transport options and links of existing cluster in place."""
+    transport, compression, crypto = knet_transport_params(module.params)
+    current = {
+        'transport': {'link_mode': current_totem.get('link_mode', 'passive')},
+        'compression': {'model': current_totem.get('knet_compression_model', 'none'),
+                        'threshold': current_totem.get('knet_compression_threshold')},
+        'crypto': {'cipher': current_totem.get('crypto_cipher', 'none'), 'hash': current_totem.get('crypto_hash', 'none')},
+    }
+    changes = {}
+    for section, requested in [('transport', transport), ('compression', compression), ('crypto', crypto)]:
+        section_changes = dict((key, value) for key, value in requested.items() if current[section].get(key) != value)
+        if section_changes:
+            changes[section] = section_changes
+    cmds = []
+    if changes:
+        cmds.append('pcs cluster config update ' + ' '.join(
+            section + ' ' + options_string(changes[section]) for section in ['transport', 'compression', 'crypto'] if section in changes))
+
+    link_cmds = []
+    if module.params['knet_links'] is not None:
+        # corosync.conf uses 'knet_' prefix for options that are named without it in 'pcs' (knet_link_priority -> link_priority)
+        current_link_options = dict((interface.get('linknumber', '0'), dict(
+            (re.sub('^knet_', '', key), value) for key, value in interface.items() if key != 'linknumber'))
+            for interface in current_totem.get('interface', []))
+        requested_links = {}
+        for link in module.params['knet_links']:
+            if link.get('linknumber') is None:
+                module.fail_json(msg="Each link in knet_links must have 'linknumber': %s" % link)
+            requested_links[str(link['linknumber'])] = link
+        if not requested_links:
+            module.fail_json(msg="knet_links must contain at least one link")
+        for linknumber in sorted(set(detected_links.keys()) - set(requested_links.keys())):
+            link_cmds.append('pcs cluster link delete ' + linknumber)
+        for linknumber, link in sorted(requested_links.items()):
+            addresses = dict((node, str(address)) for node, address in (link.get('addresses') or {}).items())
+            options = dict((key, str(value)) for key, value in (link.get('options') or {}).items())
+            if linknumber not in detected_links:
+                missing = sorted(set(result['detected_nodes']) - set(addresses.keys()))
+                if missing:
+                    module.fail_json(msg="Link %s must have addresses of all cluster nodes, missing: %s" % (linknumber, ', '.join(missing)))
+                options['linknumber'] = linknumber
+                link_cmds.append('pcs cluster link add %s options %s' % (options_string(addresses), options_string(options)))
+                continue
+            changed_addresses = dict((node, address) for node, address in addresses.items() if detected_links[linknumber].get(node) != address)
+            changed_options = dict((key, value) for key, value in options.items()
+                                   if current_link_options.get(linknumber, {}).get(key) != value)
+            if changed_addresses or changed_options:
+                cmd = 'pcs cluster link update ' + linknumber
+                if changed_addresses:
+                    cmd += ' ' + options_string(changed_addresses)
+                if changed_options:
+                    cmd += ' options ' + options_string(changed_options)
+                link_cmds.append(cmd)
+
+    result['changed_transport'] = changes
+    result['link_commands'] = link_cmds
+    if not (cmds or link_cmds):
+        return
+    if current_totem.get('transport', 'knet') != 'knet':
+        module.fail_json(msg="knet options can be changed only on cluster with knet transport", **result)
+    pcs_version = get_pcs_version(module)
+    if cmds and version_tuple(pcs_version) < PCS_CONFIG_UPDATE_VERSION:
+        module.fail_json(msg="pcs-%s can't change knet options of existing cluster, pcs-0.10.8 or newer is required" % pcs_version, **result)
+    if any(not cmd.startswith('pcs cluster link update') for cmd in link_cmds) and version_tuple(pcs_version) < PCS_LINK_ADD_VERSION:
+        module.fail_json(msg="pcs-%s can't add or delete knet links, pcs-0.10.2 or newer is required" % pcs_version, **result)
+    if any(cmd.startswith('pcs cluster link update') for cmd in link_cmds) and version_tuple(pcs_version) < PCS_LINK_UPDATE_VERSION:
+        module.fail_json(msg="pcs-%s can't update knet links, pcs-0.10.3 or newer is required" % pcs_version, **result)
+    result['changed'] = True
+    result['restart_required'] = result.get('restart_required', False) or 'crypto' in changes or 'compression' in changes
+    if module.check_mode:
+        return
+    # changed transport options are used by running corosync only after reload
+    if cmds and not result['restart_required']:
+        cmds.append('pcs cluster reload corosync')
+    for cmd in cmds + link_cmds:
+        rc, out, err = module.run_command(cmd)
+        if rc != 0:
+            module.fail_json(msg="Failed to update knet transport using command '" + cmd + "'", output=out, error=err, **result)
 
 
 def run_module():
     module = AnsibleModule(
         argument_spec=dict(
-            state=dict(default="present", choices=['present', 'absent']),
+            state=dict(default="present", choices=['present', 'started', 'absent']),
             node_list=dict(required=False),
             cluster_name=dict(required=False),
             token=dict(required=False, type='int', no_log=False),
+            totem=dict(required=False, type='dict'),
             transport=dict(required=False, default="default", choices=['default', 'udp', 'udpu', 'knet']),
             transport_options=dict(required=False, default="", type='str'),
+            link_mode=dict(required=False, choices=['passive', 'active', 'rr']),
+            knet_compression_model=dict(required=False),
+            knet_compression_threshold=dict(required=False, type='int'),
+            crypto_cipher=dict(required=False, choices=['none', 'aes256', 'aes192', 'aes128']),
+            crypto_hash=dict(required=False, choices=['none', 'md5', 'sha1', 'sha256', 'sha384', 'sha512']),
+            knet_links=dict(required=False, type='list', elements='dict'),
             allowed_node_changes=dict(required=False, default="none", choices=['none', 'add', 'remove']),
+            standby_timeout=dict(required=False, default=300, type='int'),
+            prepare_timeout=dict(required=False, default=5, type='int'),
+            enabled=dict(required=False, type='bool'),
+            start_timeout=dict(required=False, default=300, type='int'),
         ),
         supports_check_mode=True
     )
@@ -156,10 +620,18 @@ def run_module():
     state = module.params['state']
     allowed_node_changes = module.params['allowed_node_changes']
     node_list = module.params['node_list']
-    if state == 'present' and (not module.params['node_list'] or not module.params['cluster_name']):
+    if state in ['present', 'started'] and (not module.params['node_list'] or not module.params['cluster_name']):
         module.fail_json(msg='When creating/expanding/shrinking cluster you must specify both node_list and cluster_name')
     result = {}
 
+    knet_requested = any(module.params[param] is not None for param in [
+        'link_mode', 'knet_compression_model', 'knet_compression_threshold', 'crypto_cipher', 'crypto_hash', 'knet_links'])
+
+    # options for 'totem' section used when creating cluster
+    setup_totem = dict((key, str(value)) for key, value in (module.params['totem'] or {}).items())
+    if module.params['token'] and 'token' not in setup_totem:
+        setup_totem['token'] = str(module.params['token'])
+
     pcs_path = module.get_bin_path('pcs', required=False)
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
@@ -190,51 +662,54 @@ def run_module():
                     node_list_set_detailed[item.split(',')[0]]['ring' + str(ring_num + 1)] = item.split(',')[ring_num + 1]
 
     detected_node_list_set = set()
+    node_votes = {}
+    qdevice = None
+    quorum_options = {}
+    detected_totem = {}
     if corosync_conf_exists:
         try:
-            corosync_conf = open('/etc/corosync/corosync.conf', 'r')
-            nodes = re.compile(r"node\s*\{([^}]+)\}", re.M + re.S)
-            # parse list of nodes with their parameters from corosync.conf
-            re_nodes_list = nodes.findall(corosync_conf.read())
-        except IOError as e:
-            detected_node_list_set = set()
+            corosync_conf = load_corosync_conf()
+        except CorosyncConfParseError as e:
+            module.fail_json(msg="Failed to parse /etc/corosync/corosync.conf: %s" % e)
 
+        # nodes are identified by 'name', or by ring0 address when they have no name
         re_node_list_set = {}
-        if len(re_nodes_list) == 0:
-            detected_node_list_set = set()
-            exit
-
-        # detect ring_0 address that will become node_name
-        node_name = re.compile(r"ring0_addr\s*:\s*([\w.-]+)\s*", re.M)
-        for node in re_nodes_list:
-            n_name = node_name.search(node)
-            if n_name is None:
-                # skip node if we cannot determine it's ring0 address
+        for node in get_nodes(corosync_conf):
+            if node['name'] is None:
                 continue
-            re_node_list_set[n_name.group(1)] = {'ring0': n_name.group(1)}
-            detected_node_list_set.add(n_name.group(1))
-            # detect additional ring addresses
-            for ring_num in range(7):
-                node_rings = re.compile(r"ring" + str(ring_num + 1) + r"_addr\s*:\s*([\w.-]+)\s*", re.M)
-                n_rings = node_rings.search(node)
-                if n_rings:
-                    re_node_list_set[n_name.group(1)]["ring" + str(ring_num + 1)] = n_rings.group(1)
+            re_node_list_set[node['name']] = dict(('ring' + str(link), address) for link, address in node['addrs'].items())
+            detected_node_list_set.add(node['name'])
+            node_votes[node['name']] = node['quorum_votes']
+        detected_totem = (corosync_conf or {}).get('totem') or {}
+        quorum_options = get_options((corosync_conf or {}).get('quorum'))
+        device = get_quorum_device(corosync_conf)
+        if device is not None:
+            qdevice = {
+                'votes': int(device['votes']) if device.get('votes') else None,
+                'algorithm': (device.get('net') or {}).get('algorithm', 'ffsplit'),
+            }
 
     # if there is no cluster configuration and cluster should be created do 'pcs cluster setup'
-    if state == 'present' and not (cluster_conf_exists or corosync_conf_exists or cib_xml_exists):
+    if state in ['present', 'started'] and not (cluster_conf_exists or corosync_conf_exists or cib_xml_exists):
         result['changed'] = True
         # create cluster from node list that was provided to module
         if pcs_version == '0.9':
             # if no transport_options are specified used empty string
             if (module.params['transport_options']):
                 module.fail_json(msg="using transport_options is not supported with pcs 0.9")
-            module.params['token_param'] = '' if (not module.params['token']) else '--token %(token)s' % module.params
+            if knet_requested:
+                module.fail_json(msg="knet options are not supported with pcs 0.9")
+            unsupported_totem = sorted(set(setup_totem.keys()) - set(PCS09_TOTEM_OPTIONS))
+            if unsupported_totem:
+                module.fail_json(msg="totem options %s are not supported with pcs 0.9" % ', '.join(unsupported_totem))
+            module.params['token_param'] = ' '.join('--%s %s' % (key, value) for key, value in sorted(setup_totem.items()))
             module.params['transport_param'] = '' if (module.params['transport'] == 'default') else '--transport %(transport)s' % module.params
             cmd = 'pcs cluster setup --name %(cluster_name)s %(node_list)s %(token_param)s %(transport_param)s' % module.params
         elif pcs_version in ['0.10', '0.11', '0.12']:
             if ((module.params['transport_options'] != '') and (module.params['transport'] == 'default')):
                 module.fail_json(msg="using option transport_option must not be used without option transport")
-            module.params['token_param'] = '' if (not module.params['token']) else 'totem token=%(token)s' % module.params
+            module.params['token_param'] = '' if not setup_totem else 'totem ' + ' '.join(
+                '%s=%s' % (key, value) for key, value in sorted(setup_totem.items()))
             module.params['transport_param'] = '' if (module.params['transport'] == 'default') else 'transport %(transport)s' % module.params
             if ',' in module.params['node_list']:
                 # rewrite node_list to conform to pcs-0.10 format with multiple links
@@ -243,23 +718,47 @@ def run_module():
                     module.params['node_list'] += node + ' '
                     for link_number in range(len(node_list_set_detailed[node])):
                         module.params['node_list'] += 'addr=' + node_list_set_detailed[node]['ring' + str(link_number)] + ' '
+            if knet_requested:
+                if module.params['transport'] != 'knet':
+                    module.fail_json(msg="knet options can be used only with 'transport: knet'")
+                # transport options must directly follow 'transport knet', sections of links, compression and crypto go after them
+                transport, compression, crypto = knet_transport_params(module.params)
+                module.params['transport_param'] += ' ' + options_string(transport)
+                knet_sections = ''
+                for link in sorted(module.params['knet_links'] or [], key=lambda link: int(link.get('linknumber', 0))):
+                    link_options = dict((key, str(value)) for key, value in (link.get('options') or {}).items())
+                    link_options['linknumber'] = str(link.get('linknumber', 0))
+                    knet_sections += ' link ' + options_string(link_options)
+                if compression:
+                    knet_sections += ' compression ' + options_string(compression)
+                if crypto:
+                    knet_sections += ' crypto ' + options_string(crypto)
+                module.params['transport_options'] += knet_sections
             cmd = 'pcs cluster setup %(cluster_name)s %(node_list)s %(token_param)s %(transport_param)s %(transport_options)s' % module.params
         else:
             module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
         if not module.check_mode:
             rc, out, err = module.run_command(cmd)
-            if rc == 0:
-                module.exit_json(changed=True)
-            else:
+            if rc != 0:
                 module.fail_json(msg="Failed to create cluster using command '" + cmd + "'", output=out, error=err)
+        exit_present(module, result, node_list_set)
     # if cluster exists and we are allowed to add/remove nodes do 'pcs cluster node add/remove'
-    elif state == 'present' and corosync_conf_exists and allowed_node_changes != 'none' and node_list_set != detected_node_list_set:
-        result['changed'] = True
+    elif state in ['present', 'started'] and corosync_conf_exists and allowed_node_changes != 'none' and node_list_set != detected_node_list_set:
+        result['changed'] = False
         result['detected_nodes'] = detected_node_list_set
         # adding new nodes to cluster
         if allowed_node_changes == 'add':
-            result['nodes_to_add'] = node_list_set - detected_node_list_set
-            for node in (node_list_set - detected_node_list_set):
+            nodes_to_add = sorted(node_list_set - detected_node_list_set)
+            result['nodes_to_add'] = nodes_to_add
+            # independent checks of all new nodes are done concurrently before adding any of them
+            result['node_preparation'] = prepare_nodes(nodes_to_add, node_list_set_detailed, pcs_version, module.params['prepare_timeout'])
+            failed_nodes = [preparation['node'] for preparation in result['node_preparation'] if preparation['errors']]
+            if failed_nodes:
+                module.fail_json(msg="Nodes cannot be added to cluster: %s" % ', '.join(failed_nodes), **result)
+            result['changed'] = len(nodes_to_add) > 0
+            # corosync requires nodes to be added one after another
+            result['added_nodes'] = []
+            for node in nodes_to_add:
                 if 'ring1' in node_list_set_detailed[node] and pcs_version == '0.9':
                     cmd = 'pcs cluster node add ' + node + ',' + node_list_set_detailed[node]['ring1']
                 elif len(node_list_set_detailed[node]) > 1 and pcs_version in ['0.10', '0.11','0.12']:
@@ -270,21 +769,63 @@ def run_module():
                     cmd = 'pcs cluster node add ' + node
                 if not module.check_mode:
                     rc, out, err = module.run_command(cmd)
-                    if rc == 0:
-                        module.exit_json(changed=True)
-                    else:
-                        module.fail_json(msg="Failed to add node '" + node + "' to cluster using command '" + cmd + "'", output=out, error=err)
+                    result['added_nodes'].append({'node': node, 'cmd': cmd, 'rc': rc})
+                    if rc != 0:
+                        module.fail_json(msg="Failed to add node '" + node + "' to cluster using command '" + cmd + "'", output=out, error=err,
+                                         **result)
+            exit_present(module, result, node_list_set)
         # removing nodes from cluster
         if allowed_node_changes == 'remove':
-            result['nodes_to_remove'] = detected_node_list_set - node_list_set
-            for node in (detected_node_list_set - node_list_set):
-                cmd = 'pcs cluster node remove ' + node
-                if not module.check_mode:
+            nodes_to_remove = detected_node_list_set - node_list_set
+            online_nodes = get_online_nodes(module)
+            # offline nodes first as their removal doesn't lower number of present votes
+            removal_order = sorted(nodes_to_remove - online_nodes) + sorted(nodes_to_remove & online_nodes)
+            result['nodes_to_remove'] = removal_order
+            remaining_nodes = detected_node_list_set - nodes_to_remove
+            # expected votes change while nodes leave with these options, the quorum can't be computed from configuration
+            dynamic_options = [option for option in ['last_man_standing', 'auto_tie_breaker'] if quorum_options.get(option) == '1']
+            if dynamic_options:
+                module.fail_json(msg="Quorum check before removing nodes doesn't support '%s' in quorum section of corosync.conf" % (
+                    "', '".join(dynamic_options)), **result)
+            if qdevice is not None:
+                qdevice['voting'] = is_qdevice_voting(module)
+            if not remaining_nodes & online_nodes:
+                module.fail_json(msg="No online node would remain in cluster after removal, resources would have nowhere to run", **result)
+            if not is_quorate(remaining_nodes, online_nodes, node_votes, qdevice, quorum_options):
+                module.fail_json(msg="Cluster would lose quorum after removing nodes: %s" % ', '.join(removal_order), **result)
+            result['changed'] = len(removal_order) > 0
+            if module.check_mode:
+                module.exit_json(**result)
+
+            # move resources away from all online nodes that are removed at once
+            standby_nodes = sorted(nodes_to_remove & online_nodes)
+            if standby_nodes:
+                if pcs_version == '0.9':
+                    cmds = ['pcs cluster standby ' + node for node in standby_nodes]
+                    cmds.append('crm_resource --wait --timeout=%ss' % module.params['standby_timeout'])
+                else:
+                    cmds = ['pcs node standby %s --wait=%s' % (' '.join(standby_nodes), module.params['standby_timeout'])]
+                for cmd in cmds:
                     rc, out, err = module.run_command(cmd)
-                    if rc == 0:
-                        module.exit_json(changed=True)
-                    else:
-                        module.fail_json(msg="Failed to remove node '" + node + "' from cluster using command '" + cmd + "'", output=out, error=err)
+                    if rc != 0:
+                        module.fail_json(msg="Failed to put nodes into standby using command '" + cmd + "'", output=out, error=err, **result)
+                result['standby_nodes'] = standby_nodes
+
+            result['removed_nodes'] = []
+            cluster_nodes = set(detected_node_list_set)
+            for node in removal_order:
+                # membership may change while nodes are removed so check the quorum before each removal
+                cluster_nodes.discard(node)
+                online_nodes = get_online_nodes(module)
+                if not is_quorate(cluster_nodes, online_nodes, node_votes, qdevice, quorum_options):
+                    module.fail_json(msg="Cluster would lose quorum after removing node '" + node + "', stopping node removal", **result)
+                cmd = 'pcs cluster node remove ' + node
+                rc, out, err = module.run_command(cmd)
+                result['removed_nodes'].append({'node': node, 'cmd': cmd, 'rc': rc})
+                if rc != 0:
+                    module.fail_json(msg="Failed to remove node '" + node + "' from cluster using command '" + cmd + "'", output=out, error=err,
+                                     **result)
+            exit_present(module, result, node_list_set)
     # if cluster should be removed and cluster configuration exists
     elif state == 'absent' and (cluster_conf_exists or corosync_conf_exists or cib_xml_exists):
         result['changed'] = True
@@ -300,10 +841,21 @@ def run_module():
     elif state == 'absent' and (not cluster_conf_exists and not corosync_conf_exists and not cib_xml_exists):
         module.exit_json(changed=False, msg="No change needed, cluster is not present.")
     # if the cluster looks as it should
-    elif state == 'present' and corosync_conf_exists and node_list_set == detected_node_list_set:
-        module.exit_json(changed=False, msg="No change needed, cluster is present.")
+    elif state in ['present', 'started'] and corosync_conf_exists and node_list_set == detected_node_list_set:
+        if module.params['totem']:
+            update_totem(module, result, detected_totem)
+        if knet_requested:
+            if pcs_version == '0.9':
+                module.fail_json(msg="knet options are not supported with pcs 0.9")
+            result['detected_nodes'] = detected_node_list_set
+            detected_links = {}
+            for node, rings in re_node_list_set.items():
+                for ring, address in rings.items():
+                    detected_links.setdefault(ring[len('ring'):], {})[node] = address
+            update_knet(module, result, detected_totem, detected_links)
+        exit_present(module, result, node_list_set, "No change needed, cluster is present.")
     # if requested node list and detected node list are different but we are not allowed to change, fail
-    elif state == 'present' and corosync_conf_exists and allowed_node_changes == 'none' and node_list_set != detected_node_list_set:
+    elif state in ['present', 'started'] and corosync_conf_exists and allowed_node_changes == 'none' and node_list_set != detected_node_list_set:
         module.fail_json(
             msg="'Detected node list' and 'Requested node list' are different, but changes are not allowed.",
             node_list_set=node_list_set,
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_cluster_remote_nodes
+short_description: "wrapper module for 'pcs cluster node add-remote/add-guest/remove-remote/remove-guest'"
+description:
+  - "module for adding, updating and removing Pacemaker Remote nodes (nodes running 'pacemaker_remote' that are not
+     members of corosync cluster) and guest nodes (resources like virtual machines running 'pacemaker_remote')"
+  - "Requested nodes are compared with 'ocf:pacemaker:remote' resources and resources with 'remote-node' meta attribute
+     in CIB and all needed changes are done in one run."
+version_added: "2.4"
+options:
+  state:
+    description:
+      - "'present' - ensure that listed remote and guest nodes exist with given options"
+      - "'absent' - ensure that listed remote and guest nodes don't exist"
+    required: false
+    default: present
+    choices: ['present', 'absent']
+    type: str
+  remote_nodes:
+    description:
+      - "list of remote nodes, each remote node is dictionary with 'name', optional 'address' (host name or IP address
+         of the node, defaults to 'name') and optional 'options' (dictionary of 'ocf:pacemaker:remote' resource options
+         like 'port' or 'reconnect_interval')"
+    required: false
+    default: []
+    type: list
+    elements: dict
+  guest_nodes:
+    description:
+      - "list of guest nodes, each guest node is dictionary with 'name', 'resource' (existing resource that runs
+         the guest node, for example 'ocf:heartbeat:VirtualDomain'), optional 'address' (defaults to 'name') and optional
+         'options' (dictionary of guest node options like 'remote-port' or 'remote-connect-timeout')"
+    required: false
+    default: []
+    type: list
+    elements: dict
+  purge:
+    description:
+      - "remove remote and guest nodes that are present in cluster but not listed in I(remote_nodes) and I(guest_nodes),
+         used only with I(state=present)"
+    required: false
+    default: false
+    type: bool
+  skip_offline:
+    description:
+      - "add and remove nodes even when they are not reachable, the 'authkey' is not distributed to unreachable nodes"
+    required: false
+    default: false
+    type: bool
+notes:
+   - "requires pcs-0.9.158 or newer"
+   - "'pcs' distributes the pacemaker 'authkey' to new nodes and starts 'pacemaker_remote' on them, so the new nodes
+      must have running 'pcsd' and be authorized (for example with pcs_auth module)"
+   - "use 'run_once=True', module changes configuration of whole cluster"
+'''
+
+EXAMPLES = '''
+- name: add compute nodes as remote nodes
+  pcs_cluster_remote_nodes:
+    remote_nodes:
+      - name: 'compute-1'
+      - name: 'compute-2'
+        address: '192.168.1.52'
+        options:
+          reconnect_interval: '60s'
+  run_once: true
+
+- name: add virtual machine resource 'vm-guest1' as guest node and remove all unlisted remote and guest nodes
+  pcs_cluster_remote_nodes:
+    remote_nodes:
+      - name: 'compute-1'
+    guest_nodes:
+      - name: 'guest1'
+        resource: 'vm-guest1'
+        options:
+          remote-connect-timeout: '120s'
+    purge: true
+  run_once: true
+
+- name: remove remote node
+  pcs_cluster_remote_nodes:
+    remote_nodes:
+      - name: 'compute-2'
+    state: 'absent'
+  run_once: true
+'''
+
+try:
+    from shlex import quote
+except ImportError:
+    # python 2
+    from pipes import quote
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    get_pcs_version,
+    load_cib,
+    version_tuple,
+)
+
+# first pcs version with 'pcs cluster node add-remote/add-guest'
+PCS_REMOTE_NODES_VERSION = (0, 9, 158)
+# pcs-0.10 changed order of arguments of 'add-remote' to '<node name> [<node address>]'
+PCS_ADD_REMOTE_NAME_FIRST_VERSION = (0, 10)
+# meta attributes of guest node resource
+GUEST_NODE_OPTIONS = ['remote-node', 'remote-addr', 'remote-port', 'remote-connect-timeout']
+
+
+def nvpairs(elem, tag):
+    return dict((nvpair.attrib.get('name'), nvpair.attrib.get('value')) for nvpair in elem.findall('./%s/nvpair' % tag))
+
+
+def detect_remote_nodes(cib):
+    """Return dictionaries of remote nodes and guest nodes configured in CIB."""
+    remote_nodes = {}
+    guest_nodes = {}
+    for primitive in cib.findall('./configuration/resources//primitive'):
+        if (primitive.attrib.get('class'), primitive.attrib.get('provider'), primitive.attrib.get('type')) == ('ocf', 'pacemaker', 'remote'):
+            remote_nodes[primitive.attrib.get('id')] = nvpairs(primitive, 'instance_attributes')
+            # without 'server' the node is reached by its name
+            remote_nodes[primitive.attrib.get('id')].setdefault('server', primitive.attrib.get('id'))
+            continue
+        meta = nvpairs(primitive, 'meta_attributes')
+        if meta.get('remote-node') is not None:
+            guest_nodes[meta['remote-node']] = dict((key, value) for key, value in meta.items() if key in GUEST_NODE_OPTIONS)
+            guest_nodes[meta['remote-node']]['resource'] = primitive.attrib.get('id')
+            guest_nodes[meta['remote-node']].setdefault('remote-addr', meta['remote-node'])
+    return remote_nodes, guest_nodes
+
+
+def options_string(options):
+    return ' '.join(quote('%s=%s' % (key, value)) for key, value in sorted(options.items()))
+
+
+def command(cmd, *args):
+    """Join command with its non-empty arguments, arguments must be already quoted."""
+    return ' '.join([cmd] + [arg for arg in args if arg])
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default="present", choices=['present', 'absent']),
+            remote_nodes=dict(required=False, type='list', elements='dict', default=[]),
+            guest_nodes=dict(required=False, type='list', elements='dict', default=[]),
+            purge=dict(required=False, type='bool', default=False),
+            skip_offline=dict(required=False, type='bool', default=False),
+        ),
+        supports_check_mode=True
+    )
+
+    state = module.params['state']
+    purge = module.params['purge']
+    skip_offline = '--skip-offline' if module.params['skip_offline'] else ''
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    pcs_version = get_pcs_version(module)
+    if version_tuple(pcs_version) < PCS_REMOTE_NODES_VERSION:
+        module.fail_json(msg="pcs-%s doesn't support remote and guest nodes, pcs-0.9.158 or newer is required" % pcs_version)
+
+    requested_remote = {}
+    for node in module.params['remote_nodes']:
+        if not node.get('name'):
+            module.fail_json(msg="Each remote node must have 'name': %s" % node)
+        options = dict((key, str(value)) for key, value in (node.get('options') or {}).items())
+        options['server'] = str(node.get('address') or node['name'])
+        requested_remote[node['name']] = options
+    requested_guest = {}
+    for node in module.params['guest_nodes']:
+        if not node.get('name') or (state == 'present' and not node.get('resource')):
+            module.fail_json(msg="Each guest node must have 'name' and 'resource': %s" % node)
+        options = dict((key, str(value)) for key, value in (node.get('options') or {}).items())
+        options['remote-addr'] = str(node.get('address') or node['name'])
+        requested_guest[node['name']] = {'resource': node.get('resource'), 'options': options}
+    duplicate_names = set(requested_remote.keys()) & set(requested_guest.keys())
+    if duplicate_names:
+        module.fail_json(msg="Nodes can't be both remote and guest nodes: %s" % ', '.join(sorted(duplicate_names)))
+
+    cib = load_cib(module)
+    remote_nodes, guest_nodes = detect_remote_nodes(cib)
+    resources = set(primitive.attrib.get('id') for primitive in cib.findall('./configuration/resources//primitive'))
+    result['detected_remote_nodes'] = sorted(remote_nodes.keys())
+    result['detected_guest_nodes'] = sorted(guest_nodes.keys())
+
+    cmds = []
+    changes = {}
+    if state == 'present':
+        for name, options in sorted(requested_remote.items()):
+            if name in guest_nodes:
+                module.fail_json(msg="Node '%s' already exists as guest node" % name, **result)
+            if name not in remote_nodes:
+                address = options.pop('server')
+                if version_tuple(pcs_version) >= PCS_ADD_REMOTE_NAME_FIRST_VERSION:
+                    first, second = name, address
+                else:
+                    first, second = address, name
+                cmds.append(command('pcs cluster node add-remote', quote(first), quote(second), options_string(options), skip_offline))
+                changes.setdefault('added_remote_nodes', []).append(name)
+                continue
+            changed_options = dict((key, value) for key, value in options.items() if remote_nodes[name].get(key) != value)
+            if changed_options:
+                cmds.append(command('pcs resource update', quote(name), options_string(changed_options)))
+                changes.setdefault('updated_remote_nodes', []).append(name)
+        for name, guest in sorted(requested_guest.items()):
+            if name in remote_nodes:
+                module.fail_json(msg="Node '%s' already exists as remote node" % name, **result)
+            if name not in guest_nodes:
+                if guest['resource'] not in resources:
+                    module.fail_json(msg="Resource '%s' for guest node '%s' doesn't exist" % (guest['resource'], name), **result)
+                cmds.append(command('pcs cluster node add-guest', quote(name), quote(guest['resource']), options_string(guest['options']), skip_offline))
+                changes.setdefault('added_guest_nodes', []).append(name)
+                continue
+            if guest_nodes[name]['resource'] != guest['resource']:
+                module.fail_json(msg="Guest node '%s' is already running in resource '%s'" % (name, guest_nodes[name]['resource']), **result)
+            changed_options = dict((key, value) for key, value in guest['options'].items() if guest_nodes[name].get(key) != value)
+            if changed_options:
+                cmds.append(command('pcs resource meta', quote(guest['resource']), options_string(changed_options)))
+                changes.setdefault('updated_guest_nodes', []).append(name)
+        remove_remote = sorted(set(remote_nodes.keys()) - set(requested_remote.keys())) if purge else []
+        remove_guest = sorted(set(guest_nodes.keys()) - set(requested_guest.keys())) if purge else []
+    else:
+        remove_remote = sorted(set(remote_nodes.keys()) & set(requested_remote.keys()))
+        remove_guest = sorted(set(guest_nodes.keys()) & set(requested_guest.keys()))
+
+    for name in remove_remote:
+        cmds.append(command('pcs cluster node remove-remote', quote(name), skip_offline))
+        changes.setdefault('removed_remote_nodes', []).append(name)
+    for name in remove_guest:
+        cmds.append(command('pcs cluster node remove-guest', quote(name), skip_offline))
+        changes.setdefault('removed_guest_nodes', []).append(name)
+
+    result.update(changes)
+    result['changed'] = len(cmds) > 0
+    if not module.check_mode:
+        for cmd in cmds:
+            rc, out, err = module.run_command(cmd)
+            if rc != 0:
+                module.fail_json(msg="Failed to change remote nodes using command '" + cmd + "'", output=out, error=err, **result)
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,8 @@ options:
   resource1_role:
     description:
       - Role of resource1
+      - "'Master'/'Slave' and 'Promoted'/'Unpromoted' are the same roles, with I(cib_file) the role is stored with the name
+         used by CIB schema of the file"
     required: false
     choices: ['Master', 'Slave', 'Promoted', 'Unpromoted', 'Started']
     default: 'Started'
@@ -49,6 +51,8 @@ options:
   resource2_role:
     description:
       - Role of resource2
+      - "'Master'/'Slave' and 'Promoted'/'Unpromoted' are the same roles, with I(cib_file) the role is stored with the name
+         used by CIB schema of the file"
     required: false
     choices: ['Master', 'Slave', 'Promoted', 'Unpromoted', 'Started']
     default: 'Started'
@@ -69,6 +73,7 @@ options:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
       - "This module requires the file to already contain cluster configuration."
+      - "Changes are done directly in the file without calling 'pcs', IDs of new elements follow the 'pcs' ID scheme."
     required: false
     type: str
 notes:
@@ -109,10 +114,36 @@ EXAMPLES = '''
     influence: false
 '''
 
-import os.path
 import xml.etree.ElementTree as ET
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    check_cib_references,
+    cib_role,
+    find_unique_id,
+    load_cib,
+    normalize_role,
+    push_cib,
+    sanitize_id,
+)
+
+
+def create_constraint_element(cib, resource1, resource2, resource1_role, resource2_role, score, influence):
+    """Create 'rsc_colocation' element with same ID as would 'pcs' create."""
+    constraint = ET.SubElement(cib.find('./configuration/constraints'), 'rsc_colocation', {
+        'id': find_unique_id(cib, sanitize_id('colocation-%s-%s-%s' % (resource1, resource2, score))),
+        'rsc': resource1,
+        'with-rsc': resource2,
+        'score': score,
+    })
+    # roles are stored with names used by CIB schema, 'pcs' converts them the same way
+    if resource1_role != 'Started':
+        constraint.set('rsc-role', cib_role(cib, resource1_role))
+    if resource2_role != 'Started':
+        constraint.set('with-rsc-role', cib_role(cib, resource2_role))
+    if influence:
+        constraint.set('influence', influence.split('=')[1])
+    return constraint
 
 
 def run_module():
@@ -161,25 +192,7 @@ def run_module():
         # influence=True (default for pcs<0.11, but syntax not supported yet)
         influence = module.params['influence'] = ''
 
-    module.params['cib_file_param'] = ''
-    if cib_file is not None:
-        # use cib_file if specified
-        if os.path.isfile(cib_file):
-            try:
-                current_cib = ET.parse(cib_file)
-            except Exception as e:
-                module.fail_json(msg="Error encountered parsing the cib_file - %s" % (e))
-            current_cib_root = current_cib.getroot()
-            module.params['cib_file_param'] = '-f ' + cib_file
-        else:
-            module.fail_json(msg="%(cib_file)s is not a file or doesn't exists" % module.params)
-    else:
-        # get running cluster configuration
-        rc, out, err = module.run_command('pcs cluster cib')
-        if rc == 0:
-            current_cib_root = ET.fromstring(out)
-        else:
-            module.fail_json(msg='Failed to load cluster configuration', out=out, error=err)
+    current_cib_root = load_cib(module, cib_file)
 
     # try to find the constraint we have defined
     constraint = None
@@ -192,11 +205,11 @@ def run_module():
     for constr in constraints:
         # constraint is matched using following criteria:
         # - resource order (resource1 with resource2)
-        # - resource roles (resource1_role with resource2_role)
+        # - resource roles (resource1_role with resource2_role), 'Master'/'Slave' are same as 'Promoted'/'Unpromoted'
         if (constr.attrib.get('rsc') == resource1
                 and constr.attrib.get('with-rsc') == resource2
-                and constr.attrib.get('rsc-role', 'Started') == resource1_role
-                and constr.attrib.get('with-rsc-role', 'Started') == resource2_role):
+                and normalize_role(constr.attrib.get('rsc-role', 'Started')) == normalize_role(resource1_role)
+                and normalize_role(constr.attrib.get('with-rsc-role', 'Started')) == normalize_role(resource2_role)):
             constraint = constr
             break
 
@@ -219,29 +232,35 @@ def run_module():
     # TODO: check which old versions requires this, the 0.9.162 seems to handle 'Started' role correctly
     if with_roles is True:
         if resource1_role != 'Started' and resource2_role != 'Started':
-            cmd_create = """ pcs %(cib_file_param)s constraint colocation
+            cmd_create = """ pcs constraint colocation
                              add %(resource1_role)s %(resource1)s
                              with %(resource2_role)s %(resource2)s %(score_prefix)s%(score)s %(influence)s """ % module.params
         elif resource1_role != 'Started' and resource2_role == 'Started':
-            cmd_create = """ pcs %(cib_file_param)s constraint colocation
+            cmd_create = """ pcs constraint colocation
                              add %(resource1_role)s %(resource1)s
                              with %(resource2)s %(score_prefix)s%(score)s %(influence)s """ % module.params
         elif resource1_role == 'Started' and resource2_role != 'Started':
-            cmd_create = """ pcs %(cib_file_param)s constraint colocation
+            cmd_create = """ pcs constraint colocation
                              add %(resource1)s
                              with %(resource2_role)s %(resource2)s %(score_prefix)s%(score)s %(influence)s """ % module.params
     else:
-        cmd_create = """ pcs %(cib_file_param)s constraint colocation
+        cmd_create = """ pcs constraint colocation
                          add %(resource1)s with %(resource2)s %(score_prefix)s%(score)s %(influence)s """ % module.params
 
     # colocation constraint deletion command
     if constraint is not None:
-        cmd_delete = 'pcs %(cib_file_param)s constraint delete ' % module.params + constraint.attrib.get('id')
+        cmd_delete = 'pcs constraint delete ' + constraint.attrib.get('id')
 
     if state == 'present' and constraint is None:
         # constraint should be present, but we don't see it in configuration - lets create it
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # change the cib_file directly without calling 'pcs'
+                check_cib_references(module, current_cib_root, resources=[resource1, resource2])
+                create_constraint_element(current_cib_root, resource1, resource2, resource1_role, resource2_role, score, influence)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_create)
             if rc == 0:
                 module.exit_json(**result)
@@ -253,6 +272,13 @@ def run_module():
         if constraint.attrib.get('score', 'INFINITY') != score or (pcs_version in ['0.11', '0.12'] and 'influence=' + constraint.attrib.get('influence', 'true') != influence):
             result['changed'] = True
             if not module.check_mode:
+                if cib_file is not None:
+                    # replace the constraint directly in cib_file without calling 'pcs'
+                    check_cib_references(module, current_cib_root, resources=[resource1, resource2])
+                    current_cib_root.find('./configuration/constraints').remove(constraint)
+                    create_constraint_element(current_cib_root, resource1, resource2, resource1_role, resource2_role, score, influence)
+                    push_cib(module, current_cib_root, cib_file)
+                    module.exit_json(**result)
                 rc, out, err = module.run_command(cmd_delete)
                 if rc != 0:
                     module.fail_json(msg="Failed to delete constraint for replacement with cmd: '" + cmd_delete + "'", output=out, error=err)
@@ -267,6 +293,11 @@ def run_module():
         # constraint should not be present but we have found something - lets remove that
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # remove the constraint directly from cib_file without calling 'pcs'
+                current_cib_root.find('./configuration/constraints').remove(constraint)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_delete)
             if rc == 0:
                 module.exit_json(**result)
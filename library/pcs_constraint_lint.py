@@ -0,0 +1,352 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_constraint_lint
+short_description: "detect and prune orphaned, duplicate and shadowed constraints"
+description:
+  - "module for detecting orphaned, duplicate, shadowed and conflicting 'rsc_location', 'rsc_colocation',
+     'rsc_order' constraints and 'fencing-level' entries in cluster CIB"
+  - "'orphaned' - constraint or fencing level referring to resource or stonith device that doesn't exist"
+  - "'duplicate' - constraint or fencing level that is same as other one except for its ID"
+  - "'shadowed' - location or colocation constraint with finite score for same resource(s) and node/role
+     (and 'node-attribute' for colocation) as other constraint with INFINITY or -INFINITY score that decides the result anyway, constraints with
+     'resource-discovery' are never considered shadowed"
+  - "'conflicting' - groups of constraints contradicting each other (loops of mandatory order constraints of any
+     length with all constraints of the loop in one group, colocation with opposite INFINITY scores, fencing levels
+     with same index and target but different devices)"
+version_added: "2.4"
+options:
+  prune:
+    description:
+      - "remove orphaned, duplicate and shadowed constraints and fencing levels in single CIB update"
+      - "only orphaned, duplicate and shadowed ones are removed, conflicting constraints are only reported as module
+         cannot decide which of them is the intended one"
+    required: false
+    default: false
+    type: bool
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "resource references inside of resource sets are removed individually, constraint is removed
+      only when it has no resource left"
+   - "'rsc-pattern' location constraints and rule based location constraints are checked only for being orphaned or duplicate"
+'''
+
+EXAMPLES = '''
+- name: report problematic constraints
+  pcs_constraint_lint:
+  register: constraint_lint
+
+- name: remove orphaned, duplicate and shadowed constraints
+  pcs_constraint_lint:
+    prune: true
+'''
+
+import xml.etree.ElementTree as ET
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    load_cib,
+    normalize_role,
+    push_cib,
+)
+
+INFINITY_SCORES = ['INFINITY', '+INFINITY', '-INFINITY']
+
+
+def element_signature(elem):
+    # everything except the IDs - two elements with same signature are duplicates
+    return (
+        elem.tag,
+        tuple(sorted((k, v) for k, v in elem.attrib.items() if k != 'id')),
+        tuple(element_signature(child) for child in elem),
+    )
+
+
+def find_shadowed(constraints, key_attributes, role_attributes):
+    # constraints for same key add up their scores, finite scores don't matter next to INFINITY ones
+    # and nothing matters next to -INFINITY score
+    groups = {}
+    for constr in constraints:
+        # resource-discovery changes probing of resource on node, not only its score - such constraint
+        # neither shadows nor is shadowed by other constraints
+        if constr.attrib.get('score') is None or constr.attrib.get('resource-discovery') is not None:
+            continue
+        key = tuple(normalize_role(constr.attrib.get(attr)) if attr in role_attributes else constr.attrib.get(attr)
+                    for attr in key_attributes)
+        if None in key[:2]:
+            continue
+        groups.setdefault(key, []).append(constr)
+
+    shadowed = []
+    for key, group in groups.items():
+        scores = [c.attrib.get('score') for c in group]
+        if '-INFINITY' in scores:
+            winner = group[scores.index('-INFINITY')]
+            losers = [c for c in group if c is not winner]
+        elif 'INFINITY' in scores or '+INFINITY' in scores:
+            winner = group[scores.index('INFINITY') if 'INFINITY' in scores else scores.index('+INFINITY')]
+            losers = [c for c in group if c.attrib.get('score') not in INFINITY_SCORES]
+        else:
+            continue
+        for constr in losers:
+            shadowed.append((constr, winner))
+    return shadowed
+
+
+def order_edges(constr):
+    """Return list of ('first', 'then') pairs of (resource, action) ordered by order constraint.
+
+    Members of sequential resource set are ordered one after another and every member of resource set is ordered
+    before every member of the following resource set.
+    """
+    if constr.find('./resource_set') is None:
+        first = (constr.attrib.get('first'), constr.attrib.get('first-action', 'start'))
+        then = (constr.attrib.get('then'), constr.attrib.get('then-action', 'start'))
+        if first[0] is None or then[0] is None:
+            return []
+        return [(first, then)]
+    edges = []
+    previous = []
+    for resource_set in constr.findall('./resource_set'):
+        action = resource_set.attrib.get('action', 'start')
+        members = [(ref.attrib.get('id'), action) for ref in resource_set.findall('./resource_ref')]
+        if not members:
+            continue
+        if resource_set.attrib.get('sequential', 'true') in ['true', 'yes', '1', 'on']:
+            edges.extend(zip(members, members[1:]))
+        edges.extend((first, then) for first in previous for then in members)
+        previous = members
+    return edges
+
+
+def find_order_loops(orders):
+    """Return lists of order constraints forming loops.
+
+    Loops are strongly connected components of 'first' -> 'then' graph found by depth-first search (Tarjan's
+    algorithm), all constraints inside one component are returned together as one loop.
+    """
+    graph = {}
+    for constr in orders:
+        for first, then in order_edges(constr):
+            graph.setdefault(first, []).append(then)
+            graph.setdefault(then, [])
+
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = {}
+
+    # iterative depth-first search, long chains of order constraints would exceed the recursion limit
+    for root in list(graph.keys()):
+        if root in index:
+            continue
+        work = [(root, iter(graph[root]))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, targets = work[-1]
+            for target in targets:
+                if target not in index:
+                    index[target] = lowlink[target] = len(index)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph[target])))
+                    break
+                elif target in on_stack:
+                    lowlink[node] = min(lowlink[node], index[target])
+            else:
+                work.pop()
+                if work:
+                    lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        components[member] = node
+                        if member == node:
+                            break
+
+    loops = {}
+    for constr in orders:
+        for first, then in order_edges(constr):
+            if components[first] == components[then]:
+                loops.setdefault(components[first], []).append(constr)
+                break
+    return [loops[key] for key in sorted(loops.keys(), key=lambda key: index[key])]
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            prune=dict(required=False, type='bool', default=False),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    prune = module.params['prune']
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    current_cib_root = load_cib(module, cib_file)
+
+    # index of resources, tags and stonith devices
+    resource_ids = set()
+    stonith_ids = set()
+    for tag in ['primitive', 'group', 'clone', 'master', 'bundle']:
+        for elem in current_cib_root.findall('./configuration/resources//' + tag):
+            resource_ids.add(elem.attrib.get('id'))
+            if tag == 'primitive' and elem.attrib.get('class') == 'stonith':
+                stonith_ids.add(elem.attrib.get('id'))
+    for elem in current_cib_root.findall('./configuration/tags/tag'):
+        resource_ids.add(elem.attrib.get('id'))
+
+    cib_constraints = current_cib_root.find('./configuration/constraints')
+    if cib_constraints is None:
+        cib_constraints = ET.Element('constraints')
+    cib_topology = current_cib_root.find('./configuration/fencing-topology')
+    if cib_topology is None:
+        cib_topology = ET.Element('fencing-topology')
+
+    reference_attributes = {
+        'rsc_location': ['rsc'],
+        'rsc_colocation': ['rsc', 'with-rsc'],
+        'rsc_order': ['first', 'then'],
+    }
+    constraints = [c for c in cib_constraints if c.tag in reference_attributes]
+    fencing_levels = cib_topology.findall('./fencing-level')
+
+    # orphaned constraints and fencing levels
+    orphaned = []
+    orphaned_set_refs = []
+    for constr in constraints:
+        missing = [constr.attrib.get(attr) for attr in reference_attributes[constr.tag]
+                   if constr.attrib.get(attr) is not None and constr.attrib.get(attr) not in resource_ids]
+        set_refs = constr.findall('./resource_set/resource_ref')
+        missing_refs = [ref for ref in set_refs if ref.attrib.get('id') not in resource_ids]
+        if missing or (set_refs and len(missing_refs) == len(set_refs)):
+            orphaned.append(constr)
+        elif missing_refs:
+            orphaned_set_refs.append((constr, missing_refs))
+    for flevel in fencing_levels:
+        devices = flevel.attrib.get('devices', '').split(',')
+        if any(device not in stonith_ids for device in devices):
+            orphaned.append(flevel)
+
+    # duplicates among the remaining ones, first occurrence is kept
+    duplicate = []
+    seen = {}
+    for elem in constraints + fencing_levels:
+        if elem in orphaned:
+            continue
+        signature = element_signature(elem)
+        if signature in seen:
+            duplicate.append((elem, seen[signature]))
+        else:
+            seen[signature] = elem
+    removed = set(orphaned) | set(elem for elem, original in duplicate)
+
+    # shadowed constraints
+    remaining_locations = [c for c in constraints if c.tag == 'rsc_location' and c not in removed]
+    remaining_colocations = [c for c in constraints if c.tag == 'rsc_colocation' and c not in removed]
+    shadowed = find_shadowed(remaining_locations, ['rsc', 'node', 'role'], ['role'])
+    shadowed += find_shadowed(remaining_colocations, ['rsc', 'with-rsc', 'rsc-role', 'with-rsc-role', 'node-attribute'],
+                              ['rsc-role', 'with-rsc-role'])
+    removed |= set(elem for elem, winner in shadowed)
+
+    # conflicting constraints - reported only
+    conflicting = []
+    orders = [c for c in constraints
+              if c.tag == 'rsc_order' and c not in removed and c.attrib.get('kind', 'Mandatory') == 'Mandatory']
+    conflicting.extend(find_order_loops(orders))
+    colocations = {}
+    for constr in remaining_colocations:
+        if constr in removed or constr.attrib.get('score') not in INFINITY_SCORES:
+            continue
+        pair = (frozenset([constr.attrib.get('rsc'), constr.attrib.get('with-rsc')]), constr.attrib.get('node-attribute'))
+        for other in colocations.get(pair, []):
+            if (other.attrib.get('score') == '-INFINITY') != (constr.attrib.get('score') == '-INFINITY'):
+                conflicting.append((other, constr))
+        colocations.setdefault(pair, []).append(constr)
+    levels = {}
+    for flevel in fencing_levels:
+        if flevel in removed:
+            continue
+        key = (flevel.attrib.get('target'), flevel.attrib.get('target-pattern'), flevel.attrib.get('target-attribute'),
+               flevel.attrib.get('target-value'), flevel.attrib.get('index'))
+        if key in levels:
+            conflicting.append((levels[key], flevel))
+        else:
+            levels[key] = flevel
+
+    result.update({
+        'orphaned': [elem.attrib.get('id') for elem in orphaned],
+        'orphaned_resource_set_refs': dict((constr.attrib.get('id'), [ref.attrib.get('id') for ref in refs])
+                                           for constr, refs in orphaned_set_refs),
+        'duplicate': [{'id': elem.attrib.get('id'), 'duplicate_of': original.attrib.get('id')} for elem, original in duplicate],
+        'shadowed': [{'id': elem.attrib.get('id'), 'shadowed_by': winner.attrib.get('id')} for elem, winner in shadowed],
+        'conflicting': [[elem.attrib.get('id') for elem in elems] for elems in conflicting],
+    })
+
+    if not prune or not (removed or orphaned_set_refs):
+        result['changed'] = False
+        module.exit_json(**result)
+
+    result['changed'] = True
+    for elem in removed:
+        if elem.tag == 'fencing-level':
+            cib_topology.remove(elem)
+        else:
+            cib_constraints.remove(elem)
+    for constr, refs in orphaned_set_refs:
+        for resource_set in constr.findall('./resource_set'):
+            for ref in refs:
+                if ref in list(resource_set):
+                    resource_set.remove(ref)
+            if len(resource_set.findall('./resource_ref')) == 0:
+                constr.remove(resource_set)
+        if len(constr.findall('./resource_set')) == 0:
+            cib_constraints.remove(constr)
+            removed.add(constr)
+    result['removed'] = sorted(elem.attrib.get('id') for elem in removed)
+
+    if not module.check_mode:
+        push_cib(module, current_cib_root, cib_file)
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
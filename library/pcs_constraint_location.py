@@ -65,6 +65,7 @@ options:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
       - "This module requires the file to already contain cluster configuration."
+      - "Changes are done directly in the file without calling 'pcs', IDs of new elements follow the 'pcs' ID scheme."
     required: false
     type: str
   resource_discovery:
@@ -136,11 +137,17 @@ EXAMPLES = '''
     resource_discovery: 'never'
 '''
 
-import os.path
 import re
 import xml.etree.ElementTree as ET
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    check_cib_references,
+    find_unique_id,
+    load_cib,
+    push_cib,
+    sanitize_id,
+)
 
 class DateSpec:
     hours = None
@@ -207,7 +214,11 @@ class RscLocationRuleExpression:
         exp_parsed = re.search(r"^date\s+(gt|lt)\s+(.*)$", expression)
         if exp_parsed:
             self.operation = exp_parsed.group(1)
-            self.start = exp_parsed.group(2)
+            # 'lt' date expressions are stored with 'end' attribute in CIB
+            if self.operation == 'gt':
+                self.start = exp_parsed.group(2)
+            else:
+                self.end = exp_parsed.group(2)
             return
 
         # expression: date in_range <date> to duration <duration>
@@ -250,7 +261,10 @@ class RscLocationRuleExpression:
 
     def compare(self, xml):
         """Check if given XML element matches the rule expression."""
-        date_spec = xml.find("duration") or xml.find("date_spec")
+        # element without children evaluates as False so we must check for None here
+        date_spec = xml.find("duration")
+        if date_spec is None:
+            date_spec = xml.find("date_spec")
         if any(
             [
                 xml.get("operation") != self.operation,
@@ -295,7 +309,8 @@ def compare_rule_to_element(rule_string, xml_rule):
         RscLocationRuleExpression(expression)
         for expression in expression_list
     ]
-    xml_expressions = xml_rule.findall("expression") or  xml_rule.findall("date_expression")
+    # keep the order of expressions as rule can combine both attribute and date expressions
+    xml_expressions = [elem for elem in xml_rule if elem.tag in ["expression", "date_expression"]]
 
     if len(rule_parsed_list) != len(xml_expressions):
         return False
@@ -307,6 +322,53 @@ def compare_rule_to_element(rule_string, xml_rule):
         return True
     return False
 
+def create_rule_element(cib, constraint, rule_string, score):
+    """Create 'rule' element in constraint the same way as 'pcs constraint location ... rule' does."""
+    expression_list = re.split(r"\s+or\s+|\s+and\s+", rule_string)
+    rule = ET.SubElement(constraint, 'rule', {
+        'id': find_unique_id(cib, constraint.attrib.get('id') + '-rule'),
+        'score': score,
+    })
+    if len(expression_list) > 1:
+        rule.set('boolean-op', 'or' if re.search(r"\s+or\s+", rule_string) else 'and')
+    for expression in expression_list:
+        exp = RscLocationRuleExpression(expression)
+        if exp.operation is None:
+            raise ValueError("unable to parse rule expression '%s'" % expression)
+        exp_id = find_unique_id(cib, rule.attrib.get('id') + '-expr')
+        if exp.attribute is not None:
+            exp_element = ET.SubElement(rule, 'expression', {'id': exp_id, 'attribute': exp.attribute, 'operation': exp.operation})
+            if exp.value is not None:
+                exp_element.set('value', exp.value)
+            continue
+        exp_element = ET.SubElement(rule, 'date_expression', {'id': exp_id, 'operation': exp.operation})
+        for attr in ['start', 'end']:
+            if getattr(exp, attr) is not None:
+                exp_element.set(attr, getattr(exp, attr))
+        if exp.date_spec is not None:
+            if exp.operation == 'in_range':
+                spec_element = ET.SubElement(exp_element, 'duration', {'id': find_unique_id(cib, exp_id + '-duration')})
+            else:
+                spec_element = ET.SubElement(exp_element, 'date_spec', {'id': find_unique_id(cib, exp_id + '-datespec')})
+            for attr in ['hours', 'monthdays', 'weekdays', 'yeardays', 'months', 'weeks', 'years', 'weekyears', 'moon']:
+                if getattr(exp.date_spec, attr) is not None:
+                    spec_element.set(attr, getattr(exp.date_spec, attr))
+    return rule
+
+def create_constraint_element(cib, resource, node_name, rule, constraint_id, score, resource_discovery):
+    """Create 'rsc_location' element with same IDs as would 'pcs' create."""
+    cib_constraints = cib.find('./configuration/constraints')
+    if node_name is not None:
+        if constraint_id is None:
+            constraint_id = find_unique_id(cib, sanitize_id('location-%s-%s-%s' % (resource, node_name, score)))
+        constraint = ET.SubElement(cib_constraints, 'rsc_location', {'id': constraint_id, 'rsc': resource, 'node': node_name, 'score': score})
+    else:
+        constraint = ET.SubElement(cib_constraints, 'rsc_location', {'id': constraint_id, 'rsc': resource})
+        create_rule_element(cib, constraint, rule, score)
+    if resource_discovery is not None:
+        constraint.set('resource-discovery', resource_discovery)
+    return constraint
+
 def run_module():
     module = AnsibleModule(
         argument_spec=dict(
@@ -340,32 +402,16 @@ def run_module():
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
 
-    # get the pcs major.minor version
-    rc, out, err = module.run_command('pcs --version')
-    if rc == 0:
-        pcs_version = out.split('.')[0] + '.' + out.split('.')[1]
-    else:
-        module.fail_json(msg="pcs --version exited with non-zero exit code (" + rc + "): " + out + err)
-
-    module.params['cib_file_param'] = ''
-    if cib_file is not None:
-        # use cib_file if specified
-        if os.path.isfile(cib_file):
-            try:
-                current_cib = ET.parse(cib_file)
-            except Exception as e:
-                module.fail_json(msg="Error encountered parsing the cib_file - %s" % (e))
-            current_cib_root = current_cib.getroot()
-            module.params['cib_file_param'] = '-f ' + cib_file
-        else:
-            module.fail_json(msg="%(cib_file)s is not a file or doesn't exists" % module.params)
-    else:
-        # get running cluster configuration
-        rc, out, err = module.run_command('pcs cluster cib')
+    # get the pcs major.minor version, changes in cib_file are done without 'pcs' so we don't need it there
+    pcs_version = None
+    if cib_file is None:
+        rc, out, err = module.run_command('pcs --version')
         if rc == 0:
-            current_cib_root = ET.fromstring(out)
+            pcs_version = out.split('.')[0] + '.' + out.split('.')[1]
         else:
-            module.fail_json(msg='Failed to load cluster configuration', out=out, error=err)
+            module.fail_json(msg="pcs --version exited with non-zero exit code (" + rc + "): " + out + err)
+
+    current_cib_root = load_cib(module, cib_file)
 
     # check if non-default resource_discovery was requested
     module.params['resource_discovery_string'] = 'resource-discovery='+resource_discovery if (resource_discovery is not None) else ''
@@ -390,20 +436,29 @@ def run_module():
     # location constraint creation command
     if node_name is not None:
         if resource_discovery is not None:
-            cmd_create = 'pcs %(cib_file_param)s constraint location add %(constraint_id)s %(resource)s %(node_name)s %(score_prefix)s%(score)s %(resource_discovery_string)s' % module.params
+            cmd_create = 'pcs constraint location add %(constraint_id)s %(resource)s %(node_name)s %(score_prefix)s%(score)s %(resource_discovery_string)s' % module.params
         else:
-            cmd_create = 'pcs %(cib_file_param)s constraint location %(resource)s prefers %(node_name)s=%(score)s' % module.params
+            cmd_create = 'pcs constraint location %(resource)s prefers %(node_name)s=%(score)s' % module.params
     elif rule is not None:
-        cmd_create = 'pcs %(cib_file_param)s constraint location %(resource)s rule %(resource_discovery_string)s constraint-id=%(constraint_id)s score=%(score)s %(rule)s' % module.params
+        cmd_create = 'pcs constraint location %(resource)s rule %(resource_discovery_string)s constraint-id=%(constraint_id)s score=%(score)s %(rule)s' % module.params
 
     # location constriaint deleter command
     if constraint is not None:
-        cmd_delete = 'pcs %(cib_file_param)s constraint delete ' % module.params + constraint.attrib.get('id')
+        cmd_delete = 'pcs constraint delete ' + constraint.attrib.get('id')
 
     if state == 'present' and constraint is None:
         # constraint should be present, but we don't see it in configuration - lets create it
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # change the cib_file directly without calling 'pcs'
+                check_cib_references(module, current_cib_root, resources=[resource], nodes=[node_name] if node_name is not None else None)
+                try:
+                    create_constraint_element(current_cib_root, resource, node_name, rule, constraint_id, score, resource_discovery)
+                except ValueError as e:
+                    module.fail_json(msg="Failed to create constraint in cib_file - %s" % (e))
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_create)
             if rc == 0:
                 module.exit_json(**result)
@@ -424,6 +479,16 @@ def run_module():
         if not constraint_match:
             result['changed'] = True
             if not module.check_mode:
+                if cib_file is not None:
+                    # replace the constraint directly in cib_file without calling 'pcs'
+                    check_cib_references(module, current_cib_root, resources=[resource], nodes=[node_name] if node_name is not None else None)
+                    current_cib_root.find('./configuration/constraints').remove(constraint)
+                    try:
+                        create_constraint_element(current_cib_root, resource, node_name, rule, constraint_id, score, resource_discovery)
+                    except ValueError as e:
+                        module.fail_json(msg="Failed to create constraint replacement in cib_file - %s" % (e))
+                    push_cib(module, current_cib_root, cib_file)
+                    module.exit_json(**result)
                 rc, out, err = module.run_command(cmd_delete)
                 if rc != 0:
                     module.fail_json(msg="Failed to delete constraint for replacement with cmd: '" + cmd_delete + "'", output=out, error=err)
@@ -438,6 +503,11 @@ def run_module():
         # constraint should not be present but we have found something - lets remove that
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # remove the constraint directly from cib_file without calling 'pcs'
+                current_cib_root.find('./configuration/constraints').remove(constraint)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_delete)
             if rc == 0:
                 module.exit_json(**result)
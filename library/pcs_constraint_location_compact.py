@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_constraint_location_compact
+short_description: "replace per-node location constraints with node attribute rules"
+description:
+  - "module for replacing groups of per-node location constraints ('prefers'/'avoids') by single rule based
+     location constraint per resource that matches node attribute"
+  - "Nodes from the node class are tagged with node attribute I(attribute_name)=I(attribute_value) and each resource
+     that has location constraint with same score for every node of the class (and no other node)
+     gets one 'rule I(attribute_name) eq I(attribute_value)' location constraint instead."
+  - "All changes are done in one CIB update."
+version_added: "2.4"
+options:
+  attribute_name:
+    description:
+      - name of node attribute used for tagging the nodes from node class
+    required: true
+    type: str
+  attribute_value:
+    description:
+      - value of node attribute used for tagging the nodes from node class
+    required: true
+    type: str
+  node_list:
+    description:
+      - list of nodes that belongs to the node class
+      - "If not specified then nodes that already have the node attribute I(attribute_name)=I(attribute_value)
+         are considered to be the node class."
+    required: false
+    type: list
+    elements: str
+  resources:
+    description:
+      - list of resources which constraints can be compacted, when not specified all resources are considered
+    required: false
+    type: list
+    elements: str
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - all nodes from I(node_list) must already be present in the CIB 'nodes' section
+   - "constraints with 'role' or 'resource-discovery' options are never compacted"
+   - "module fails when node outside of I(node_list) already has the node attribute with same value
+      as the rules would then also match such node"
+'''
+
+EXAMPLES = '''
+- name: replace per-node location constraints for 'db' nodes with node attribute rules
+  pcs_constraint_location_compact:
+    attribute_name: 'node-class'
+    attribute_value: 'db'
+    node_list: ['node1', 'node2', 'node3']
+
+- name: compact only constraints of resources resA and resB using nodes that are already tagged with node-class=db
+  pcs_constraint_location_compact:
+    attribute_name: 'node-class'
+    attribute_value: 'db'
+    resources: ['resA', 'resB']
+'''
+
+import xml.etree.ElementTree as ET
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    find_unique_id,
+    load_cib,
+    push_cib,
+)
+
+
+def get_node_attribute(node, name):
+    for nvpair in node.findall('./instance_attributes/nvpair'):
+        if nvpair.attrib.get('name') == name:
+            return nvpair.attrib.get('value')
+    return None
+
+
+def set_node_attribute(cib, node, name, value):
+    instance_attributes = node.find('./instance_attributes')
+    if instance_attributes is None:
+        instance_attributes = ET.SubElement(node, 'instance_attributes', {
+            'id': find_unique_id(cib, 'nodes-' + node.attrib.get('id')),
+        })
+    for nvpair in instance_attributes.findall('./nvpair'):
+        if nvpair.attrib.get('name') == name:
+            nvpair.set('value', value)
+            return
+    ET.SubElement(instance_attributes, 'nvpair', {
+        'id': find_unique_id(cib, instance_attributes.attrib.get('id') + '-' + name),
+        'name': name,
+        'value': value,
+    })
+
+
+def is_node_attribute_rule_constraint(constraint, attribute_name, attribute_value):
+    # rule constraint with single expression 'attribute_name eq attribute_value'
+    rules = constraint.findall('./rule')
+    if len(rules) != 1:
+        return False
+    expressions = list(rules[0])
+    return (len(expressions) == 1
+            and expressions[0].tag == 'expression'
+            and expressions[0].attrib.get('attribute') == attribute_name
+            and expressions[0].attrib.get('operation') == 'eq'
+            and expressions[0].attrib.get('value') == attribute_value)
+
+
+def is_matching_rule_constraint(constraint, resource, score, attribute_name, attribute_value):
+    return (constraint.attrib.get('rsc') == resource
+            and is_node_attribute_rule_constraint(constraint, attribute_name, attribute_value)
+            and constraint.find('./rule').attrib.get('score') == score)
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            attribute_name=dict(required=True),
+            attribute_value=dict(required=True),
+            node_list=dict(required=False, type='list', elements='str'),
+            resources=dict(required=False, type='list', elements='str'),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    attribute_name = module.params['attribute_name']
+    attribute_value = module.params['attribute_value']
+    node_list = module.params['node_list']
+    resources = module.params['resources']
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    current_cib_root = load_cib(module, cib_file)
+
+    # nodes known to cluster and nodes already tagged with the node attribute
+    cib_nodes = {}
+    tagged_nodes = set()
+    for node in current_cib_root.findall('./configuration/nodes/node'):
+        cib_nodes[node.attrib.get('uname')] = node
+        if get_node_attribute(node, attribute_name) == attribute_value:
+            tagged_nodes.add(node.attrib.get('uname'))
+
+    if node_list is None:
+        node_class = tagged_nodes
+    else:
+        node_class = set(node_list)
+        missing_nodes = node_class - set(cib_nodes.keys())
+        if missing_nodes:
+            module.fail_json(msg="Nodes are not present in CIB 'nodes' section: %s" % ', '.join(sorted(missing_nodes)))
+        # rules would match also these nodes and that would change placement of resources
+        foreign_nodes = tagged_nodes - node_class
+        if foreign_nodes:
+            module.fail_json(msg="Nodes outside of node_list already have node attribute %s=%s: %s" % (
+                attribute_name, attribute_value, ', '.join(sorted(foreign_nodes))))
+
+    result['node_class'] = sorted(node_class)
+    if len(node_class) == 0:
+        module.fail_json(msg="No nodes found for node class %s=%s" % (attribute_name, attribute_value))
+
+    # group per-node location constraints by resource and score
+    cib_constraints = current_cib_root.find('./configuration/constraints')
+    constraint_groups = {}
+    for constr in cib_constraints.findall('./rsc_location'):
+        if (constr.attrib.get('node') is None
+                or constr.attrib.get('rsc') is None
+                or constr.attrib.get('score') is None
+                or constr.attrib.get('role') is not None
+                or constr.attrib.get('resource-discovery') is not None):
+            continue
+        if resources is not None and constr.attrib.get('rsc') not in resources:
+            continue
+        key = (constr.attrib.get('rsc'), constr.attrib.get('score'))
+        constraint_groups.setdefault(key, []).append(constr)
+
+    removed_constraints = []
+    created_constraints = []
+    for (resource, score), constraints in sorted(constraint_groups.items()):
+        if set(c.attrib.get('node') for c in constraints) != node_class or len(constraints) < 2:
+            continue
+        for constr in constraints:
+            removed_constraints.append(constr.attrib.get('id'))
+            cib_constraints.remove(constr)
+        # rule constraint may already exist from previous run - don't create a duplicate then
+        if any(is_matching_rule_constraint(c, resource, score, attribute_name, attribute_value)
+               for c in cib_constraints.findall('./rsc_location')):
+            continue
+        constraint_id = find_unique_id(current_cib_root, 'location-' + resource)
+        constraint = ET.SubElement(cib_constraints, 'rsc_location', {'id': constraint_id, 'rsc': resource})
+        rule = ET.SubElement(constraint, 'rule', {'id': find_unique_id(current_cib_root, constraint_id + '-rule'), 'score': score})
+        ET.SubElement(rule, 'expression', {
+            'id': find_unique_id(current_cib_root, rule.attrib.get('id') + '-expr'),
+            'attribute': attribute_name,
+            'operation': 'eq',
+            'value': attribute_value,
+        })
+        created_constraints.append(constraint_id)
+
+    # tag the nodes when there is a rule that uses the node attribute, the rule may already exist from previous run
+    # that removed the per-node constraints but didn't tag all nodes
+    tagged = []
+    if removed_constraints or any(is_node_attribute_rule_constraint(c, attribute_name, attribute_value)
+                                  for c in cib_constraints.findall('./rsc_location')):
+        for node_name in sorted(node_class - tagged_nodes):
+            set_node_attribute(current_cib_root, cib_nodes[node_name], attribute_name, attribute_value)
+            tagged.append(node_name)
+
+    result.update({
+        'removed_constraints': len(removed_constraints),
+        'removed_constraint_ids': removed_constraints,
+        'created_constraint_ids': created_constraints,
+        'tagged_nodes': tagged,
+    })
+
+    if not removed_constraints and not tagged:
+        result['changed'] = False
+        module.exit_json(**result)
+
+    result['changed'] = True
+    if not module.check_mode:
+        push_cib(module, current_cib_root, cib_file)
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_constraint_location_preview
+short_description: "compute per-node location scores of resource without running the scheduler"
+description:
+  - "module for evaluating 'rsc_location' constraints (node scores, rules, score attributes, expressions,
+     date expressions and date-specs) of given resource against the node attributes from CIB 'nodes' and 'status'
+     sections at given time"
+  - "Returns the effective per-node score table of location constraints for resource. This can be used to check
+     the rule changes in I(cib_file) before pushing them into cluster."
+  - "Constraints of the parent group, clone or bundle of the resource (and of tags containing the resource or its
+     parents) are evaluated too as they also decide where the resource runs."
+  - "Constraints and rules limited to 'Promoted' or 'Unpromoted' role don't change the scores of resource, they are
+     returned in separate per-role table 'role_scores'."
+  - "Module never changes the cluster configuration."
+version_added: "2.4"
+options:
+  resource:
+    description:
+      - resource for which the location constraints are evaluated
+    required: true
+    type: str
+  timestamp:
+    description:
+      - "time at which the date expressions are evaluated in form 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'"
+      - "If not specified then current time of the node running the module is used."
+    required: false
+    type: str
+  cib_file:
+    description:
+      - "Evaluate the constraints from specified file containing cluster CIB instead of running cluster."
+    required: false
+    type: str
+notes:
+   - "only location constraints are considered, scores from colocation constraints, stickiness or utilization
+      are not part of the result"
+   - "time zone designators of dates are ignored, all dates are compared as they are written"
+   - "'moon' date-spec attribute and rules with 'value-source' other than 'literal' are not supported
+      and never match"
+'''
+
+EXAMPLES = '''
+- name: show location scores of resource resA as they would be next monday at 10:00
+  pcs_constraint_location_preview:
+    resource: 'resA'
+    timestamp: '2024-06-03 10:00:00'
+  register: resA_scores
+
+- name: preview location scores of resource resA with rule changes made in offline copy of CIB
+  pcs_constraint_location_preview:
+    resource: 'resA'
+    cib_file: '/tmp/cib-with-changes.xml'
+'''
+
+import calendar
+import datetime
+import re
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    CIB_RESOURCE_TAGS,
+    load_cib,
+    node_kind,
+    normalize_role,
+)
+
+# pacemaker is using 1000000 as INFINITY score
+SCORE_INFINITY = 1000000
+
+
+def parse_score(score):
+    if score is None:
+        return 0
+    if score in ['INFINITY', '+INFINITY']:
+        return SCORE_INFINITY
+    if score == '-INFINITY':
+        return -SCORE_INFINITY
+    try:
+        return max(-SCORE_INFINITY, min(SCORE_INFINITY, int(score)))
+    except ValueError:
+        # node health scores (red/yellow/green) are not supported
+        return 0
+
+
+def format_score(score):
+    if score >= SCORE_INFINITY:
+        return 'INFINITY'
+    if score <= -SCORE_INFINITY:
+        return '-INFINITY'
+    return str(score)
+
+
+def format_scores(scores):
+    return dict((node, format_score(score)) for node, score in scores.items())
+
+
+def add_scores(score1, score2):
+    # -INFINITY wins over everything, INFINITY over everything else
+    if score1 <= -SCORE_INFINITY or score2 <= -SCORE_INFINITY:
+        return -SCORE_INFINITY
+    if score1 >= SCORE_INFINITY or score2 >= SCORE_INFINITY:
+        return SCORE_INFINITY
+    return max(-SCORE_INFINITY, min(SCORE_INFINITY, score1 + score2))
+
+
+def parse_date(date_string):
+    date_parsed = re.search(r"^\s*(\d{4})-(\d{2})-(\d{2})(?:[T\s]+(\d{1,2}):(\d{2})(?::(\d{2}))?)?", date_string or '')
+    if not date_parsed:
+        raise ValueError("Unable to parse date '%s'" % date_string)
+    return datetime.datetime(*[int(group or 0) for group in date_parsed.groups()])
+
+
+def add_duration(start, duration):
+    months = int(duration.attrib.get('years', 0)) * 12 + int(duration.attrib.get('months', 0))
+    year = start.year + (start.month - 1 + months) // 12
+    month = (start.month - 1 + months) % 12 + 1
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    end = start.replace(year=year, month=month, day=day)
+    return end + datetime.timedelta(
+        weeks=int(duration.attrib.get('weeks', 0)),
+        days=int(duration.attrib.get('days', 0)),
+        hours=int(duration.attrib.get('hours', 0)),
+        minutes=int(duration.attrib.get('minutes', 0)),
+        seconds=int(duration.attrib.get('seconds', 0)),
+    )
+
+
+def in_spec_range(value, spec_range):
+    if spec_range is None:
+        return True
+    if '-' in spec_range.strip('-'):
+        low, high = spec_range.split('-', 1)
+        return int(low) <= value <= int(high)
+    return value == int(spec_range)
+
+
+def evaluate_date_spec(date_spec, now):
+    if date_spec.attrib.get('moon') is not None:
+        return False
+    iso_year, iso_week, iso_weekday = now.isocalendar()
+    return all([
+        in_spec_range(now.hour, date_spec.attrib.get('hours')),
+        in_spec_range(now.minute, date_spec.attrib.get('minutes')),
+        in_spec_range(now.second, date_spec.attrib.get('seconds')),
+        in_spec_range(now.day, date_spec.attrib.get('monthdays')),
+        in_spec_range(iso_weekday, date_spec.attrib.get('weekdays')),
+        in_spec_range(now.timetuple().tm_yday, date_spec.attrib.get('yeardays')),
+        in_spec_range(now.month, date_spec.attrib.get('months')),
+        in_spec_range(iso_week, date_spec.attrib.get('weeks')),
+        in_spec_range(now.year, date_spec.attrib.get('years')),
+        in_spec_range(iso_year, date_spec.attrib.get('weekyears')),
+    ])
+
+
+def evaluate_date_expression(expression, now):
+    operation = expression.attrib.get('operation', 'in_range')
+    if operation == 'gt':
+        return now > parse_date(expression.attrib.get('start'))
+    if operation == 'lt':
+        return now < parse_date(expression.attrib.get('end'))
+    if operation == 'in_range':
+        start = expression.attrib.get('start')
+        if start is not None and now < parse_date(start):
+            return False
+        duration = expression.find('./duration')
+        if expression.attrib.get('end') is not None:
+            return now <= parse_date(expression.attrib.get('end'))
+        if duration is not None and start is not None:
+            return now <= add_duration(parse_date(start), duration)
+        return True
+    if operation == 'date_spec':
+        date_spec = expression.find('./date_spec')
+        return date_spec is not None and evaluate_date_spec(date_spec, now)
+    return False
+
+
+def compare_values(node_value, value, value_type, operation):
+    if value_type is None:
+        if operation in ['lt', 'gt', 'lte', 'gte']:
+            value_type = 'number' if '.' in (node_value or '') or '.' in (value or '') else 'integer'
+        else:
+            value_type = 'string'
+    try:
+        if value_type == 'integer':
+            node_value, value = int(node_value), int(value)
+        elif value_type == 'number':
+            node_value, value = float(node_value), float(value)
+        elif value_type == 'version':
+            node_value = [int(part) for part in re.findall(r"\d+", node_value)]
+            value = [int(part) for part in re.findall(r"\d+", value)]
+    except (TypeError, ValueError):
+        # pacemaker falls back to string comparison for values that cannot be converted
+        pass
+    if operation == 'eq':
+        return node_value == value
+    if operation == 'ne':
+        return node_value != value
+    if operation == 'lt':
+        return node_value < value
+    if operation == 'gt':
+        return node_value > value
+    if operation == 'lte':
+        return node_value <= value
+    if operation == 'gte':
+        return node_value >= value
+    return False
+
+
+def evaluate_expression(expression, attributes):
+    operation = expression.attrib.get('operation')
+    node_value = attributes.get(expression.attrib.get('attribute'))
+    if operation == 'defined':
+        return node_value is not None
+    if operation == 'not_defined':
+        return node_value is None
+    if expression.attrib.get('value-source', 'literal') != 'literal':
+        return False
+    if node_value is None:
+        # comparison with undefined attribute is true only for 'ne'
+        return operation == 'ne'
+    return compare_values(node_value, expression.attrib.get('value'), expression.attrib.get('type'), operation)
+
+
+def evaluate_rule(rule, attributes, now):
+    results = []
+    for child in rule:
+        if child.tag == 'expression':
+            results.append(evaluate_expression(child, attributes))
+        elif child.tag == 'date_expression':
+            results.append(evaluate_date_expression(child, now))
+        elif child.tag == 'rule':
+            results.append(evaluate_rule(child, attributes, now))
+        else:
+            # resource and operation expressions have no meaning for location rules
+            results.append(False)
+    if not results:
+        return True
+    if rule.attrib.get('boolean-op', 'and') == 'or':
+        return any(results)
+    return all(results)
+
+
+def resource_with_parents(cib, resource):
+    """Return list with resource and IDs of its parent group, clone or bundle (from the closest one)."""
+    resources = cib.find('./configuration/resources')
+    if resources is None:
+        return [resource]
+    parents = dict((child, parent) for parent in resources.iter() for child in parent)
+    for elem in resources.iter():
+        if elem.tag in CIB_RESOURCE_TAGS and elem.attrib.get('id') == resource and elem in parents:
+            names = [resource]
+            parent = parents[elem]
+            while parent is not resources:
+                if parent.tag in CIB_RESOURCE_TAGS:
+                    names.append(parent.attrib.get('id'))
+                parent = parents[parent]
+            return names
+    return [resource]
+
+
+def constraint_applies(cib, constraint, resources):
+    """Return the first of resources (resource and its parents) to which constraint applies or None."""
+    rsc = constraint.attrib.get('rsc')
+    pattern = constraint.attrib.get('rsc-pattern')
+    set_refs = [ref.attrib.get('id') for ref in constraint.findall('./resource_set/resource_ref')]
+    for resource in resources:
+        if rsc == resource:
+            return resource
+        if rsc is not None:
+            # resource tagged with tag used in constraint
+            for tag in cib.findall('./configuration/tags/tag'):
+                if tag.attrib.get('id') == rsc and resource in [o.attrib.get('id') for o in tag.findall('./obj_ref')]:
+                    return resource
+        elif pattern is not None:
+            if re.search(pattern, resource) is not None:
+                return resource
+        elif resource in set_refs:
+            return resource
+    return None
+
+
+def constraint_scores_role(role):
+    # 'Started' role matches all instances of resource, same as constraint without role
+    if role is None or role == 'Started':
+        return None
+    return normalize_role(role)
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            resource=dict(required=True),
+            timestamp=dict(required=False),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    resource = module.params['resource']
+    timestamp = module.params['timestamp']
+    cib_file = module.params['cib_file']
+
+    result = {'changed': False}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    if timestamp is not None:
+        try:
+            now = parse_date(timestamp)
+        except ValueError as e:
+            module.fail_json(msg="Error encountered parsing the timestamp - %s" % (e))
+    else:
+        now = datetime.datetime.now().replace(microsecond=0)
+
+    current_cib_root = load_cib(module, cib_file)
+
+    properties = {}
+    for nvpair in current_cib_root.findall('./configuration/crm_config/cluster_property_set/nvpair'):
+        properties[nvpair.attrib.get('name')] = nvpair.attrib.get('value')
+    symmetric_cluster = properties.get('symmetric-cluster', 'true').lower() not in ['false', 'no', 'off', '0']
+
+    # node attributes - transient attributes from 'status' section take precedence over permanent ones
+    node_attributes = {}
+    for node in current_cib_root.findall('./configuration/nodes/node'):
+        node_id = node.attrib.get('id')
+        attributes = {
+            '#uname': node.attrib.get('uname'),
+            '#id': node_id,
+            '#kind': node_kind(current_cib_root, node),
+            '#is_dc': 'true' if current_cib_root.attrib.get('dc-uuid') == node_id else 'false',
+            '#cluster-name': properties.get('cluster-name'),
+        }
+        for nvpair in node.findall('./instance_attributes/nvpair'):
+            attributes[nvpair.attrib.get('name')] = nvpair.attrib.get('value')
+        for node_state in current_cib_root.findall('./status/node_state'):
+            if node_state.attrib.get('id') == node_id:
+                for nvpair in node_state.findall('./transient_attributes/instance_attributes/nvpair'):
+                    attributes[nvpair.attrib.get('name')] = nvpair.attrib.get('value')
+        # '#site-name' is 'site-name' node attribute, cluster name is used only when node doesn't have it
+        attributes['#site-name'] = attributes.get('site-name', properties.get('cluster-name'))
+        node_attributes[node.attrib.get('uname')] = attributes
+
+    scores = dict((node, 0) for node in node_attributes)
+    # constraints and rules limited to role ('Promoted'/'Unpromoted') apply only to instances in that role,
+    # so they are kept in separate per-role tables and don't change the scores of the resource
+    role_scores = {}
+    mentioned_nodes = set()
+    matched_constraints = []
+    resources = resource_with_parents(current_cib_root, resource)
+    for constraint in current_cib_root.findall('./configuration/constraints/rsc_location'):
+        matched_resource = constraint_applies(current_cib_root, constraint, resources)
+        if matched_resource is None:
+            continue
+        constraint_role = constraint_scores_role(constraint.attrib.get('role'))
+        constraint_scores = {}
+        if constraint.attrib.get('node') is not None:
+            if constraint.attrib.get('node') in scores:
+                constraint_scores[(constraint_role, constraint.attrib.get('node'))] = parse_score(constraint.attrib.get('score'))
+        for rule in constraint.findall('./rule'):
+            rule_role = constraint_scores_role(rule.attrib.get('role')) or constraint_role
+            for node, attributes in node_attributes.items():
+                try:
+                    matched = evaluate_rule(rule, attributes, now)
+                except ValueError as e:
+                    module.fail_json(msg="Error encountered evaluating rule '%s' - %s" % (rule.attrib.get('id'), e))
+                if not matched:
+                    continue
+                if rule.attrib.get('score-attribute') is not None:
+                    rule_score = parse_score(attributes.get(rule.attrib.get('score-attribute')))
+                else:
+                    rule_score = parse_score(rule.attrib.get('score'))
+                constraint_scores[(rule_role, node)] = add_scores(constraint_scores.get((rule_role, node), 0), rule_score)
+        general_scores, constraint_role_scores = {}, {}
+        for (role, node), score in constraint_scores.items():
+            if role is None:
+                general_scores[node] = score
+                scores[node] = add_scores(scores[node], score)
+                mentioned_nodes.add(node)
+            else:
+                constraint_role_scores.setdefault(role, {})[node] = score
+                role_table = role_scores.setdefault(role, {})
+                role_table[node] = add_scores(role_table.get(node, 0), score)
+        matched_constraints.append({
+            'id': constraint.attrib.get('id'),
+            'resource': matched_resource,
+            'role': constraint.attrib.get('role'),
+            'scores': format_scores(general_scores),
+            'role_scores': dict((role, format_scores(role_table)) for role, role_table in constraint_role_scores.items()),
+        })
+
+    if not symmetric_cluster:
+        # in opt-in clusters resources can run only on nodes enabled by constraints
+        for node in set(scores.keys()) - mentioned_nodes:
+            scores[node] = -SCORE_INFINITY
+
+    allowed_nodes = sorted([node for node in scores if scores[node] > -SCORE_INFINITY],
+                           key=lambda node: (-scores[node], node))
+    result.update({
+        'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'scores': format_scores(scores),
+        'allowed_nodes': allowed_nodes,
+        'banned_nodes': sorted(set(scores.keys()) - set(allowed_nodes)),
+        'preferred_node': allowed_nodes[0] if allowed_nodes else None,
+        'role_scores': dict((role, format_scores(role_table)) for role, role_table in role_scores.items()),
+        'matched_constraints': matched_constraints,
+    })
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
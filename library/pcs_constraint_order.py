@@ -71,6 +71,7 @@ options:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
       - "This module requires the file to already contain cluster configuration."
+      - "Changes are done directly in the file without calling 'pcs', IDs of new elements follow the 'pcs' ID scheme."
     required: false
     type: str
 notes:
@@ -108,10 +109,29 @@ EXAMPLES = '''
     state: 'absent'
 '''
 
-import os.path
 import xml.etree.ElementTree as ET
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    check_cib_references,
+    find_unique_id,
+    load_cib,
+    push_cib,
+    sanitize_id,
+)
+
+
+def create_constraint_element(cib, resource1, resource2, resource1_action, resource2_action, kind, symmetrical):
+    """Create 'rsc_order' element with same ID as would 'pcs' create."""
+    return ET.SubElement(cib.find('./configuration/constraints'), 'rsc_order', {
+        'id': find_unique_id(cib, sanitize_id('order-%s-%s-%s' % (resource1, resource2, kind.lower()))),
+        'first': resource1,
+        'first-action': resource1_action,
+        'then': resource2,
+        'then-action': resource2_action,
+        'kind': kind,
+        'symmetrical': symmetrical,
+    })
 
 
 def run_module():
@@ -144,25 +164,7 @@ def run_module():
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
 
-    module.params['cib_file_param'] = ''
-    if cib_file is not None:
-        # use cib_file if specified
-        if os.path.isfile(cib_file):
-            try:
-                current_cib = ET.parse(cib_file)
-            except Exception as e:
-                module.fail_json(msg="Error encountered parsing the cib_file - %s" % (e))
-            current_cib_root = current_cib.getroot()
-            module.params['cib_file_param'] = '-f ' + cib_file
-        else:
-            module.fail_json(msg="%(cib_file)s is not a file or doesn't exists" % module.params)
-    else:
-        # get running cluster configuration
-        rc, out, err = module.run_command('pcs cluster cib')
-        if rc == 0:
-            current_cib_root = ET.fromstring(out)
-        else:
-            module.fail_json(msg='Failed to load cluster configuration', out=out, error=err)
+    current_cib_root = load_cib(module, cib_file)
 
     # try to find the constraint we have defined
     constraint = None
@@ -192,19 +194,25 @@ def run_module():
         result.update({'constraint_was_matched': False})
 
     # order constraint creation command
-    cmd_create = """ pcs %(cib_file_param)s constraint
+    cmd_create = """ pcs constraint
                      order %(resource1_action)s %(resource1)s
                      then %(resource2_action)s %(resource2)s
                      kind=%(kind)s symmetrical=%(symmetrical)s """ % module.params
 
     # order constraint deletion command
     if constraint is not None:
-        cmd_delete = 'pcs %(cib_file_param)s constraint delete ' % module.params + constraint.attrib.get('id')
+        cmd_delete = 'pcs constraint delete ' + constraint.attrib.get('id')
 
     if state == 'present' and constraint is None:
         # constraint should be present, but we don't see it in configuration - lets create it
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # change the cib_file directly without calling 'pcs'
+                check_cib_references(module, current_cib_root, resources=[resource1, resource2])
+                create_constraint_element(current_cib_root, resource1, resource2, resource1_action, resource2_action, kind, symmetrical)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_create)
             if rc == 0:
                 module.exit_json(**result)
@@ -219,6 +227,13 @@ def run_module():
         if constraint.attrib.get('kind', 'Mandatory') != kind or constraint.attrib.get('symmetrical', 'true') != symmetrical:
             result['changed'] = True
             if not module.check_mode:
+                if cib_file is not None:
+                    # replace the constraint directly in cib_file without calling 'pcs'
+                    check_cib_references(module, current_cib_root, resources=[resource1, resource2])
+                    current_cib_root.find('./configuration/constraints').remove(constraint)
+                    create_constraint_element(current_cib_root, resource1, resource2, resource1_action, resource2_action, kind, symmetrical)
+                    push_cib(module, current_cib_root, cib_file)
+                    module.exit_json(**result)
                 rc, out, err = module.run_command(cmd_delete)
                 if rc != 0:
                     module.fail_json(msg="Failed to delete constraint for replacement with cmd: '" + cmd_delete + "'",
@@ -235,6 +250,11 @@ def run_module():
         # constraint should not be present but we have found something - lets remove that
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # remove the constraint directly from cib_file without calling 'pcs'
+                current_cib_root.find('./configuration/constraints').remove(constraint)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_delete)
             if rc == 0:
                 module.exit_json(**result)
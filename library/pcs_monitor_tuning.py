@@ -0,0 +1,290 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_monitor_tuning
+short_description: "tune recurring monitor operations of all resources with monitor load budget"
+description:
+  - "module for changing interval and timeout of recurring monitor operations of resources selected by agent
+     or resource name and for computing the monitor load (monitor operations per second) of each cluster node"
+  - "Monitor load is computed for current placement of resources taken from CIB 'status' section."
+  - "All changes are done in one CIB update, module fails without doing any change when the monitor load
+     of any node would exceed I(max_ops_per_second)."
+version_added: "2.4"
+options:
+  rules:
+    description:
+      - "list of rules applied in given order, later rule overrides the values from earlier rule for same monitor operation"
+      - "Each rule is dictionary with keys 'agent' (resource agent as 'class:provider:type', 'class:type' or just 'type')
+         and/or 'resources' (list of resource names or shell-style wildcards, matched also against names of groups and
+         clones containing the resource), 'role' (optional, change only monitor operations with this role)
+         and values to set 'interval' and/or 'timeout'."
+      - "Module fails when the rules would give same interval to more monitor operations of one resource (for example
+         to both role specific monitors of promotable resource when the rule doesn't have 'role')."
+    required: false
+    default: []
+    type: list
+    elements: dict
+  max_ops_per_second:
+    description:
+      - "maximal number of monitor operations per second on any cluster node after applying the rules"
+    required: false
+    type: float
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "resources that are not running (or all resources when I(cib_file) has no 'status' section) are not counted
+      into monitor load and they are reported in 'unplaced_resources'"
+   - "module can be run without I(rules) to only report the monitor load"
+   - "when interval of operation changes and its ID is the one generated by 'pcs' ('<resource>-monitor-interval-<interval>'),
+      the ID is changed to contain the new interval, other IDs are kept"
+'''
+
+EXAMPLES = '''
+- name: report monitor load of cluster nodes
+  pcs_monitor_tuning:
+  register: monitor_load
+
+- name: monitor IP addresses every 30 seconds and databases every 20 seconds with 2 ops/s budget per node
+  pcs_monitor_tuning:
+    rules:
+      - agent: 'ocf:heartbeat:IPaddr2'
+        interval: '30s'
+        timeout: '20s'
+      - resources: ['db-*']
+        interval: '20s'
+    max_ops_per_second: 2
+'''
+
+import fnmatch
+import re
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    find_unique_id,
+    load_cib,
+    normalize_role,
+    push_cib,
+    sanitize_id,
+)
+
+INTERVAL_UNITS = {
+    'ms': 0.001, 'msec': 0.001,
+    'us': 0.000001, 'usec': 0.000001,
+    '': 1, 's': 1, 'sec': 1,
+    'm': 60, 'min': 60,
+    'h': 3600, 'hr': 3600,
+}
+PROMOTED_ROLES = ['Master', 'Promoted']
+
+
+def parse_interval(interval):
+    """Return interval in seconds, supports pacemaker time units ('10', '10s', '5min', '500ms') and ISO8601 durations ('PT1M')."""
+    if interval is None:
+        return 0
+    interval = interval.strip()
+    match = re.match(r'^P(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)$', interval)
+    if match:
+        hours, minutes, seconds = (int(value or 0) for value in match.groups())
+        return hours * 3600 + minutes * 60 + seconds
+    match = re.match(r'^(\d+)\s*([a-z]*)$', interval)
+    if match and match.group(2) in INTERVAL_UNITS:
+        return int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+    return None
+
+
+def primitive_agent(primitive):
+    return ':'.join(primitive.attrib.get(attr) for attr in ['class', 'provider', 'type'] if primitive.attrib.get(attr) is not None)
+
+
+def rule_matches(rule, primitive, resource_names, op):
+    if rule.get('role') is not None and normalize_role(op.attrib.get('role')) != normalize_role(rule['role']):
+        return False
+    if rule.get('agent') is not None and rule['agent'] not in [primitive_agent(primitive), primitive.attrib.get('type')]:
+        return False
+    if rule.get('resources') is not None and not any(fnmatch.fnmatchcase(name, pattern)
+                                                     for name in resource_names for pattern in rule['resources']):
+        return False
+    return True
+
+
+def resource_placement(cib):
+    """Return dictionary with primitive name as key and list of (node, promoted) where it runs as value."""
+    placement = {}
+    for node_state in cib.findall('./status/node_state'):
+        node_name = node_state.attrib.get('uname')
+        for lrm_resource in node_state.findall('./lrm/lrm_resources/lrm_resource'):
+            # last non-recurring operation decides if resource is active on node
+            last_op = None
+            for lrm_op in lrm_resource.findall('./lrm_rsc_op'):
+                if parse_interval(lrm_op.attrib.get('interval', '0')) or int(lrm_op.attrib.get('call-id', '-1')) < 0:
+                    continue
+                if last_op is None or int(lrm_op.attrib.get('call-id')) > int(last_op.attrib.get('call-id')):
+                    last_op = lrm_op
+            if last_op is None or last_op.attrib.get('rc-code') not in ['0', '8']:
+                continue
+            if last_op.attrib.get('operation') not in ['start', 'promote', 'migrate_from', 'monitor', 'demote']:
+                continue
+            promoted = last_op.attrib.get('rc-code') == '8' or last_op.attrib.get('operation') == 'promote'
+            # clone instances are named '<resource>:<instance>'
+            resource_name = lrm_resource.attrib.get('id').split(':')[0]
+            placement.setdefault(resource_name, []).append((node_name, promoted))
+    return placement
+
+
+def operation_id(resource_name, op, interval):
+    # same scheme as 'pcs' is using for IDs of operations
+    return sanitize_id('%s-%s-interval-%s' % (resource_name, op.attrib.get('name'), interval))
+
+
+def monitor_load(monitors, placement):
+    """Return dictionary with node name as key and monitor operations per second as value."""
+    load = {}
+    for resource_name, ops in monitors.items():
+        for node_name, promoted in placement.get(resource_name, []):
+            for op in ops:
+                role = op.attrib.get('role')
+                if role is not None and (role in PROMOTED_ROLES) != promoted:
+                    continue
+                interval = parse_interval(op.attrib.get('interval'))
+                if interval:
+                    load[node_name] = load.get(node_name, 0) + 1.0 / interval
+    return dict((node_name, round(value, 4)) for node_name, value in load.items())
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            rules=dict(required=False, type='list', elements='dict', default=[]),
+            max_ops_per_second=dict(required=False, type='float'),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    rules = module.params['rules']
+    max_ops_per_second = module.params['max_ops_per_second']
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    for rule in rules:
+        if rule.get('agent') is None and rule.get('resources') is None:
+            module.fail_json(msg="Each rule must contain 'agent' or 'resources': %s" % rule)
+        if rule.get('interval') is None and rule.get('timeout') is None:
+            module.fail_json(msg="Each rule must contain 'interval' or 'timeout': %s" % rule)
+        for key in ['interval', 'timeout']:
+            if rule.get(key) is not None and not parse_interval(str(rule[key])):
+                module.fail_json(msg="Rule has invalid %s '%s': %s" % (key, rule[key], rule))
+        if rule.get('resources') is not None and not isinstance(rule['resources'], list):
+            rule['resources'] = [rule['resources']]
+
+    cib = load_cib(module, cib_file)
+
+    # recurring monitor operations of all primitives together with names of resources containing them
+    resources = cib.find('./configuration/resources')
+    parents = dict((child, parent) for parent in resources.iter() for child in parent)
+    monitors = {}
+    resource_names = {}
+    primitives = {}
+    for primitive in resources.iter('primitive'):
+        name = primitive.attrib.get('id')
+        primitives[name] = primitive
+        names = [name]
+        elem = primitive
+        while parents.get(elem) is not None and parents[elem] is not resources:
+            elem = parents[elem]
+            names.append(elem.attrib.get('id'))
+        resource_names[name] = names
+        monitors[name] = [op for op in primitive.findall("./operations/op[@name='monitor']")
+                          if parse_interval(op.attrib.get('interval')) and op.attrib.get('enabled', 'true') != 'false']
+
+    placement = resource_placement(cib)
+    load_before = monitor_load(monitors, placement)
+
+    changed_operations = []
+    for name in sorted(monitors.keys()):
+        for op in monitors[name]:
+            requested = {}
+            for rule in rules:
+                if rule_matches(rule, primitives[name], resource_names[name], op):
+                    for key in ['interval', 'timeout']:
+                        if rule.get(key) is not None:
+                            requested[key] = str(rule[key])
+            changes = {}
+            old_interval = op.attrib.get('interval')
+            for key, value in sorted(requested.items()):
+                if key == 'interval' and parse_interval(op.attrib.get(key)) == parse_interval(value):
+                    continue
+                if op.attrib.get(key) != value:
+                    changes[key] = value
+                    op.set(key, value)
+            if changes:
+                changes.update({'resource': name, 'id': op.attrib.get('id')})
+                # operation IDs generated by 'pcs' contain the interval, so they are renamed with the interval
+                if 'interval' in changes and op.attrib.get('id') == operation_id(name, op, old_interval):
+                    op.set('id', find_unique_id(cib, operation_id(name, op, changes['interval'])))
+                    changes.update({'id': op.attrib.get('id'), 'previous_id': changes['id']})
+                changed_operations.append(changes)
+
+        # pacemaker identifies recurring operations by name and interval, so they must stay unique
+        intervals = {}
+        for op in monitors[name]:
+            intervals.setdefault(parse_interval(op.attrib.get('interval')), []).append(op.attrib.get('id'))
+        collisions = [ids for ids in intervals.values() if len(ids) > 1]
+        if collisions:
+            module.fail_json(msg="Monitor operations of resource '%s' would have same interval: %s, use 'role' in rules "
+                                 "to set different intervals for role specific monitors" % (
+                                     name, '; '.join(', '.join(ids) for ids in collisions)))
+
+    load_after = monitor_load(monitors, placement)
+    result.update({
+        'monitor_load_before': load_before,
+        'monitor_load': load_after,
+        'unplaced_resources': sorted(name for name in monitors if monitors[name] and name not in placement),
+        'changed_operations': changed_operations,
+        'changed': len(changed_operations) > 0,
+    })
+
+    if max_ops_per_second is not None:
+        over_budget = dict((node, load) for node, load in load_after.items() if load > max_ops_per_second)
+        if over_budget:
+            result['changed'] = False
+            module.fail_json(msg="Monitor load would exceed %s operations per second on nodes: %s" % (
+                max_ops_per_second, ', '.join('%s (%s)' % (node, load) for node, load in sorted(over_budget.items()))), **result)
+
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file, 'resources')
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,6 @@
 # Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
 
 from __future__ import absolute_import, division, print_function
-from packaging import version
 __metaclass__ = type
 
 
@@ -34,7 +33,8 @@ options:
   name:
     description:
       - name of cluster property
-    required: true
+      - One of C(name) or C(properties) is required
+    required: false
     type: str
   node:
     description:
@@ -46,6 +46,25 @@ options:
       - value of cluster property
     required: false
     type: str
+  properties:
+    description:
+      - "dictionary of cluster properties and their values that are compared with 'cluster_property_set' from CIB
+         'crm_config' section and applied together in one CIB update"
+      - "With I(state=present) the properties with value C(null) are unset, with I(state=absent) all listed
+         properties are unset."
+      - Mutually exclusive with C(name) and C(node)
+    required: false
+    type: dict
+  node_attributes:
+    description:
+      - "dictionary with node names as keys and dictionary of node attributes and their values as value,
+         attributes are compared with 'instance_attributes' of nodes from CIB 'nodes' section and applied
+         together in one CIB update"
+      - "With I(state=present) the node attributes with value C(null) are unset, with I(state=absent) all listed
+         node attributes are unset."
+      - Mutually exclusive with C(name), C(node) and C(properties)
+    required: false
+    type: dict
   cib_file:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
@@ -54,7 +73,7 @@ options:
 notes:
    - Tested on CentOS 7.6, Fedora 28, 29
    - Tested on Red Hat Enterprise Linux 7.6
-   - node property values with spaces are not idempotent
+   - "property names in I(properties) are not validated by 'pcs', misspelled properties are stored into CIB as they are"
 '''
 
 EXAMPLES = '''
@@ -79,23 +98,119 @@ EXAMPLES = '''
     name: 'standby'
     node: 'node-1'
     state: 'absent'
+
+- name: set multiple cluster properties and unset 'maintenance-mode' in one CIB update
+  pcs_property:
+    properties:
+      stonith-timeout: '120s'
+      cluster-recheck-interval: '5min'
+      no-quorum-policy: 'freeze'
+      maintenance-mode: null
+
+- name: set node attributes on multiple nodes in one CIB update
+  pcs_property:
+    node_attributes:
+      node-1:
+        rack: '1'
+        node-class: 'db'
+      node-2:
+        rack: '2'
+        node-class: 'db'
+        standby: null
 '''
 
 import os.path
-import re
+import xml.etree.ElementTree as ET
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    find_unique_id,
+    get_cluster_properties,
+    get_node_attributes,
+    get_pcs_version,
+    load_cib,
+    push_cib,
+    to_cib_value,
+    update_nvset,
+    version_tuple,
+)
+
+
+def run_bulk_properties(module):
+    state = module.params['state']
+    cib_file = module.params['cib_file']
+    requested = dict((name, None if state == 'absent' else to_cib_value(value))
+                     for name, value in module.params['properties'].items())
+
+    cib = load_cib(module, cib_file)
+    crm_config = cib.find('./configuration/crm_config')
+    nvset = None
+    for property_set in crm_config.findall('./cluster_property_set'):
+        if property_set.attrib.get('id') == 'cib-bootstrap-options':
+            nvset = property_set
+            break
+    if nvset is None:
+        nvset = ET.SubElement(crm_config, 'cluster_property_set', {'id': 'cib-bootstrap-options'})
+
+    result = {
+        'detected_properties': {
+            'cluster': dict((nvpair.attrib.get('name'), nvpair.attrib.get('value')) for nvpair in nvset.findall('./nvpair')),
+        },
+    }
+    changes = update_nvset(cib, nvset, requested)
+    result['changed_properties'] = changes
+    result['changed'] = len(changes) > 0
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file, 'crm_config')
+    module.exit_json(**result)
+
+
+def run_bulk_node_attributes(module):
+    state = module.params['state']
+    cib_file = module.params['cib_file']
+
+    cib = load_cib(module, cib_file)
+    cib_nodes = dict((node.attrib.get('uname'), node) for node in cib.findall('./configuration/nodes/node'))
+    missing_nodes = set(module.params['node_attributes'].keys()) - set(cib_nodes.keys())
+    if missing_nodes:
+        module.fail_json(msg="Nodes are not present in CIB 'nodes' section: %s" % ', '.join(sorted(missing_nodes)))
+
+    result = {'detected_properties': {'node': {}}, 'changed_node_attributes': {}}
+    for node_name, attributes in sorted(module.params['node_attributes'].items()):
+        node = cib_nodes[node_name]
+        nvset = node.find('./instance_attributes')
+        if nvset is None:
+            nvset = ET.SubElement(node, 'instance_attributes', {'id': find_unique_id(cib, 'nodes-' + node.attrib.get('id'))})
+        result['detected_properties']['node'][node_name] = dict(
+            (nvpair.attrib.get('name'), nvpair.attrib.get('value')) for nvpair in nvset.findall('./nvpair'))
+        requested = dict((name, None if state == 'absent' else to_cib_value(value))
+                         for name, value in (attributes or {}).items())
+        changes = update_nvset(cib, nvset, requested)
+        if changes:
+            result['changed_node_attributes'][node_name] = changes
+        if len(nvset) == 0:
+            # don't leave empty instance_attributes behind
+            node.remove(nvset)
+
+    result['changed'] = len(result['changed_node_attributes']) > 0
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file, 'nodes')
+    module.exit_json(**result)
 
 
 def run_module():
     module = AnsibleModule(
         argument_spec=dict(
             state=dict(default="present", choices=['present', 'absent']),
-            name=dict(required=True),
+            name=dict(required=False),
             node=dict(required=False),
             value=dict(required=False),
+            properties=dict(required=False, type='dict'),
+            node_attributes=dict(required=False, type='dict'),
             cib_file=dict(required=False),
         ),
-        supports_check_mode=True
+        supports_check_mode=True,
+        mutually_exclusive=[('name', 'properties', 'node_attributes'), ('node', 'properties', 'node_attributes')],
+        required_one_of=[('name', 'properties', 'node_attributes')],
     )
 
     state = module.params['state']
@@ -110,58 +225,31 @@ def run_module():
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
 
+    if module.params['properties'] is not None:
+        run_bulk_properties(module)
+    if module.params['node_attributes'] is not None:
+        run_bulk_node_attributes(module)
+
     if state == 'present' and value is None:
         module.fail_json(msg="To set property 'value' must be specified.")
 
     module.params['cib_file_param'] = ''
     if cib_file is not None and os.path.isfile(cib_file):
         module.params['cib_file_param'] = '-f ' + cib_file
+    else:
+        cib_file = None
 
-    # get the pcs major.minor version
-    rc, pcs_version, err = module.run_command('pcs --version')
-    if rc != 0:
-        module.fail_json(msg="pcs --version exited with non-zero exit code (" + rc + "): " + out + err)
+    # get the pcs version
+    pcs_version = get_pcs_version(module)
+    if not (0, 9) <= version_tuple(pcs_version) < (0, 13):
+        module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
 
     # get property list from running cluster
+    properties = {'cluster': {}, 'node': {}}
     if node is not None:
-        rc, out, err = module.run_command('pcs %(cib_file_param)s node attribute' % module.params)
-    else:
-        if version.parse(pcs_version) >= version.parse("0.9.0") and version.parse(pcs_version) < version.parse("0.10.0"):
-            cmd = 'pcs %(cib_file_param)s property show' % module.params
-        elif version.parse(pcs_version) >= version.parse("0.10.0") and version.parse(pcs_version) < version.parse("0.13.0"):
-            cmd = 'pcs %(cib_file_param)s property config' % module.params
-        else:
-            module.fail_json(msg="unsupported version of pcs (" + pcs_version + "). Only versions 0.9, 0.10, 0.11 and 0.12 are supported.")
-
-        rc, out, err = module.run_command(cmd)
-    properties = {}
-    if rc == 0:
-        # indicator in which part of parsing we are
-        property_type = None
-        properties['cluster'] = {}
-        properties['node'] = {}
-        delimiter = '=' if version.parse(pcs_version) > version.parse("0.11.5") else ':'
-        # we are stripping last line as they doesn't contain properties
-        for row in out.split('\n')[0:-1]:
-            # based on row we see the section to either cluster or node properties
-            if row.startswith('Cluster Properties:'):
-                property_type = 'cluster'
-            elif row == 'Node Attributes:':
-                property_type = 'node'
-            else:
-                # when identifier of section is not preset we are at the property
-                tmp = row.lstrip().split(delimiter)
-                if property_type == 'cluster':
-                    properties['cluster'][tmp[0]] = tmp[1].lstrip()
-                elif property_type == 'node':
-                    properties['node'][tmp[0]] = {}
-                    # FIXME: this matches only properties which values doesn't contain spaces
-                    match_node_properties = re.compile(r"(\w+=\w+)\s*")
-                    matched_properties = match_node_properties.findall(':'.join(tmp[1:]))
-                    for prop in matched_properties:
-                        properties['node'][tmp[0]][prop.split('=')[0]] = prop.split('=')[1]
+        properties['node'] = get_node_attributes(module, cib_file)
     else:
-        module.fail_json(msg='Failed to load properties from cluster. Is cluster running?')
+        properties['cluster'] = get_cluster_properties(module, pcs_version, cib_file)
 
     result['detected_properties'] = properties
 
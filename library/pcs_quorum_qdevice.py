@@ -79,9 +79,13 @@ EXAMPLES = '''
 '''
 
 import os.path
-import re
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.corosync_conf import (
+    CorosyncConfParseError,
+    get_quorum_device,
+    load_corosync_conf,
+)
 
 
 def run_module():
@@ -124,27 +128,26 @@ def run_module():
         module.fail_json(msg='When creating/updating qdevice you must have a cluster set')
 
     try:
-        corosync_conf = open('/etc/corosync/corosync.conf', 'r')
-        qdevice_defined = re.compile(r"device\s*\{([^}]+)\}", re.M + re.S)
-        re_qdevice_defined = qdevice_defined.findall(corosync_conf.read())
-    except IOError as e:
+        corosync_conf = load_corosync_conf()
+    except CorosyncConfParseError as e:
+        module.fail_json(msg='Could not parse corosync.conf: %s' % e)
+    if corosync_conf is None:
         module.fail_json(msg='Could not open corosync.conf')
 
-    if len(re_qdevice_defined) == 0:
+    device = get_quorum_device(corosync_conf)
+    if device is None:
         no_conf, config_qdevice_name_diff, config_qdevice_algo_diff = True, False, False
     else:
         no_conf = False
+        device_net = device.get('net') or {}
 
-        qdevice_name = re.compile(r"host\s*:\s*([\w.-]+)\s*", re.M)
-        qd_name = qdevice_name.findall(re_qdevice_defined[0])
-
+        qd_name = [device_net['host']] if device_net.get('host') else []
         if len(qd_name) == 0 or qd_name[0] != qdevice:
             config_qdevice_name_diff = True
         else:
             config_qdevice_name_diff = False
 
-        algorithm_name = re.compile(r"algorithm\s*:\s*([\w.-]+)\s*", re.M)
-        algo_name = algorithm_name.findall(re_qdevice_defined[0])
+        algo_name = [device_net['algorithm']] if device_net.get('algorithm') else []
         if len(algo_name) == 0 or algo_name[0] != algorithm:
             config_qdevice_algo_diff = True
         else:
@@ -40,13 +40,43 @@ options:
   name:
     description:
       - name of cluster resource default
-    required: true
+      - "Can be omitted only with I(set_id) and I(state=absent) to remove the whole defaults set."
+    required: false
+    type: str
+  set_id:
+    description:
+      - "ID of named defaults set ('pcs resource [op] defaults set ...', pcs-0.10 and newer)"
+      - "When not specified the default set managed by 'pcs resource [op] defaults' is used."
+    required: false
+    type: str
+  rule:
+    description:
+      - "rule of named defaults set, for example 'resource ocf:heartbeat:Filesystem' or 'op monitor interval=10s'"
+      - "Rule of existing set with different rule is replaced in place, the set keeps its meta attributes and its position
+         among other sets."
+      - Requires I(set_id)
+    required: false
     type: str
   value:
     description:
       - value of cluster resource default
     required: false
     type: str
+  defaults:
+    description:
+      - "dictionary of defaults and their values that are compared with the defaults set read directly from
+         CIB 'rsc_defaults' or 'op_defaults' section and applied together in one CIB update"
+      - "With I(state=present) the defaults with value C(null) are unset, with I(state=absent) all listed defaults are unset."
+      - "Can be combined with I(set_id) and I(rule) to manage named defaults set."
+      - Mutually exclusive with C(name) and C(value)
+    required: false
+    type: dict
+  purge:
+    description:
+      - "unset all defaults from the defaults set that are not listed in I(defaults)"
+    required: false
+    default: false
+    type: bool
   cib_file:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
@@ -59,6 +89,7 @@ notes:
    - tested on Fedora 32 - pcs 0.10.7
    - tested on Fedora 41 - pcs 0.11.9
    - tested on Fedora 42 - pcs 0.12.0
+   - named defaults sets (I(set_id)) requires pcs-0.10 or newer
 '''
 
 EXAMPLES = '''
@@ -83,10 +114,210 @@ EXAMPLES = '''
     defaults_type: 'op'
     name: 'timeout'
     state: 'absent'
+
+- name: set resource-stickiness=1000 only for Filesystem resources
+  pcs_resource_defaults:
+    set_id: 'fs-defaults'
+    rule: 'resource ocf:heartbeat:Filesystem'
+    name: 'resource-stickiness'
+    value: '1000'
+
+- name: set default timeout of monitor operations with 10s interval
+  pcs_resource_defaults:
+    defaults_type: 'op'
+    set_id: 'monitor-10s-defaults'
+    rule: 'op monitor interval=10s'
+    name: 'timeout'
+    value: '30s'
+
+- name: set all resource meta defaults at once and remove all other resource meta defaults
+  pcs_resource_defaults:
+    defaults:
+      resource-stickiness: '100'
+      migration-threshold: '3'
+      failure-timeout: '10min'
+    purge: true
+
+- name: set resource operation defaults at once
+  pcs_resource_defaults:
+    defaults_type: 'op'
+    defaults:
+      timeout: '60s'
+      record-pending: 'true'
+
+- name: remove the named defaults set 'fs-defaults'
+  pcs_resource_defaults:
+    set_id: 'fs-defaults'
+    state: 'absent'
 '''
 
+import os
 import os.path
+import tempfile
+try:
+    from shlex import quote
+except ImportError:
+    # python 2
+    from pipes import quote
 from ansible.module_utils.basic import AnsibleModule
+import xml.etree.ElementTree as ET
+from ansible.module_utils.pcs_utils import (
+    DEFAULTS_SECTIONS,
+    get_defaults_sets,
+    get_pcs_version,
+    get_resource_defaults,
+    load_cib,
+    normalize_rule_string,
+    nvsets_from_cib,
+    push_cib,
+    to_cib_value,
+    update_nvset,
+    version_tuple,
+)
+
+
+def replace_set_rule(module, cib, section_name, nvset, rule):
+    """Replace rule of defaults set in CIB with the rule that 'pcs' creates from rule string."""
+    old_rule = nvset.find('./rule')
+    if old_rule is not None:
+        nvset.remove(old_rule)
+    if rule is None:
+        return
+    # 'pcs' creates the set with the rule in a copy of CIB without the set, so the rule gets the IDs 'pcs' would use
+    cib_copy = ET.fromstring(ET.tostring(cib))
+    section_copy = cib_copy.find('./configuration/' + section_name)
+    for meta_attributes in section_copy.findall('./meta_attributes'):
+        if meta_attributes.attrib.get('id') == nvset.attrib.get('id'):
+            section_copy.remove(meta_attributes)
+    cib_copy_fd, cib_copy_path = tempfile.mkstemp()
+    os.close(cib_copy_fd)
+    module.add_cleanup_file(cib_copy_path)
+    ET.ElementTree(cib_copy).write(cib_copy_path)
+    defaults_cmd = 'resource defaults' if module.params['defaults_type'] == 'meta' else 'resource op defaults'
+    cmd = 'pcs -f %s %s set create id=%s rule %s' % (cib_copy_path, defaults_cmd, quote(nvset.attrib.get('id')), rule)
+    rc, out, err = module.run_command(cmd)
+    if rc != 0:
+        module.fail_json(msg="Failed to create rule of defaults set with cmd: '" + cmd + "'", output=out, error=err)
+    for meta_attributes in ET.parse(cib_copy_path).getroot().findall('./configuration/%s/meta_attributes' % section_name):
+        if meta_attributes.attrib.get('id') == nvset.attrib.get('id') and meta_attributes.find('./rule') is not None:
+            # rule must be the first element of the set
+            nvset.insert(0, meta_attributes.find('./rule'))
+            return
+    module.fail_json(msg="Rule of defaults set '%s' not found after running cmd: '%s'" % (nvset.attrib.get('id'), cmd))
+
+
+def run_bulk_defaults(module, cib_file):
+    state = module.params['state']
+    set_id = module.params['set_id']
+    rule = module.params['rule']
+    section_name = DEFAULTS_SECTIONS[module.params['defaults_type']]
+    requested = dict((name, None if state == 'absent' else to_cib_value(value))
+                     for name, value in module.params['defaults'].items())
+
+    cib = load_cib(module, cib_file)
+    section = cib.find('./configuration/' + section_name)
+    if section is None:
+        section = ET.SubElement(cib.find('./configuration'), section_name)
+
+    # find the set we should manage - named set or the first set without rule
+    nvset = None
+    for meta_attributes, detected in zip(section.findall('./meta_attributes'), nvsets_from_cib(section, 'meta_attributes')):
+        if (set_id is not None and detected['id'] == set_id) or (set_id is None and detected['rule'] is None):
+            nvset, detected_set = meta_attributes, detected
+            break
+    result = {'detected_defaults': {} if nvset is None else detected_set['nvpairs']}
+
+    if module.params['purge'] and state == 'present' and nvset is not None:
+        for name in detected_set['nvpairs']:
+            requested.setdefault(name, None)
+
+    rule_changed = False
+    if set_id is not None and state == 'present' and (nvset is None or normalize_rule_string(detected_set['rule']) != normalize_rule_string(rule)):
+        if nvset is None and all(value is None for value in requested.values()):
+            # nothing to set - don't create an empty set
+            result.update({'changed': False, 'changed_defaults': {}})
+            module.exit_json(**result)
+        pcs_full_version = get_pcs_version(module)
+        if version_tuple(pcs_full_version) < (0, 10):
+            module.fail_json(msg="named defaults sets requires pcs version 0.10 or newer")
+        if nvset is None:
+            nvset = ET.SubElement(section, 'meta_attributes', {'id': set_id})
+        # rule is changed in place so the set keeps its position (precedence) among other sets
+        replace_set_rule(module, cib, section_name, nvset, rule)
+        rule_changed = True
+
+    if nvset is None:
+        if state == 'absent' or all(value is None for value in requested.values()):
+            result.update({'changed': False, 'changed_defaults': {}})
+            module.exit_json(**result)
+        if set_id is None:
+            # same ID as 'pcs' would use for the new set
+            pcs_full_version = get_pcs_version(module)
+            suffix = '-options' if version_tuple(pcs_full_version) < (0, 10) else '-meta_attributes'
+            set_id = section_name + suffix
+        nvset = ET.SubElement(section, 'meta_attributes', {'id': set_id})
+
+    changes = update_nvset(cib, nvset, requested)
+    result['changed_defaults'] = changes
+    result['changed'] = len(changes) > 0 or rule_changed
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file, section_name)
+    module.exit_json(**result)
+
+
+def run_defaults_set(module, pcs_full_version, cib_file):
+    state = module.params['state']
+    name = module.params['name']
+    value = module.params['value']
+    set_id = module.params['set_id']
+    rule = module.params['rule']
+    module.params['defaults_cmd'] = 'resource defaults' if module.params['defaults_type'] == 'meta' else 'resource op defaults'
+
+    if version_tuple(pcs_full_version) < (0, 10):
+        module.fail_json(msg="named defaults sets requires pcs version 0.10 or newer")
+
+    nvset = None
+    for defaults_set in get_defaults_sets(module, pcs_full_version, module.params['defaults_type'], cib_file):
+        if defaults_set['id'] == set_id:
+            nvset = defaults_set
+            break
+    result = {'detected_set': nvset, 'detected_defaults': {} if nvset is None else nvset['nvpairs']}
+
+    cmds = []
+    if state == 'present' and nvset is None:
+        # set doesn't exist - create it
+        module.params['rule_param'] = '' if rule is None else 'rule ' + rule
+        cmds.append('pcs %s %s set create id=%s meta %s %s' % (
+            module.params['cib_file_param'], module.params['defaults_cmd'], quote(set_id), quote('%s=%s' % (name, value)),
+            module.params['rule_param']))
+    elif state == 'present' and normalize_rule_string(nvset['rule']) != normalize_rule_string(rule):
+        # rule is changed in place in CIB so the set keeps its position (precedence) among other sets
+        section_name = DEFAULTS_SECTIONS[module.params['defaults_type']]
+        cib = load_cib(module, cib_file)
+        for meta_attributes in cib.findall('./configuration/%s/meta_attributes' % section_name):
+            if meta_attributes.attrib.get('id') == set_id:
+                replace_set_rule(module, cib, section_name, meta_attributes, rule)
+                update_nvset(cib, meta_attributes, {name: value})
+        result['changed'] = True
+        if not module.check_mode:
+            push_cib(module, cib, cib_file, section_name)
+        module.exit_json(**result)
+    elif state == 'present' and nvset['nvpairs'].get(name) != value:
+        cmds.append('pcs %s %s set update %s meta %s' % (
+            module.params['cib_file_param'], module.params['defaults_cmd'], quote(set_id), quote('%s=%s' % (name, value))))
+    elif state == 'absent' and nvset is not None and name is None:
+        cmds.append('pcs %s %s set delete %s' % (module.params['cib_file_param'], module.params['defaults_cmd'], quote(set_id)))
+    elif state == 'absent' and nvset is not None and name in nvset['nvpairs']:
+        cmds.append('pcs %s %s set update %s meta %s' % (
+            module.params['cib_file_param'], module.params['defaults_cmd'], quote(set_id), quote(name + '=')))
+
+    result['changed'] = len(cmds) > 0
+    if not module.check_mode:
+        for cmd in cmds:
+            rc, out, err = module.run_command(cmd)
+            if rc != 0:
+                module.fail_json(msg="Failed to update defaults set with cmd: '" + cmd + "'", output=out, error=err)
+    module.exit_json(**result)
 
 
 def run_module():
@@ -94,11 +325,17 @@ def run_module():
         argument_spec=dict(
             state=dict(default="present", choices=['present', 'absent']),
             defaults_type=dict(required=False, default="meta", choices=['meta', 'op']),
-            name=dict(required=True),
+            name=dict(required=False),
             value=dict(required=False),
+            set_id=dict(required=False),
+            rule=dict(required=False),
+            defaults=dict(required=False, type='dict'),
+            purge=dict(required=False, type='bool', default=False),
             cib_file=dict(required=False),
         ),
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_by={'rule': 'set_id'},
+        mutually_exclusive=[('name', 'defaults'), ('value', 'defaults')],
     )
 
     state = module.params['state']
@@ -113,39 +350,31 @@ def run_module():
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
 
-    # get the pcs major.minor version
-    rc, out, err = module.run_command('pcs --version')
-    if rc == 0:
-        pcs_version = out.split('.')[0] + '.' + out.split('.')[1]
+    module.params['cib_file_param'] = ''
+    if cib_file is not None and os.path.isfile(cib_file):
+        module.params['cib_file_param'] = '-f ' + cib_file
     else:
-        module.fail_json(msg="pcs --version exited with non-zero exit code (" + rc + "): " + out + err)
+        cib_file = None
+
+    if module.params['defaults'] is not None:
+        run_bulk_defaults(module, cib_file)
+
+    # get the pcs major.minor version
+    pcs_full_version = get_pcs_version(module)
+    pcs_version = '.'.join(pcs_full_version.split('.')[0:2])
 
     if state == 'present' and value is None:
         module.fail_json(msg="To set a defaults 'value' must be specified.")
 
-    module.params['cib_file_param'] = ''
-    if cib_file is not None and os.path.isfile(cib_file):
-        module.params['cib_file_param'] = '-f ' + cib_file
+    if name is None and not (module.params['set_id'] is not None and state == 'absent'):
+        module.fail_json(msg="'name' must be specified unless removing whole defaults set.")
 
     # get defaults list from running cluster
-    if defaults_type == 'meta':
-        rc, out, err = module.run_command('pcs %(cib_file_param)s resource defaults' % module.params)
-    elif defaults_type == 'op':
-        rc, out, err = module.run_command('pcs %(cib_file_param)s resource op defaults' % module.params)
-    else:
+    if defaults_type not in ['meta', 'op']:
         module.fail_json(msg="'" + defaults_type + "' is not implemented by this module")
-
-    defaults = {}
-    if rc == 0:
-        for row in out.split('\n')[:-1]:
-            if row == 'No defaults set':
-                break
-            if row == 'Meta Attrs: rsc_defaults-options' or row == 'Meta Attrs: op_defaults-options':
-                continue
-            tmp = row.split(':') if ':' in row else row.split('=')
-            defaults[tmp[0].strip()] = tmp[1].lstrip()
-    else:
-        module.fail_json(msg='Failed to load resource defaults from cluster. Is cluster running?')
+    if module.params['set_id'] is not None:
+        run_defaults_set(module, pcs_full_version, cib_file)
+    defaults = get_resource_defaults(module, pcs_full_version, defaults_type, cib_file)
 
     result['detected_defaults'] = defaults
 
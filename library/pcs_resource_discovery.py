@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_resource_discovery
+short_description: "manage resource-discovery location constraints for many resources at once"
+description:
+  - "module for creating, updating and deleting 'resource-discovery' location constraints for map of resources
+     (or tags) and nodes on which they can be discovered (probed)"
+  - "Each resource gets single rule based location constraint with ID 'location-<resource>-resource-discovery'
+     (with '-<number>' suffix when such ID is already used) matching the nodes by their name ('#uname')."
+  - "All changes are done in one CIB update."
+version_added: "2.4"
+options:
+  state:
+    description:
+      - "'present' - ensure that resource-discovery constraints exist as defined in I(discovery_map)"
+      - "'absent' - ensure that resource-discovery constraints for resources from I(discovery_map) don't exist"
+    required: false
+    default: present
+    choices: ['present', 'absent']
+    type: str
+  discovery_map:
+    description:
+      - "dictionary with resource or tag name as key and list of nodes on which the resource can be discovered as value"
+      - "With I(state=absent) the value can be also C(null)."
+    required: true
+    type: dict
+  mode:
+    description:
+      - "'exclusive' - resource is probed (and can run) only on listed nodes ('resource-discovery=exclusive' constraint
+         for the listed nodes)"
+      - "'never' - resource is never probed on nodes that are not listed ('resource-discovery=never' constraint
+         for all other nodes, including nodes added to cluster later)"
+    required: false
+    default: exclusive
+    choices: ['exclusive', 'never']
+    type: str
+  score:
+    description:
+      - "score of the constraint rule, defaults to '0' for I(mode=exclusive) and '-INFINITY' for I(mode=never)"
+    required: false
+    type: str
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "resource discovery constraints should be used only on resources whose agents are really missing on other nodes"
+'''
+
+EXAMPLES = '''
+- name: probe database resources only on db nodes and web resources only on web nodes
+  pcs_resource_discovery:
+    discovery_map:
+      db-group: ['node1', 'node2']
+      web-tag: ['node3', 'node4', 'node5']
+
+- name: never probe resource resA on nodes other than node1 and node2
+  pcs_resource_discovery:
+    mode: 'never'
+    discovery_map:
+      resA: ['node1', 'node2']
+
+- name: remove resource discovery constraints of resA
+  pcs_resource_discovery:
+    state: 'absent'
+    discovery_map:
+      resA: []
+'''
+
+import re
+import xml.etree.ElementTree as ET
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    find_unique_id,
+    load_cib,
+    push_cib,
+    sanitize_id,
+)
+
+
+def constraint_signature(constraint):
+    # (resource-discovery, score, boolean-op, operation, nodes) of the '#uname' rule or None for other constraints
+    rules = constraint.findall('./rule')
+    if len(rules) != 1:
+        return None
+    expressions = list(rules[0])
+    if not expressions or any(e.tag != 'expression' or e.attrib.get('attribute') != '#uname' for e in expressions):
+        return None
+    operations = set(e.attrib.get('operation') for e in expressions)
+    if len(operations) != 1:
+        return None
+    return (
+        constraint.attrib.get('resource-discovery'),
+        rules[0].attrib.get('score'),
+        rules[0].attrib.get('boolean-op', 'and') if len(expressions) > 1 else None,
+        operations.pop(),
+        tuple(sorted(e.attrib.get('value') for e in expressions)),
+    )
+
+
+def build_constraint(cib, constraints, constraint_id, resource, mode, score, nodes):
+    constraint = ET.SubElement(constraints, 'rsc_location', {
+        'id': constraint_id,
+        'rsc': resource,
+        'resource-discovery': mode,
+    })
+    rule = ET.SubElement(constraint, 'rule', {
+        'id': find_unique_id(cib, constraint_id + '-rule'),
+        'score': score,
+        'boolean-op': 'or' if mode == 'exclusive' else 'and',
+    })
+    for node in nodes:
+        ET.SubElement(rule, 'expression', {
+            'id': find_unique_id(cib, rule.attrib.get('id') + '-expr'),
+            'attribute': '#uname',
+            'operation': 'eq' if mode == 'exclusive' else 'ne',
+            'value': node,
+        })
+    return constraint
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default="present", choices=['present', 'absent']),
+            discovery_map=dict(required=True, type='dict'),
+            mode=dict(required=False, default='exclusive', choices=['exclusive', 'never']),
+            score=dict(required=False),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    state = module.params['state']
+    discovery_map = module.params['discovery_map']
+    mode = module.params['mode']
+    score = module.params['score']
+    cib_file = module.params['cib_file']
+    if score is None:
+        score = '0' if mode == 'exclusive' else '-INFINITY'
+
+    result = {}
+
+    for resource, nodes in discovery_map.items():
+        # string would be silently used as list of its characters
+        if not isinstance(nodes, list) and not (state == 'absent' and nodes is None):
+            module.fail_json(msg="Nodes of resource '%s' must be a list, got: %s" % (resource, nodes))
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    current_cib_root = load_cib(module, cib_file)
+
+    resource_ids = set()
+    for tag in ['primitive', 'group', 'clone', 'master', 'bundle']:
+        for elem in current_cib_root.findall('./configuration/resources//' + tag):
+            resource_ids.add(elem.attrib.get('id'))
+    for elem in current_cib_root.findall('./configuration/tags/tag'):
+        resource_ids.add(elem.attrib.get('id'))
+
+    if state == 'present':
+        missing_resources = set(discovery_map.keys()) - resource_ids
+        if missing_resources:
+            module.fail_json(msg="Resources or tags not found in cluster configuration: %s" % ', '.join(sorted(missing_resources)))
+        empty = [resource for resource, nodes in discovery_map.items() if not nodes]
+        if empty:
+            module.fail_json(msg="Node list must not be empty for resources: %s" % ', '.join(sorted(empty)))
+
+    cib_constraints = current_cib_root.find('./configuration/constraints')
+    created, updated, deleted = [], [], []
+    for resource in sorted(discovery_map.keys()):
+        constraint_id = sanitize_id('location-%s-resource-discovery' % resource)
+        constraint = None
+        for constr in cib_constraints.findall('./rsc_location'):
+            # ID can have '-<number>' suffix when the ID was already used when the constraint was created
+            if (constr.attrib.get('rsc') == resource and constr.attrib.get('resource-discovery') is not None
+                    and re.match(r'^%s(-\d+)?$' % re.escape(constraint_id), constr.attrib.get('id', ''))):
+                constraint = constr
+                constraint_id = constr.attrib.get('id')
+                break
+
+        if state == 'absent':
+            if constraint is not None:
+                cib_constraints.remove(constraint)
+                deleted.append(constraint_id)
+            continue
+
+        nodes = sorted(set(discovery_map[resource]))
+        desired = (mode, score, ('or' if mode == 'exclusive' else 'and') if len(nodes) > 1 else None,
+                   'eq' if mode == 'exclusive' else 'ne', tuple(nodes))
+        if constraint is None:
+            constraint_id = find_unique_id(current_cib_root, constraint_id)
+            build_constraint(current_cib_root, cib_constraints, constraint_id, resource, mode, score, nodes)
+            created.append(constraint_id)
+        elif constraint_signature(constraint) != desired:
+            cib_constraints.remove(constraint)
+            build_constraint(current_cib_root, cib_constraints, constraint_id, resource, mode, score, nodes)
+            updated.append(constraint_id)
+
+    result.update({
+        'created_constraints': created,
+        'updated_constraints': updated,
+        'deleted_constraints': deleted,
+    })
+
+    if not (created or updated or deleted):
+        result['changed'] = False
+        module.exit_json(**result)
+
+    result['changed'] = True
+    if not module.check_mode:
+        push_cib(module, current_cib_root, cib_file, 'constraints')
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_scheduler_tuning
+short_description: "tune scheduler throughput cluster properties based on cluster size"
+description:
+  - "module for computing and setting 'batch-limit', 'migration-limit', 'node-action-limit' and 'cluster-recheck-interval'
+     cluster properties from number of cluster nodes and number of CPUs of nodes"
+  - "Number of nodes is taken from CIB 'nodes' section (remote and guest nodes are not counted). Number of CPUs is taken
+     from I(node_cpus), from 'cpu' utilization of nodes in CIB or from the node where module runs (in this order).
+     The smallest number of CPUs of all nodes is used."
+  - "'fast-recovery' profile - node-action-limit=2*CPUs, batch-limit=nodes*node-action-limit, migration-limit=-1
+     (unlimited, pacemaker default), cluster-recheck-interval=5min"
+  - "'conservative' profile - node-action-limit=CPUs, batch-limit=nodes*CPUs/2 (at least number of nodes),
+     migration-limit=1, cluster-recheck-interval=15min"
+  - "All changes are done in one CIB update, differences are shown in diff mode."
+version_added: "2.4"
+options:
+  profile:
+    description:
+      - tuning profile used to compute the property values
+    required: true
+    choices: ['fast-recovery', 'conservative']
+    type: str
+  node_cpus:
+    description:
+      - "dictionary with node name as key and number of its CPUs as value (for example from 'ansible_processor_vcpus' fact)"
+      - "Nodes without entry here and without 'cpu' utilization in CIB use number of CPUs of the node where module runs,
+         such nodes are listed in 'local_cpus_nodes' of the result and a warning is shown."
+    required: false
+    type: dict
+  overrides:
+    description:
+      - "dictionary of properties with values that are used instead of the computed ones, C(null) leaves the property untouched"
+    required: false
+    default: {}
+    type: dict
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "the computed values are starting point, re-run the module when nodes are added or removed to scale the values"
+'''
+
+EXAMPLES = '''
+- name: tune scheduler for fast recovery using CPU counts from facts
+  pcs_scheduler_tuning:
+    profile: 'fast-recovery'
+    node_cpus: "{{ dict(ansible_play_hosts | zip(ansible_play_hosts | map('extract', hostvars, 'ansible_processor_vcpus'))) }}"
+  run_once: true
+
+- name: conservative tuning without changing cluster-recheck-interval
+  pcs_scheduler_tuning:
+    profile: 'conservative'
+    overrides:
+      cluster-recheck-interval: null
+'''
+
+import multiprocessing
+import xml.etree.ElementTree as ET
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    load_cib,
+    node_kind,
+    push_cib,
+    update_nvset,
+)
+
+TUNED_PROPERTIES = ['batch-limit', 'migration-limit', 'node-action-limit', 'cluster-recheck-interval']
+
+
+def recommended_properties(profile, node_count, cpus):
+    if profile == 'fast-recovery':
+        node_action_limit = 2 * cpus
+        return {
+            'node-action-limit': str(node_action_limit),
+            'batch-limit': str(node_count * node_action_limit),
+            'migration-limit': '-1',
+            'cluster-recheck-interval': '5min',
+        }
+    return {
+        'node-action-limit': str(cpus),
+        'batch-limit': str(max(node_count, node_count * cpus // 2)),
+        'migration-limit': '1',
+        'cluster-recheck-interval': '15min',
+    }
+
+
+def node_utilization_cpus(node):
+    for nvpair in node.findall('./utilization/nvpair'):
+        if nvpair.attrib.get('name') == 'cpu':
+            try:
+                return int(nvpair.attrib.get('value'))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def properties_text(properties):
+    return ''.join('%s: %s\n' % (name, properties[name]) for name in TUNED_PROPERTIES if properties.get(name) is not None)
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            profile=dict(required=True, choices=['fast-recovery', 'conservative']),
+            node_cpus=dict(required=False, type='dict'),
+            overrides=dict(required=False, type='dict', default={}),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True
+    )
+
+    profile = module.params['profile']
+    node_cpus = module.params['node_cpus'] or {}
+    overrides = module.params['overrides']
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    cib = load_cib(module, cib_file)
+
+    nodes = [node for node in cib.findall('./configuration/nodes/node') if node_kind(cib, node) == 'cluster']
+    if not nodes:
+        module.fail_json(msg="No cluster nodes found in CIB 'nodes' section")
+
+    # CPUs of each node - explicitly given, from node utilization or from this node
+    cpus = {}
+    local_cpus_nodes = []
+    for node in nodes:
+        name = node.attrib.get('uname')
+        if node_cpus.get(name) is not None:
+            try:
+                cpus[name] = int(node_cpus[name])
+            except (TypeError, ValueError):
+                module.fail_json(msg="Number of CPUs of node '%s' is not a number: %s" % (name, node_cpus[name]))
+        elif node_utilization_cpus(node) is not None:
+            cpus[name] = node_utilization_cpus(node)
+        else:
+            cpus[name] = multiprocessing.cpu_count()
+            local_cpus_nodes.append(name)
+    if local_cpus_nodes:
+        module.warn("Number of CPUs of nodes %s is not known, using %d CPUs of this node instead, use 'node_cpus' to provide it"
+                    % (', '.join(local_cpus_nodes), multiprocessing.cpu_count()))
+    min_cpus = max(1, min(cpus.values()))
+
+    recommended = recommended_properties(profile, len(nodes), min_cpus)
+    for name, value in overrides.items():
+        recommended[name] = None if value is None else str(value)
+    requested = dict((name, value) for name, value in recommended.items() if value is not None)
+
+    crm_config = cib.find('./configuration/crm_config')
+    nvset = crm_config.find("./cluster_property_set[@id='cib-bootstrap-options']")
+    if nvset is None:
+        nvset = ET.SubElement(crm_config, 'cluster_property_set', {'id': 'cib-bootstrap-options'})
+    before = dict((nvpair.attrib.get('name'), nvpair.attrib.get('value')) for nvpair in nvset.findall('./nvpair'))
+
+    changes = update_nvset(cib, nvset, requested)
+    after = dict(before)
+    after.update(changes)
+
+    result.update({
+        'node_count': len(nodes),
+        'node_cpus': cpus,
+        'local_cpus_nodes': local_cpus_nodes,
+        'recommended_properties': requested,
+        'changed_properties': changes,
+        'changed': len(changes) > 0,
+    })
+    if module._diff:
+        result['diff'] = {
+            'before_header': 'crm_config',
+            'before': properties_text(before),
+            'after_header': 'crm_config',
+            'after': properties_text(after),
+        }
+
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file, 'crm_config')
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
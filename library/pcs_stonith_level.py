@@ -19,6 +19,7 @@ module: pcs_stonith_level
 short_description: "wrapper module for 'pcs stonith level'"
 description:
   - "module for creating and deleting stonith levels using 'pcs' utility"
+  - "With I(topology) the whole fencing topology of listed nodes is managed in one CIB update."
 version_added: "2.4"
 options:
   state:
@@ -32,27 +33,71 @@ options:
   level:
     description:
       - numerical stonith level (1-9)
-    required: true
+      - required unless I(topology) is used
+    required: false
     choices: [1, 2, 3, 4, 5, 6, 7, 8, 9]
     type: int
   node_name:
     description:
       - name of cluster node for this stonith level and stonith_device
-    required: true
+      - "one of I(node_name), I(target_pattern) or I(target_attribute) is required unless I(topology) is used"
+    required: false
+    type: str
+  target_pattern:
+    description:
+      - "regular expression matching names of cluster nodes for this stonith level ('target-pattern' in CIB)"
+      - Mutually exclusive with C(node_name) and C(target_attribute)
+    required: false
+    type: str
+  target_attribute:
+    description:
+      - "name of node attribute, this stonith level is used for nodes with node attribute I(target_attribute)=I(target_value)
+         ('target-attribute' and 'target-value' in CIB)"
+      - Mutually exclusive with C(node_name) and C(target_pattern)
+    required: false
     type: str
+  target_value:
+    description:
+      - value of node attribute I(target_attribute)
+      - required with I(target_attribute)
+    required: false
+    type: str
+  convert_node_levels:
+    description:
+      - "when creating stonith level with I(target_pattern) or I(target_attribute) remove all per-node stonith levels
+         with same level and stonith devices for nodes that are matched by the new stonith level"
+      - "Module fails when some of matched nodes has per-node stonith level with same level and different stonith devices."
+      - "Per-node levels are removed and new stonith level is created in one CIB update."
+    required: false
+    default: false
+    type: bool
   stonith_device:
     description:
       - name of existing stonith device
-    required: true
+      - "multiple devices can be specified as comma separated list, order of devices is significant"
+      - required unless I(topology) is used
+    required: false
     type: str
+  topology:
+    description:
+      - "dictionary with node name as key and list of levels as value, each level is list of stonith devices
+         (or string with comma separated stonith devices), first item of the list is level 1, second item level 2, ..."
+      - "'present' - fencing levels of listed nodes will be exactly as specified, other levels of listed nodes
+         are removed, levels of nodes not listed are not changed"
+      - "'absent' - listed levels with same devices are removed from listed nodes, empty list removes all levels of the node"
+      - Mutually exclusive with C(level), C(node_name), C(target_pattern), C(target_attribute) and C(stonith_device)
+    required: false
+    type: dict
   cib_file:
     description:
       - "Apply changes to specified file containing cluster CIB instead of running cluster."
       - "This module requires the file to already contain cluster configuration."
+      - "Changes are done directly in the file without calling 'pcs', IDs of new elements follow the 'pcs' ID scheme."
     required: false
     type: str
 notes:
    - when deleting the stonith level only exact match is being deleted - same behaviour as pcs
+   - "I(target_pattern) is matched against node names by python regular expressions when converting per-node levels"
    - tested on CentOS 7.9/8.3
 '''
 
@@ -69,24 +114,181 @@ EXAMPLES = '''
     node_name: 'node-b'
     stonith_device: 'fence_xvm'
     state: 'absent'
+
+- name: use fence_ipmi as level 2 stonith device for all nodes with node attribute 'rack=r1'
+  pcs_stonith_level:
+    level: '2'
+    target_attribute: 'rack'
+    target_value: 'r1'
+    stonith_device: 'fence_ipmi'
+
+- name: replace per-node level 1 fence_kdump levels of nodes 'node-*' with single pattern based level
+  pcs_stonith_level:
+    level: '1'
+    target_pattern: 'node-.*'
+    stonith_device: 'fence_kdump'
+    convert_node_levels: true
+
+- name: define whole fencing topology of node-a and node-b
+  pcs_stonith_level:
+    topology:
+      node-a: [['fence_kdump'], ['fence_ipmi_a', 'fence_sbd']]
+      node-b: [['fence_kdump'], ['fence_ipmi_b', 'fence_sbd']]
+
+- name: remove all stonith levels of node-c
+  pcs_stonith_level:
+    state: 'absent'
+    topology:
+      node-c: []
 '''
 
-import os.path
+import re
 import xml.etree.ElementTree as ET
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    check_cib_references,
+    find_unique_id,
+    load_cib,
+    push_cib,
+    sanitize_id,
+)
+
+
+def level_target(params):
+    """Return (target attributes in CIB, target in 'pcs' syntax, part of ID used by 'pcs') for given module parameters."""
+    if params.get('target_pattern') is not None:
+        return ({'target-pattern': params['target_pattern']}, 'regexp%' + params['target_pattern'], params['target_pattern'])
+    if params.get('target_attribute') is not None:
+        return ({'target-attribute': params['target_attribute'], 'target-value': params['target_value']},
+                'attrib%%%s=%s' % (params['target_attribute'], params['target_value']), params['target_attribute'])
+    return ({'target': params['node_name']}, params['node_name'], params['node_name'])
+
+
+def has_target(flevel, target):
+    return all(flevel.attrib.get(attr) == target.get(attr)
+               for attr in ['target', 'target-pattern', 'target-attribute', 'target-value'])
+
+
+def create_fencing_level_element(cib, level, node_name, stonith_device, target=None, id_part=None):
+    """Create 'fencing-level' element with same ID as would 'pcs' create."""
+    topology = cib.find('./configuration/fencing-topology')
+    if topology is None:
+        topology = ET.SubElement(cib.find('./configuration'), 'fencing-topology')
+    attributes = {
+        'id': find_unique_id(cib, sanitize_id('fl-%s-%s' % (node_name if id_part is None else id_part, level))),
+        'index': str(level),
+        'devices': stonith_device,
+    }
+    attributes.update({'target': node_name} if target is None else target)
+    return ET.SubElement(topology, 'fencing-level', attributes)
+
+
+def matched_nodes(cib, target):
+    """Return names of nodes from CIB 'nodes' section matched by pattern or attribute based target."""
+    nodes = set()
+    for node in cib.findall('./configuration/nodes/node'):
+        if target.get('target-pattern') is not None:
+            if re.search(target['target-pattern'], node.attrib.get('uname', '')):
+                nodes.add(node.attrib.get('uname'))
+        elif target.get('target-attribute') is not None:
+            for nvpair in node.findall('./instance_attributes/nvpair'):
+                if nvpair.attrib.get('name') == target['target-attribute'] and nvpair.attrib.get('value') == target['target-value']:
+                    nodes.add(node.attrib.get('uname'))
+    return nodes
+
+
+def devices_string(devices):
+    # devices of one level are ordered comma separated list in CIB
+    if isinstance(devices, list):
+        return ','.join(str(device).strip() for device in devices)
+    return ','.join(device.strip() for device in str(devices).split(','))
+
+
+def run_topology(module, cib, cib_file):
+    state = module.params['state']
+    topology = module.params['topology']
+    result = {}
+
+    stonith_ids = set(elem.attrib.get('id') for elem in cib.findall("./configuration/resources//primitive[@class='stonith']"))
+    desired = {}
+    for node_name, levels in topology.items():
+        if levels is None:
+            levels = []
+        if not isinstance(levels, list):
+            module.fail_json(msg="Levels of node '%s' must be a list" % node_name)
+        if len(levels) > 9:
+            module.fail_json(msg="Node '%s' can have at most 9 stonith levels" % node_name)
+        for index, devices in enumerate(levels, 1):
+            devices = devices_string(devices)
+            missing = [device for device in devices.split(',') if device not in stonith_ids]
+            if state == 'present' and missing:
+                module.fail_json(msg="Stonith devices not found in cluster configuration: %s" % ', '.join(missing))
+            desired[(node_name, str(index))] = devices
+
+    # index of existing levels by (target, index), duplicated levels are removed
+    topology_element = cib.find('./configuration/fencing-topology')
+    existing = {}
+    created, updated, deleted = [], [], []
+    for flevel in ([] if topology_element is None else topology_element.findall('./fencing-level')):
+        if flevel.attrib.get('target') not in topology:
+            continue
+        key = (flevel.attrib.get('target'), flevel.attrib.get('index'))
+        if key in existing:
+            topology_element.remove(flevel)
+            deleted.append(flevel.attrib.get('id'))
+        else:
+            existing[key] = flevel
+
+    for key in sorted(existing.keys()):
+        flevel = existing[key]
+        node_name = key[0]
+        if state == 'absent':
+            if not topology[node_name] or desired.get(key) == flevel.attrib.get('devices'):
+                topology_element.remove(flevel)
+                deleted.append(flevel.attrib.get('id'))
+        elif key not in desired:
+            topology_element.remove(flevel)
+            deleted.append(flevel.attrib.get('id'))
+        elif desired[key] != flevel.attrib.get('devices'):
+            flevel.set('devices', desired[key])
+            updated.append(flevel.attrib.get('id'))
+
+    if state == 'present':
+        for key in sorted(set(desired.keys()) - set(existing.keys())):
+            flevel = create_fencing_level_element(cib, key[1], key[0], desired[key])
+            created.append(flevel.attrib.get('id'))
+
+    result.update({
+        'created_levels': created,
+        'updated_levels': updated,
+        'deleted_levels': deleted,
+        'changed': bool(created or updated or deleted),
+    })
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file)
+    module.exit_json(**result)
 
 
 def run_module():
     module = AnsibleModule(
         argument_spec=dict(
             state=dict(default="present", choices=['present', 'absent']),
-            level=dict(required=True, type='int', choices=[1, 2, 3, 4, 5, 6, 7, 8, 9]),
-            node_name=dict(required=True, type='str'),
-            stonith_device=dict(required=True, type='str'),
+            level=dict(required=False, type='int', choices=[1, 2, 3, 4, 5, 6, 7, 8, 9]),
+            node_name=dict(required=False, type='str'),
+            target_pattern=dict(required=False, type='str'),
+            target_attribute=dict(required=False, type='str'),
+            target_value=dict(required=False, type='str'),
+            convert_node_levels=dict(required=False, type='bool', default=False),
+            stonith_device=dict(required=False, type='str'),
+            topology=dict(required=False, type='dict'),
             cib_file=dict(required=False),
         ),
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_one_of=[('level', 'topology')],
+        required_together=[('level', 'stonith_device'), ('target_attribute', 'target_value')],
+        mutually_exclusive=[('node_name', 'target_pattern', 'target_attribute', 'topology'), ('level', 'topology'),
+                            ('stonith_device', 'topology')],
     )
 
     state = module.params['state']
@@ -97,46 +299,69 @@ def run_module():
 
     result = {}
 
+    if level is not None and node_name is None and module.params['target_pattern'] is None and module.params['target_attribute'] is None:
+        module.fail_json(msg="one of node_name, target_pattern or target_attribute is required with level")
+
     pcs_path = module.get_bin_path('pcs', required=False)
     if pcs_path is None:
         module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
 
-    module.params['cib_file_param'] = ''
-    if cib_file is not None:
-        # use cib_file if specified
-        if os.path.isfile(cib_file):
-            try:
-                current_cib = ET.parse(cib_file)
-            except Exception as e:
-                module.fail_json(msg="Error encountered parsing the cib_file - %s" % (e))
-            current_cib_root = current_cib.getroot()
-            module.params['cib_file_param'] = '-f ' + cib_file
-        else:
-            module.fail_json(msg="%(cib_file)s is not a file or doesn't exists" % module.params)
-    else:
-        # get running cluster configuration
-        rc, out, err = module.run_command('pcs cluster cib')
-        if rc == 0:
-            current_cib_root = ET.fromstring(out)
-        else:
-            module.fail_json(msg='Failed to load cluster configuration', out=out, error=err)
+    current_cib_root = load_cib(module, cib_file)
+
+    if module.params['topology'] is not None:
+        run_topology(module, current_cib_root, cib_file)
+
+    target, module.params['target_param'], id_part = level_target(module.params)
 
     # try to find the fencing-level
     fencing_level = None
     fencing_levels = current_cib_root.findall("./configuration/fencing-topology/fencing-level")
     for flevel in fencing_levels:
-        # level must match all criteria (level, node_name, stonith_device)
+        # level must match all criteria (level, target, stonith_device)
         if (flevel.attrib.get('index') == str(level)
-                and flevel.attrib.get('target') == node_name
+                and has_target(flevel, target)
                 and flevel.attrib.get('devices') == stonith_device):
             fencing_level = flevel
             break
 
+    if state == 'present' and module.params['convert_node_levels'] and 'target' not in target:
+        # replace equivalent per-node levels with the pattern/attribute based one in one CIB update
+        nodes = matched_nodes(current_cib_root, target)
+        converted = [flevel for flevel in fencing_levels
+                     if flevel.attrib.get('target') in nodes
+                     and flevel.attrib.get('index') == str(level)
+                     and flevel.attrib.get('devices') == stonith_device]
+        # per-node levels with same index and other devices would be used instead of the new level
+        conflicting = [flevel for flevel in fencing_levels
+                       if flevel.attrib.get('target') in nodes
+                       and flevel.attrib.get('index') == str(level)
+                       and flevel.attrib.get('devices') != stonith_device]
+        if conflicting:
+            module.fail_json(msg="Per-node stonith levels %s have same level as the new stonith level but different stonith devices"
+                             % ', '.join(flevel.attrib.get('id') for flevel in conflicting), **result)
+        if converted:
+            for flevel in converted:
+                current_cib_root.find('./configuration/fencing-topology').remove(flevel)
+            if fencing_level is None:
+                check_cib_references(module, current_cib_root, stonith_devices=stonith_device.split(','))
+                fencing_level = create_fencing_level_element(current_cib_root, level, None, stonith_device, target, id_part)
+            result.update({
+                'changed': True,
+                'converted_levels': [flevel.attrib.get('id') for flevel in converted],
+                'fence_level_id': fencing_level.attrib.get('id'),
+            })
+            if not module.check_mode:
+                push_cib(module, current_cib_root, cib_file)
+            module.exit_json(**result)
+
     if fencing_level is not None:
         result.update({
             'fence_level_was_matched': True,
             'level': None if fencing_level is None else fencing_level.attrib.get('index'),
             'node_name': None if fencing_level is None else fencing_level.attrib.get('target'),
+            'target_pattern': None if fencing_level is None else fencing_level.attrib.get('target-pattern'),
+            'target_attribute': None if fencing_level is None else fencing_level.attrib.get('target-attribute'),
+            'target_value': None if fencing_level is None else fencing_level.attrib.get('target-value'),
             'devices': None if fencing_level is None else fencing_level.attrib.get('devices'),
             'fence_level_id': None if fencing_level is None else fencing_level.attrib.get('id'),
         })
@@ -144,13 +369,20 @@ def run_module():
         result.update({'fence_level_was_matched': False})
 
     # commands for creating/deleting stonith levels
-    cmd_create = 'pcs %(cib_file_param)s stonith level add %(level)s %(node_name)s %(stonith_device)s' % module.params
-    cmd_delete = 'pcs %(cib_file_param)s stonith level remove %(level)s %(node_name)s %(stonith_device)s' % module.params
+    cmd_create = 'pcs stonith level add %(level)s %(target_param)s %(stonith_device)s' % module.params
+    cmd_delete = 'pcs stonith level remove %(level)s %(target_param)s %(stonith_device)s' % module.params
 
     if state == 'present' and fencing_level is None:
         # stonith level should be present, but we don't see it in configuration - lets create it
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # change the cib_file directly without calling 'pcs'
+                check_cib_references(module, current_cib_root, nodes=[node_name] if node_name is not None else None,
+                                     stonith_devices=stonith_device.split(','))
+                create_fencing_level_element(current_cib_root, level, node_name, stonith_device, target, id_part)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_create)
             if rc == 0:
                 module.exit_json(**result)
@@ -165,6 +397,11 @@ def run_module():
         # stonith level should not be present but we have found something - lets remove that
         result['changed'] = True
         if not module.check_mode:
+            if cib_file is not None:
+                # remove the stonith level directly from cib_file without calling 'pcs'
+                current_cib_root.find('./configuration/fencing-topology').remove(fencing_level)
+                push_cib(module, current_cib_root, cib_file)
+                module.exit_json(**result)
             rc, out, err = module.run_command(cmd_delete)
             if rc == 0:
                 module.exit_json(**result)
@@ -0,0 +1,347 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_stonith_shared
+short_description: "manage one stonith device shared by many nodes"
+description:
+  - "module for creating, updating and deleting single stonith device that fences many nodes using 'pcmk_host_map'
+     or 'pcmk_host_list' instead of one stonith device per node"
+  - "Optionally replaces existing per-node stonith devices - they are removed, fencing levels using them are changed
+     to use the shared stonith device and constraints referencing removed devices are removed (references in constraint
+     sets are removed from the sets)."
+  - "When the shared stonith device is removed, it is also removed from fencing levels (levels without any device are
+     removed) and from constraints."
+  - "The shared stonith device is created, updated and deleted with 'pcs stonith' commands on a copy of CIB, so its fence
+     agent and options are validated by 'pcs'. References in fencing levels and constraints are changed directly in CIB.
+     All changes are done in one CIB update."
+version_added: "2.4"
+options:
+  state:
+    description:
+      - "'present' - ensure that shared stonith device exists with given options"
+      - "'absent' - ensure that shared stonith device doesn't exist"
+    required: false
+    default: present
+    choices: ['present', 'absent']
+    type: str
+  name:
+    description:
+      - name of the shared stonith device
+    required: true
+    type: str
+  resource_type:
+    description:
+      - fence agent of the shared stonith device (for example 'fence_ipmilan' or 'fence_vmware_soap')
+      - required with I(state=present)
+    required: false
+    type: str
+  options:
+    description:
+      - "dictionary of stonith device options common to all nodes (for example 'ip', 'username', 'password')"
+    required: false
+    default: {}
+    type: dict
+  host_map:
+    description:
+      - "dictionary with node name as key and port/plug of the node on the fence device as value ('pcmk_host_map')"
+      - Mutually exclusive with C(host_list)
+    required: false
+    type: dict
+  host_list:
+    description:
+      - "list of nodes that can be fenced by the stonith device ('pcmk_host_list')"
+      - Mutually exclusive with C(host_map)
+    required: false
+    type: list
+    elements: str
+  monitor_interval:
+    description:
+      - interval of the monitor operation of the shared stonith device
+    required: false
+    default: '60s'
+    type: str
+  replace_devices:
+    description:
+      - "list of per-node stonith devices that are replaced by the shared stonith device"
+      - "Devices are removed, they are replaced by the shared device in fencing levels and their location constraints are removed."
+    required: false
+    default: []
+    type: list
+    elements: str
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "the fence agent must support fencing of all listed nodes from one endpoint"
+'''
+
+EXAMPLES = '''
+- name: one fence_vmware_soap device for all virtual machines
+  pcs_stonith_shared:
+    name: 'fence-vcenter'
+    resource_type: 'fence_vmware_soap'
+    options:
+      ip: 'vcenter.example.com'
+      username: 'fence'
+      password: 'secret'
+      ssl_insecure: '1'
+    host_map:
+      node1: 'vm-node1'
+      node2: 'vm-node2'
+      node3: 'vm-node3'
+
+- name: replace per-node fence_vmware_soap devices with the shared one
+  pcs_stonith_shared:
+    name: 'fence-vcenter'
+    resource_type: 'fence_vmware_soap'
+    options:
+      ip: 'vcenter.example.com'
+      username: 'fence'
+      password: 'secret'
+    host_map:
+      node1: 'vm-node1'
+      node2: 'vm-node2'
+      node3: 'vm-node3'
+    replace_devices: ['fence-node1', 'fence-node2', 'fence-node3']
+'''
+
+try:
+    from shlex import quote
+except ImportError:
+    # python 2
+    from pipes import quote
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    load_cib,
+    push_cib,
+    run_pcs_on_cib,
+    to_cib_value,
+)
+
+
+def parse_host_map(host_map):
+    # 'node1:port1;node2:port2' (pacemaker accepts also spaces and commas as separators)
+    parsed = {}
+    for item in host_map.replace(',', ';').replace(' ', ';').split(';'):
+        if ':' in item:
+            node, port = item.split(':', 1)
+            parsed[node] = port
+    return parsed
+
+
+def find_primitive(cib, resource_id):
+    for primitive in cib.findall('./configuration/resources//primitive'):
+        if primitive.attrib.get('id') == resource_id:
+            return primitive
+    return None
+
+
+def options_string(options):
+    # empty value removes the option
+    return ' '.join(quote('%s=%s' % (key, '' if value is None else value)) for key, value in sorted(options.items()))
+
+
+def remove_constraint_references(cib, resource_ids):
+    """Remove constraints and resource references in constraint sets pointing to resource_ids.
+
+    Returns lists of removed and updated constraint IDs. Same as 'pcs resource delete' the references
+    are removed from sets, empty sets are removed and constraints without resources are removed.
+    """
+    removed = []
+    updated = []
+    constraints = cib.find('./configuration/constraints')
+    for constr in ([] if constraints is None else list(constraints)):
+        if any(constr.attrib.get(attr) in resource_ids for attr in ['rsc', 'with-rsc', 'first', 'then']):
+            constraints.remove(constr)
+            removed.append(constr.attrib.get('id'))
+            continue
+        resource_sets = constr.findall('./resource_set')
+        changed = False
+        for resource_set in resource_sets:
+            for resource_ref in resource_set.findall('./resource_ref'):
+                if resource_ref.attrib.get('id') in resource_ids:
+                    resource_set.remove(resource_ref)
+                    changed = True
+            if len(resource_set.findall('./resource_ref')) == 0:
+                constr.remove(resource_set)
+        if not changed:
+            continue
+        if len(constr.findall('./resource_set')) == 0:
+            constraints.remove(constr)
+            removed.append(constr.attrib.get('id'))
+        else:
+            updated.append(constr.attrib.get('id'))
+    return removed, updated
+
+
+def replace_level_devices(cib, devices, replacement=None):
+    """Replace devices in fencing levels with replacement device or remove them when replacement is None.
+
+    Returns lists of updated and removed fencing level IDs, levels without devices are removed.
+    """
+    updated = []
+    removed = []
+    topology = cib.find('./configuration/fencing-topology')
+    for flevel in ([] if topology is None else topology.findall('./fencing-level')):
+        level_devices = flevel.attrib.get('devices', '').split(',')
+        if not any(device in devices for device in level_devices):
+            continue
+        new_devices = []
+        for device in level_devices:
+            device = replacement if device in devices else device
+            if device is not None and device not in new_devices:
+                new_devices.append(device)
+        if new_devices:
+            flevel.set('devices', ','.join(new_devices))
+            updated.append(flevel.attrib.get('id'))
+        else:
+            topology.remove(flevel)
+            removed.append(flevel.attrib.get('id'))
+    return updated, removed
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default="present", choices=['present', 'absent']),
+            name=dict(required=True),
+            resource_type=dict(required=False),
+            options=dict(required=False, type='dict', default={}),
+            host_map=dict(required=False, type='dict'),
+            host_list=dict(required=False, type='list', elements='str'),
+            monitor_interval=dict(required=False, default='60s'),
+            replace_devices=dict(required=False, type='list', elements='str', default=[]),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True,
+        mutually_exclusive=[('host_map', 'host_list')],
+        required_if=[('state', 'present', ['resource_type'])],
+    )
+
+    state = module.params['state']
+    name = module.params['name']
+    resource_type = module.params['resource_type']
+    host_map = module.params['host_map']
+    host_list = module.params['host_list']
+    monitor_interval = module.params['monitor_interval']
+    replace_devices = [device for device in module.params['replace_devices'] if device != name]
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    cib = load_cib(module, cib_file)
+
+    primitive = find_primitive(cib, name)
+    if primitive is not None and primitive.attrib.get('class') != 'stonith':
+        module.fail_json(msg="Resource '%s' exists and it is not a stonith device" % name)
+
+    changes = {}
+    if state == 'absent':
+        if primitive is not None:
+            changes['removed_device'] = name
+            # remove all references to the device so the CIB stays valid
+            updated_levels, removed_levels = replace_level_devices(cib, [name])
+            removed_constraints, updated_constraints = remove_constraint_references(cib, [name])
+            for key, value in [('updated_levels', updated_levels), ('removed_levels', removed_levels),
+                               ('removed_constraints', removed_constraints), ('updated_constraints', updated_constraints)]:
+                if value:
+                    changes[key] = value
+            cib = run_pcs_on_cib(module, cib, ['stonith delete ' + quote(name)])
+    else:
+        # desired instance attributes of the shared device
+        requested = dict((key, to_cib_value(value)) for key, value in module.params['options'].items())
+        if host_map is not None:
+            requested['pcmk_host_map'] = ';'.join('%s:%s' % (node, port) for node, port in sorted(host_map.items()))
+            requested['pcmk_host_list'] = None
+        if host_list is not None:
+            requested['pcmk_host_list'] = ' '.join(sorted(host_list))
+            requested['pcmk_host_map'] = None
+
+        device_cmds = []
+        if primitive is None:
+            device_cmds.append('stonith create %s %s %s op monitor interval=%s' % (
+                quote(name), quote(resource_type), options_string(dict((key, value) for key, value in requested.items() if value is not None)),
+                quote(monitor_interval)))
+            changes['created_device'] = name
+        elif primitive.attrib.get('type') != resource_type:
+            module.fail_json(msg="Stonith device '%s' exists with different fence agent '%s'" % (name, primitive.attrib.get('type')))
+        else:
+            current = dict((nvpair.attrib.get('name'), nvpair.attrib.get('value'))
+                           for nvpair in primitive.findall('./instance_attributes/nvpair'))
+            # same host map in different order is not a change
+            if (requested.get('pcmk_host_map') is not None and current.get('pcmk_host_map') is not None
+                    and parse_host_map(requested['pcmk_host_map']) == parse_host_map(current['pcmk_host_map'])):
+                del requested['pcmk_host_map']
+            if (requested.get('pcmk_host_list') is not None and current.get('pcmk_host_list') is not None
+                    and sorted(requested['pcmk_host_list'].split()) == sorted(current['pcmk_host_list'].replace(',', ' ').split())):
+                del requested['pcmk_host_list']
+            updated_options = dict((key, value) for key, value in requested.items() if current.get(key) != value)
+            update_cmd = ''
+            if updated_options:
+                # don't expose the values as they usually contain passwords
+                changes['updated_options'] = sorted(updated_options.keys())
+                update_cmd += ' ' + options_string(updated_options)
+            monitor = primitive.find("./operations/op[@name='monitor']")
+            if monitor is None or monitor.attrib.get('interval') != monitor_interval:
+                changes['monitor_interval'] = monitor_interval
+                update_cmd += ' op monitor interval=' + quote(monitor_interval)
+            if update_cmd:
+                device_cmds.append('stonith update ' + quote(name) + update_cmd)
+        if device_cmds:
+            cib = run_pcs_on_cib(module, cib, device_cmds)
+
+        # replace the per-node stonith devices
+        existing_devices = [device for device in replace_devices if find_primitive(cib, device) is not None]
+        for device in existing_devices:
+            if find_primitive(cib, device).attrib.get('class') != 'stonith':
+                module.fail_json(msg="Resource '%s' from replace_devices is not a stonith device" % device)
+        if existing_devices:
+            changes['removed_devices'] = existing_devices
+
+        updated_levels, removed_levels = replace_level_devices(cib, replace_devices, name)
+        removed_constraints, updated_constraints = remove_constraint_references(cib, replace_devices)
+        for key, value in [('updated_levels', updated_levels), ('removed_constraints', removed_constraints),
+                           ('updated_constraints', updated_constraints)]:
+            if value:
+                changes[key] = value
+        if existing_devices:
+            cib = run_pcs_on_cib(module, cib, ['stonith delete ' + quote(device) for device in existing_devices])
+
+    result.update(changes)
+    result['changed'] = len(changes) > 0
+    if result['changed'] and not module.check_mode:
+        push_cib(module, cib, cib_file)
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
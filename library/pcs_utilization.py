@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.1',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+DOCUMENTATION = '''
+---
+author: "Ondrej Famera (@OndrejHome)"
+module: pcs_utilization
+short_description: "manage node and resource utilization and placement-strategy"
+description:
+  - "module for setting and unsetting 'utilization' attributes of nodes (capacity) and resources (requirements)
+     and 'placement-strategy' cluster property"
+  - "All changes are done in one CIB update."
+version_added: "2.4"
+options:
+  state:
+    description:
+      - "'present' - ensure that utilization attributes have given values, attributes with value C(null) are unset"
+      - "'absent' - ensure that listed utilization attributes are unset"
+    required: false
+    default: present
+    choices: ['present', 'absent']
+    type: str
+  node_utilization:
+    description:
+      - "dictionary with node name as key and dictionary of utilization attributes (for example 'cpu', 'memory') as value"
+    required: false
+    type: dict
+  resource_utilization:
+    description:
+      - "dictionary with resource name as key and dictionary of utilization attributes (for example 'cpu', 'memory') as value"
+    required: false
+    type: dict
+  discover_local_node:
+    description:
+      - "set 'cpu' (number of CPUs) and 'memory' (MiB of memory) utilization of the node on which module runs
+         (node name is obtained from 'crm_node -n'), explicit values from I(node_utilization) take precedence"
+    required: false
+    default: false
+    type: bool
+  placement_strategy:
+    description:
+      - "value of 'placement-strategy' cluster property, utilization is used only with strategy other than 'default'"
+    required: false
+    choices: ['default', 'utilization', 'minimal', 'balanced']
+    type: str
+  cib_file:
+    description:
+      - "Apply changes to specified file containing cluster CIB instead of running cluster."
+      - "This module requires the file to already contain cluster configuration."
+    required: false
+    type: str
+notes:
+   - "utilization can be set only on primitive resources"
+   - "with I(discover_local_node) the module must run on each node (without 'run_once') so each node updates only its own capacity,
+      utilization of the local node is changed with 'crm_attribute' so the nodes can run the module at the same time"
+   - "CIB is pushed only with scope of the changed section ('nodes', 'resources' or 'crm_config') when only one section changes"
+'''
+
+EXAMPLES = '''
+- name: set capacity of nodes from facts and balance resources by utilization
+  pcs_utilization:
+    node_utilization:
+      node1:
+        cpu: "{{ hostvars['node1']['ansible_processor_vcpus'] }}"
+        memory: "{{ hostvars['node1']['ansible_memtotal_mb'] }}"
+      node2:
+        cpu: "{{ hostvars['node2']['ansible_processor_vcpus'] }}"
+        memory: "{{ hostvars['node2']['ansible_memtotal_mb'] }}"
+    placement_strategy: 'balanced'
+  run_once: true
+
+- name: set requirements of resources
+  pcs_utilization:
+    resource_utilization:
+      db: {cpu: 2, memory: 4096}
+      web: {cpu: 1, memory: 1024}
+  run_once: true
+
+- name: set capacity of each node from its CPUs and memory
+  pcs_utilization:
+    discover_local_node: true
+
+- name: balance resources by utilization
+  pcs_utilization:
+    placement_strategy: 'balanced'
+  run_once: true
+'''
+
+import multiprocessing
+import xml.etree.ElementTree as ET
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.pcs_utils import (
+    find_unique_id,
+    load_cib,
+    push_cib,
+    to_cib_value,
+    update_nvset,
+)
+
+
+def local_memory_mb():
+    # MemTotal from /proc/meminfo is in kB
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def update_utilization(module, cib, elem, id_candidate, attributes):
+    state = module.params['state']
+    utilization = elem.find('./utilization')
+    if utilization is None:
+        utilization = ET.SubElement(elem, 'utilization', {'id': find_unique_id(cib, id_candidate)})
+    requested = dict((name, None if state == 'absent' else to_cib_value(value)) for name, value in (attributes or {}).items())
+    changes = update_nvset(cib, utilization, requested)
+    if len(utilization) == 0:
+        # don't leave empty utilization behind
+        elem.remove(utilization)
+    return changes
+
+
+def run_module():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default="present", choices=['present', 'absent']),
+            node_utilization=dict(required=False, type='dict'),
+            resource_utilization=dict(required=False, type='dict'),
+            discover_local_node=dict(required=False, type='bool', default=False),
+            placement_strategy=dict(required=False, choices=['default', 'utilization', 'minimal', 'balanced']),
+            cib_file=dict(required=False),
+        ),
+        supports_check_mode=True,
+        required_one_of=[('node_utilization', 'resource_utilization', 'discover_local_node', 'placement_strategy')],
+    )
+
+    state = module.params['state']
+    node_utilization = dict(module.params['node_utilization'] or {})
+    resource_utilization = module.params['resource_utilization'] or {}
+    placement_strategy = module.params['placement_strategy']
+    cib_file = module.params['cib_file']
+
+    result = {}
+
+    pcs_path = module.get_bin_path('pcs', required=False)
+    if pcs_path is None:
+        module.fail_json(msg="'pcs' executable not found. Install 'pcs'.")
+
+    local_node = None
+    local_utilization = {}
+    if module.params['discover_local_node']:
+        rc, out, err = module.run_command('crm_node -n')
+        if rc != 0:
+            module.fail_json(msg="Failed to detect name of local cluster node using 'crm_node -n'", output=out, error=err)
+        local_node = out.strip()
+        discovered = {'cpu': multiprocessing.cpu_count()}
+        if local_memory_mb() is not None:
+            discovered['memory'] = local_memory_mb()
+        discovered.update(node_utilization.get(local_node) or {})
+        result['discovered_utilization'] = {local_node: discovered}
+        if cib_file is None:
+            # module runs on all nodes at once, each node changes its own attributes with 'crm_attribute' instead
+            # of pushing the whole CIB so the nodes don't overwrite changes of each other
+            node_utilization.pop(local_node, None)
+            local_utilization = discovered
+        else:
+            node_utilization[local_node] = discovered
+
+    cib = load_cib(module, cib_file)
+
+    cib_nodes = dict((node.attrib.get('uname'), node) for node in cib.findall('./configuration/nodes/node'))
+    missing_nodes = set(node_utilization.keys()) - set(cib_nodes.keys())
+    if local_utilization and local_node not in cib_nodes:
+        missing_nodes.add(local_node)
+    if missing_nodes:
+        module.fail_json(msg="Nodes are not present in CIB 'nodes' section: %s" % ', '.join(sorted(missing_nodes)))
+    cib_primitives = dict((primitive.attrib.get('id'), primitive) for primitive in cib.findall('./configuration/resources//primitive'))
+    missing_resources = set(resource_utilization.keys()) - set(cib_primitives.keys())
+    if missing_resources:
+        module.fail_json(msg="Primitive resources not found in cluster configuration: %s" % ', '.join(sorted(missing_resources)))
+
+    changed_nodes = {}
+    local_cmds = []
+    if local_utilization:
+        current = dict((nvpair.attrib.get('name'), nvpair.attrib.get('value'))
+                       for nvpair in cib_nodes[local_node].findall('./utilization/nvpair'))
+        changes = {}
+        for name, value in sorted(local_utilization.items()):
+            value = None if state == 'absent' else to_cib_value(value)
+            if value is None and name in current:
+                local_cmds.append('crm_attribute --node %s --utilization --name %s --delete' % (local_node, name))
+                changes[name] = None
+            elif value is not None and current.get(name) != value:
+                local_cmds.append('crm_attribute --node %s --utilization --name %s --update %s' % (local_node, name, value))
+                changes[name] = value
+        if changes:
+            changed_nodes[local_node] = changes
+
+    cib_changed = False
+    for node_name, attributes in sorted(node_utilization.items()):
+        node = cib_nodes[node_name]
+        changes = update_utilization(module, cib, node, 'nodes-%s-utilization' % node.attrib.get('id'), attributes)
+        if changes:
+            changed_nodes[node_name] = changes
+            cib_changed = True
+
+    changed_resources = {}
+    for resource_name, attributes in sorted(resource_utilization.items()):
+        changes = update_utilization(module, cib, cib_primitives[resource_name], resource_name + '-utilization', attributes)
+        if changes:
+            changed_resources[resource_name] = changes
+
+    changed_properties = {}
+    if placement_strategy is not None:
+        crm_config = cib.find('./configuration/crm_config')
+        nvset = crm_config.find("./cluster_property_set[@id='cib-bootstrap-options']")
+        if nvset is None:
+            nvset = ET.SubElement(crm_config, 'cluster_property_set', {'id': 'cib-bootstrap-options'})
+        changed_properties = update_nvset(cib, nvset, {'placement-strategy': None if state == 'absent' else placement_strategy})
+        if len(nvset) == 0:
+            crm_config.remove(nvset)
+
+    result.update({
+        'changed_node_utilization': changed_nodes,
+        'changed_resource_utilization': changed_resources,
+        'changed_properties': changed_properties,
+        'changed': bool(changed_nodes or changed_resources or changed_properties),
+    })
+    if module.check_mode:
+        module.exit_json(**result)
+
+    for cmd in local_cmds:
+        rc, out, err = module.run_command(cmd)
+        if rc != 0:
+            module.fail_json(msg="Failed to change utilization of local node using command '" + cmd + "'", output=out, error=err, **result)
+    # push only the changed section so unrelated parts of configuration are not overwritten
+    changed_scopes = [scope for scope, changed in [('nodes', cib_changed), ('resources', changed_resources),
+                                                   ('crm_config', changed_properties)] if changed]
+    if len(changed_scopes) == 1:
+        push_cib(module, cib, cib_file, changed_scopes[0])
+    elif changed_scopes:
+        push_cib(module, cib, cib_file)
+
+    # END of module
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
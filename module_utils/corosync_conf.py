@@ -0,0 +1,180 @@
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Parser of corosync.conf shared by pcs-modules-2 modules.
+
+corosync.conf is parsed into nested dictionary - sections are dictionaries, options are strings. Sections that
+can be repeated ('node' in 'nodelist' and 'interface' in 'totem') are always lists, other sections become lists
+only when they are repeated in the file. Parsed result is cached in directory accessible only by the user running
+the module (root) and reused as long as modification time and 'config_version' of the file stay the same.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os
+import re
+import stat
+import tempfile
+
+COROSYNC_CONF_PATH = '/etc/corosync/corosync.conf'
+CACHE_DIR = '/var/cache/pcs-modules-2'
+CACHE_FILE_NAME = 'corosync-conf-cache.json'
+LIST_SECTIONS = {
+    'nodelist': ['node'],
+    'totem': ['interface'],
+}
+
+
+class CorosyncConfParseError(Exception):
+    pass
+
+
+def parse_corosync_conf(text):
+    """Return nested dictionary with sections and options of corosync.conf text."""
+    root = {}
+    # stack of (section name, section dictionary)
+    stack = [(None, root)]
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        # line can contain 'section {', 'section{', '}' or 'option: value'
+        while line:
+            if line.startswith('}'):
+                if len(stack) == 1:
+                    raise CorosyncConfParseError("unexpected '}' on line %d" % line_number)
+                stack.pop()
+                line = line[1:].strip()
+                continue
+            match = re.match(r'^([^\s{}:]+)\s*\{(.*)$', line)
+            if match:
+                name = match.group(1)
+                parent_name, parent = stack[-1]
+                section = {}
+                if name in LIST_SECTIONS.get(parent_name, []):
+                    parent.setdefault(name, []).append(section)
+                elif name in parent:
+                    # repeated section that is not expected to repeat
+                    if not isinstance(parent[name], list):
+                        parent[name] = [parent[name]]
+                    parent[name].append(section)
+                else:
+                    parent[name] = section
+                stack.append((name, section))
+                line = match.group(2).strip()
+                continue
+            match = re.match(r'^([^\s{}:]+)\s*:\s*(.*?)\s*(\}.*)?$', line)
+            if match:
+                stack[-1][1][match.group(1)] = match.group(2)
+                line = (match.group(3) or '').strip()
+                continue
+            raise CorosyncConfParseError("cannot parse line %d: %s" % (line_number, line))
+    if len(stack) != 1:
+        raise CorosyncConfParseError("section '%s' is not closed" % stack[-1][0])
+    return root
+
+
+def _is_private(stat_result):
+    # cache is trusted only when nobody else than the user running the module can change it
+    return stat_result.st_uid == os.geteuid() and not stat_result.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+
+
+def _cache_dir():
+    """Return cache directory or None when it can't be created or is not private."""
+    try:
+        if not os.path.lexists(CACHE_DIR):
+            os.mkdir(CACHE_DIR, 0o700)
+        dir_stat = os.lstat(CACHE_DIR)
+    except (IOError, OSError):
+        return None
+    if not stat.S_ISDIR(dir_stat.st_mode) or not _is_private(dir_stat):
+        return None
+    return CACHE_DIR
+
+
+def _read_cache(cache_dir):
+    try:
+        fd = os.open(os.path.join(cache_dir, CACHE_FILE_NAME), os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except (IOError, OSError):
+        return {}
+    with os.fdopen(fd, 'r') as cache_file:
+        file_stat = os.fstat(cache_file.fileno())
+        if not stat.S_ISREG(file_stat.st_mode) or not _is_private(file_stat):
+            return {}
+        try:
+            return json.load(cache_file)
+        except ValueError:
+            return {}
+
+
+def _write_cache(cache_dir, cache):
+    # write into temporary file (created with 0600 mode) and rename it so concurrent readers never see partial file
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'w') as cache_file:
+            json.dump(cache, cache_file)
+        os.rename(tmp_path, os.path.join(cache_dir, CACHE_FILE_NAME))
+    except (IOError, OSError):
+        pass
+
+
+def load_corosync_conf(path=COROSYNC_CONF_PATH, use_cache=True):
+    """Return parsed corosync.conf or None when the file doesn't exist, raises CorosyncConfParseError on invalid file."""
+    try:
+        mtime = os.stat(path).st_mtime
+        with open(path, 'r') as conf_file:
+            text = conf_file.read()
+    except (IOError, OSError):
+        return None
+    config_version = re.search(r'^\s*config_version\s*:\s*(\S+)', text, re.M)
+    config_version = config_version.group(1) if config_version else None
+
+    cache_dir = _cache_dir() if use_cache else None
+    if cache_dir is None:
+        return parse_corosync_conf(text)
+    cache = _read_cache(cache_dir)
+    entry = cache.get(path)
+    if entry and entry.get('mtime') == mtime and entry.get('config_version') == config_version:
+        return entry['conf']
+
+    conf = parse_corosync_conf(text)
+    cache[path] = {'mtime': mtime, 'config_version': config_version, 'conf': conf}
+    _write_cache(cache_dir, cache)
+    return conf
+
+
+def get_options(section):
+    """Return only options (not subsections) from section."""
+    return dict((key, value) for key, value in (section or {}).items() if not isinstance(value, (dict, list)))
+
+
+def get_nodes(conf):
+    """Return list of nodes from 'nodelist' with 'name', 'nodeid', 'quorum_votes' and 'addrs' (link number -> address)."""
+    nodes = []
+    nodelist = (conf or {}).get('nodelist') or {}
+    for node in nodelist.get('node', []):
+        addrs = {}
+        for key, value in node.items():
+            match = re.match(r'^ring(\d+)_addr$', key)
+            if match:
+                addrs[int(match.group(1))] = value
+        nodes.append({
+            # pcs-0.10+ uses 'name', older configurations have only ring0_addr
+            'name': node.get('name', addrs.get(0)),
+            'nodeid': node.get('nodeid'),
+            'quorum_votes': int(node.get('quorum_votes', 1)),
+            'addrs': addrs,
+        })
+    return nodes
+
+
+def get_quorum_device(conf):
+    """Return 'device' subsection of 'quorum' section or None when there is no quorum device."""
+    quorum = (conf or {}).get('quorum') or {}
+    device = quorum.get('device')
+    if isinstance(device, list):
+        device = device[-1]
+    return device
@@ -0,0 +1,402 @@
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Shared helpers for pcs-modules-2 modules.
+
+Functions returning cluster configuration (properties, node attributes, resource defaults) return
+the same structured data no matter whether it was obtained from 'pcs ... --output-format=json'
+(pcs-0.11.5 and newer) or directly from CIB (older pcs or when JSON output is not available).
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import os.path
+import re
+import tempfile
+import xml.etree.ElementTree as ET
+
+# first pcs version with '--output-format=json' for 'property config' and 'resource [op] defaults config'
+PCS_JSON_OUTPUT_VERSION = (0, 11, 5)
+
+# CIB section name and name of the default nvset created by pcs for each defaults type
+DEFAULTS_SECTIONS = {
+    'meta': 'rsc_defaults',
+    'op': 'op_defaults',
+}
+
+# order of date-spec and duration parts in rules as written by 'pcs'
+DATE_PARTS_ORDER = ['years', 'weekyears', 'months', 'weeks', 'days', 'weekdays', 'yeardays', 'monthdays',
+                    'hours', 'minutes', 'seconds', 'moon']
+
+# resource elements that can be referenced by constraints
+CIB_RESOURCE_TAGS = ['primitive', 'group', 'clone', 'master', 'bundle']
+
+# values of 'type' attribute of cluster nodes in CIB 'nodes' section, 'normal' is used by old pacemaker versions
+CIB_CLUSTER_NODE_TYPES = ['member', 'normal']
+
+# first CIB schema using 'Promoted'/'Unpromoted' roles, older schemas use the legacy names
+CIB_PROMOTED_ROLES_SCHEMA = (3, 7)
+LEGACY_ROLES = {
+    'Promoted': 'Master',
+    'Unpromoted': 'Slave',
+}
+
+
+def version_tuple(version_string):
+    """Convert version like '0.11.7' or '0.10.8.1-redhat' into tuple of integers."""
+    return tuple(int(part) for part in re.findall(r"\d+", version_string.split('-')[0].split('+')[0]))
+
+
+def get_pcs_version(module):
+    """Return full version of installed 'pcs' as string."""
+    rc, out, err = module.run_command('pcs --version')
+    if rc != 0:
+        module.fail_json(msg="pcs --version exited with non-zero exit code (" + str(rc) + "): " + out + err)
+    return out.strip()
+
+
+def sanitize_id(id_candidate):
+    # same rules as 'pcs' is using - first character must be letter or '_', rest can contain also digits, '.' and '-'
+    if not id_candidate:
+        return id_candidate
+    return re.sub(r"[^a-zA-Z_]", "", id_candidate[0]) + re.sub(r"[^a-zA-Z0-9_.-]", "", id_candidate[1:])
+
+
+def find_unique_id(cib, candidate):
+    # same scheme as 'pcs' is using - append '-<number>' to ID until it is unique
+    used_ids = set(elem.attrib.get('id') for elem in cib.iter() if 'id' in elem.attrib)
+    unique_id = candidate
+    counter = 1
+    while unique_id in used_ids:
+        unique_id = '%s-%d' % (candidate, counter)
+        counter += 1
+    return unique_id
+
+
+def load_cib(module, cib_file=None):
+    """Return root element of CIB from cib_file or from running cluster."""
+    if cib_file is not None:
+        if not os.path.isfile(cib_file):
+            module.fail_json(msg="%s is not a file or doesn't exists" % cib_file)
+        try:
+            return ET.parse(cib_file).getroot()
+        except Exception as e:
+            module.fail_json(msg="Error encountered parsing the cib_file - %s" % (e))
+    rc, out, err = module.run_command('pcs cluster cib')
+    if rc != 0:
+        module.fail_json(msg='Failed to load cluster configuration', out=out, error=err)
+    return ET.fromstring(out)
+
+
+def push_cib(module, cib, cib_file=None, scope='configuration'):
+    """Write CIB into cib_file or push given scope of CIB into running cluster."""
+    new_cib = ET.ElementTree(cib)
+    # when we use cib_file then we can dump the changed CIB directly into file
+    if cib_file is not None:
+        try:
+            new_cib.write(cib_file)
+        except Exception as e:
+            module.fail_json(msg="Error encountered writing result to cib_file - %s" % (e))
+        return
+    # when not using cib_file then we continue preparing changes for cib-push into running cluster
+    new_cib_fd, new_cib_path = tempfile.mkstemp()
+    module.add_cleanup_file(new_cib_path)
+    new_cib.write(new_cib_path)
+    push_cmd = 'pcs cluster cib-push scope=' + scope + ' ' + new_cib_path
+    rc, out, err = module.run_command(push_cmd)
+    if rc != 0:
+        module.fail_json(msg="Failed to push updated configuration to cluster using command '" + push_cmd + "'", output=out, error=err)
+
+
+def run_pcs_on_cib(module, cib, cmds):
+    """Run 'pcs -f' commands on a copy of CIB and return root element of the changed copy.
+
+    Commands are given without 'pcs -f <file>' prefix, for example 'stonith create ...'.
+    """
+    cib_copy_fd, cib_copy_path = tempfile.mkstemp()
+    os.close(cib_copy_fd)
+    module.add_cleanup_file(cib_copy_path)
+    ET.ElementTree(cib).write(cib_copy_path)
+    for cmd in cmds:
+        cmd = 'pcs -f %s %s' % (cib_copy_path, cmd)
+        rc, out, err = module.run_command(cmd)
+        if rc != 0:
+            module.fail_json(msg="Failed to change configuration using command '" + cmd + "'", output=out, error=err)
+    return ET.parse(cib_copy_path).getroot()
+
+
+def cib_resource_ids(cib):
+    """Return IDs of all resources (primitives, groups, clones and bundles) in CIB."""
+    return set(
+        elem.attrib.get('id') for elem in cib.findall('./configuration/resources//*')
+        if elem.tag in CIB_RESOURCE_TAGS
+    )
+
+
+def cib_stonith_ids(cib):
+    """Return IDs of all stonith devices in CIB."""
+    return set(
+        primitive.attrib.get('id') for primitive in cib.findall('./configuration/resources//primitive')
+        if primitive.attrib.get('class') == 'stonith'
+    )
+
+
+def cib_guest_node_names(cib):
+    """Return names of guest nodes defined by 'remote-node' meta attribute of resources."""
+    return set(
+        nvpair.attrib.get('value')
+        for nvpair in cib.findall("./configuration/resources//primitive/meta_attributes/nvpair[@name='remote-node']")
+    )
+
+
+def cib_node_names(cib):
+    """Return names of cluster nodes, remote nodes and guest nodes known to CIB."""
+    names = set(node.attrib.get('uname') for node in cib.findall('./configuration/nodes/node'))
+    for primitive in cib.findall('./configuration/resources//primitive'):
+        if (primitive.attrib.get('class'), primitive.attrib.get('provider'), primitive.attrib.get('type')) == ('ocf', 'pacemaker', 'remote'):
+            names.add(primitive.attrib.get('id'))
+    return names | cib_guest_node_names(cib)
+
+
+def node_kind(cib, node):
+    """Return value of '#kind' node attribute ('cluster', 'remote' or 'container') for node from CIB 'nodes' section."""
+    node_type = node.attrib.get('type', 'member')
+    if node_type in CIB_CLUSTER_NODE_TYPES:
+        return 'cluster'
+    if node_type == 'remote' and node.attrib.get('uname') in cib_guest_node_names(cib):
+        return 'container'
+    return node_type
+
+
+def check_cib_references(module, cib, resources=None, nodes=None, stonith_devices=None):
+    """Fail when any of referenced resources, nodes or stonith devices doesn't exist in CIB.
+
+    'pcs -f' does the same check, so it is needed when modules change cib_file directly.
+    """
+    missing = []
+    for kind, requested, existing in [
+        ('resource', resources, cib_resource_ids),
+        ('node', nodes, cib_node_names),
+        ('stonith device', stonith_devices, cib_stonith_ids),
+    ]:
+        if not requested:
+            continue
+        existing_ids = existing(cib)
+        missing.extend("%s '%s'" % (kind, item) for item in requested if item not in existing_ids)
+    if missing:
+        module.fail_json(msg="Following items don't exist in CIB: %s" % ', '.join(missing))
+
+
+def cib_role(cib, role):
+    """Return role name used by CIB schema of given CIB, same as 'pcs' converts them."""
+    # 'pacemaker-next' and other schemas without number are the newest ones
+    schema_version = version_tuple(cib.attrib.get('validate-with', '').replace('pacemaker-', ''))
+    if schema_version and schema_version < CIB_PROMOTED_ROLES_SCHEMA:
+        return LEGACY_ROLES.get(role, role)
+    return normalize_role(role)
+
+
+def normalize_role(role):
+    """Return role name with 'Master'/'Slave' replaced by 'Promoted'/'Unpromoted' so roles can be compared."""
+    return dict((legacy, new) for new, legacy in LEGACY_ROLES.items()).get(role, role)
+
+
+def to_cib_value(value):
+    """Return value as string stored in CIB, YAML booleans are converted to 'true'/'false'."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def update_nvset(cib, nvset, requested):
+    """Set/unset (value None) nvpairs in nvset, returns dictionary of changed names with their new values."""
+    current = dict((nvpair.attrib.get('name'), nvpair) for nvpair in nvset.findall('./nvpair'))
+    changes = {}
+    for name, value in sorted(requested.items()):
+        if value is None:
+            if name in current:
+                nvset.remove(current[name])
+                changes[name] = None
+        elif name not in current:
+            ET.SubElement(nvset, 'nvpair', {
+                'id': find_unique_id(cib, nvset.attrib.get('id') + '-' + name),
+                'name': name,
+                'value': value,
+            })
+            changes[name] = value
+        elif current[name].attrib.get('value') != value:
+            current[name].set('value', value)
+            changes[name] = value
+    return changes
+
+
+def date_part_order(name):
+    if name in DATE_PARTS_ORDER:
+        return (DATE_PARTS_ORDER.index(name), name)
+    return (len(DATE_PARTS_ORDER), name)
+
+
+def date_parts_string(attributes):
+    """Return 'name=value' parts of date-spec or duration in the order used by 'pcs'."""
+    return ' '.join('%s=%s' % (name, attributes[name])
+                    for name in sorted((name for name in attributes if name != 'id'), key=date_part_order))
+
+
+def rule_to_string(rule):
+    """Return rule element in the same text form as used by 'pcs' ('as_string' in JSON output)."""
+    parts = []
+    for child in rule:
+        if child.tag == 'rule':
+            parts.append('(' + rule_to_string(child) + ')')
+        elif child.tag == 'rsc_expression':
+            agent = ':'.join(child.attrib.get(attr) for attr in ['class', 'provider', 'type'] if child.attrib.get(attr) is not None)
+            parts.append('resource ' + agent)
+        elif child.tag == 'op_expression':
+            op_string = 'op ' + child.attrib.get('name')
+            if child.attrib.get('interval') is not None:
+                op_string += ' interval=' + child.attrib.get('interval')
+            parts.append(op_string)
+        elif child.tag == 'expression':
+            operation = child.attrib.get('operation')
+            if operation in ['defined', 'not_defined']:
+                parts.append(operation + ' ' + child.attrib.get('attribute'))
+            else:
+                value = child.attrib.get('value')
+                if child.attrib.get('type') is not None:
+                    value = child.attrib.get('type') + ' ' + value
+                parts.append(' '.join([child.attrib.get('attribute'), operation, value]))
+        elif child.tag == 'date_expression':
+            operation = child.attrib.get('operation')
+            if operation == 'gt':
+                parts.append('date gt ' + child.attrib.get('start'))
+            elif operation == 'lt':
+                parts.append('date lt ' + child.attrib.get('end'))
+            elif operation == 'date_spec':
+                date_spec = child.find('./date_spec')
+                parts.append('date-spec ' + date_parts_string(date_spec.attrib))
+            else:
+                range_string = 'date in_range'
+                if child.attrib.get('start') is not None:
+                    range_string += ' ' + child.attrib.get('start')
+                range_string += ' to'
+                duration = child.find('./duration')
+                if duration is not None:
+                    range_string += ' duration ' + date_parts_string(duration.attrib)
+                else:
+                    range_string += ' ' + child.attrib.get('end')
+                parts.append(range_string)
+    return (' %s ' % rule.attrib.get('boolean-op', 'and')).join(parts)
+
+
+def normalize_rule_string(rule_string):
+    """Normalize whitespace, quotes and order of date-spec/duration parts of rule string so it can be compared."""
+    if rule_string is None:
+        return None
+    tokens = rule_string.replace('"', '').replace("'", '').split()
+    # parts of date-spec and duration can be written in any order, use the order used by 'pcs'
+    normalized = []
+    date_parts = []
+    for token in tokens + [None]:
+        if token is not None and '=' in token and token.split('=', 1)[0] in DATE_PARTS_ORDER:
+            date_parts.append(token)
+            continue
+        normalized.extend(sorted(date_parts, key=lambda part: date_part_order(part.split('=', 1)[0])))
+        date_parts = []
+        if token is not None:
+            normalized.append(token)
+    return ' '.join(normalized)
+
+
+def nvsets_from_cib(parent, tag):
+    """Return list of nvsets ({'id', 'rule', 'nvpairs'}) with given tag from CIB element."""
+    nvsets = []
+    if parent is None:
+        return nvsets
+    for nvset in parent.findall('./' + tag):
+        rule = nvset.find('./rule')
+        nvsets.append({
+            'id': nvset.attrib.get('id'),
+            'rule': None if rule is None else rule_to_string(rule),
+            'nvpairs': dict((nvpair.attrib.get('name'), nvpair.attrib.get('value')) for nvpair in nvset.findall('./nvpair')),
+        })
+    return nvsets
+
+
+def nvsets_from_json(json_nvsets):
+    """Return list of nvsets ({'id', 'rule', 'nvpairs'}) from 'pcs' JSON output."""
+    nvsets = []
+    for nvset in json_nvsets:
+        rule = nvset.get('rule')
+        nvsets.append({
+            'id': nvset.get('id'),
+            'rule': None if not rule else rule.get('as_string'),
+            'nvpairs': dict((nvpair.get('name'), nvpair.get('value')) for nvpair in nvset.get('nvpairs', [])),
+        })
+    return nvsets
+
+
+def run_pcs_json(module, cmd, cib_file=None):
+    """Run 'pcs' command with JSON output, returns parsed data or None if JSON output is not available."""
+    cib_file_param = '' if cib_file is None else '-f ' + cib_file + ' '
+    rc, out, err = module.run_command('pcs ' + cib_file_param + cmd + ' --output-format=json')
+    if rc != 0:
+        return None
+    try:
+        return json.loads(out)
+    except ValueError:
+        return None
+
+
+def get_cluster_properties(module, pcs_version, cib_file=None, cib=None):
+    """Return dictionary with cluster properties from 'cib-bootstrap-options' set."""
+    if cib is None and version_tuple(pcs_version) >= PCS_JSON_OUTPUT_VERSION:
+        data = run_pcs_json(module, 'property config', cib_file)
+        if data is not None:
+            for nvset in nvsets_from_json(data.get('nvsets', [])):
+                if nvset['id'] == 'cib-bootstrap-options':
+                    return nvset['nvpairs']
+            return {}
+    if cib is None:
+        cib = load_cib(module, cib_file)
+    for nvset in nvsets_from_cib(cib.find('./configuration/crm_config'), 'cluster_property_set'):
+        if nvset['id'] == 'cib-bootstrap-options':
+            return nvset['nvpairs']
+    return {}
+
+
+def get_node_attributes(module, cib_file=None, cib=None):
+    """Return dictionary with node names as keys and dictionary of node attributes as value."""
+    if cib is None:
+        cib = load_cib(module, cib_file)
+    node_attributes = {}
+    for node in cib.findall('./configuration/nodes/node'):
+        node_attributes[node.attrib.get('uname')] = {}
+        for nvset in nvsets_from_cib(node, 'instance_attributes'):
+            node_attributes[node.attrib.get('uname')].update(nvset['nvpairs'])
+    return node_attributes
+
+
+def get_defaults_sets(module, pcs_version, defaults_type, cib_file=None, cib=None):
+    """Return list of meta attributes nvsets from 'rsc_defaults' ('meta') or 'op_defaults' ('op') section."""
+    if cib is None and version_tuple(pcs_version) >= PCS_JSON_OUTPUT_VERSION:
+        cmd = 'resource defaults config' if defaults_type == 'meta' else 'resource op defaults config'
+        data = run_pcs_json(module, cmd, cib_file)
+        if data is not None:
+            return nvsets_from_json(data.get('meta_attributes', []))
+    if cib is None:
+        cib = load_cib(module, cib_file)
+    return nvsets_from_cib(cib.find('./configuration/' + DEFAULTS_SECTIONS[defaults_type]), 'meta_attributes')
+
+
+def get_resource_defaults(module, pcs_version, defaults_type, cib_file=None, cib=None):
+    """Return dictionary of resource defaults from the set managed by 'pcs resource [op] defaults'."""
+    # 'pcs' is managing the first set without rule
+    for nvset in get_defaults_sets(module, pcs_version, defaults_type, cib_file, cib):
+        if nvset['rule'] is None:
+            return nvset['nvpairs']
+    return {}
@@ -0,0 +1,105 @@
+# Copyright: (c) 2018, Ondrej Famera <ondrej-xa2iel8u@famera.cz>
+# GNU General Public License v3.0+ (see LICENSE-GPLv3.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# Apache License v2.0 (see LICENSE-APACHE2.txt or http://www.apache.org/licenses/LICENSE-2.0)
+
+"""Tests of concurrent token check of pcs_auth module against fake 'pcsd' running on localhost.
+
+Run from the top directory of the role with 'python -m unittest discover -s tests/unit', requires 'ansible'
+and 'openssl' (for the self-signed certificate of fake pcsd).
+"""
+
+import importlib.util
+import os.path
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+LIBRARY_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'library', 'pcs_auth.py')
+spec = importlib.util.spec_from_file_location('pcs_auth', LIBRARY_PATH)
+pcs_auth = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pcs_auth)
+
+CHECK_TIMEOUT = 1
+# response of fake pcsd for each token, 'hang' doesn't respond before the check times out
+TOKEN_RESPONSES = {
+    'good-token': 200,
+    'bad-token': 401,
+    'broken-token': 500,
+}
+
+
+class FakePcsdHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        token = (self.headers.get('Cookie') or '').replace('token=', '')
+        if token == 'hang-token':
+            time.sleep(CHECK_TIMEOUT * 3)
+            return
+        self.send_response(TOKEN_RESPONSES.get(token, 401) if self.path == '/remote/check_auth' else 404)
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePcsd(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class CheckAuthNodesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if shutil.which('openssl') is None:
+            raise unittest.SkipTest("'openssl' is needed for certificate of fake pcsd")
+        cls.tmpdir = tempfile.mkdtemp()
+        cert = os.path.join(cls.tmpdir, 'pcsd.crt')
+        key = os.path.join(cls.tmpdir, 'pcsd.key')
+        subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                               '-keyout', key, '-out', cert], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        cls.server = FakePcsd(('127.0.0.1', 0), FakePcsdHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        cls.server.socket = context.wrap_socket(cls.server.socket, server_side=True)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmpdir)
+
+    def known_hosts(self, tokens):
+        port = self.server.server_address[1]
+        return {'known_hosts': dict((node, {'token': token, 'dest_list': [{'addr': '127.0.0.1', 'port': port}]})
+                                    for node, token in tokens.items())}
+
+    def test_token_states(self):
+        tokens = {'n1': 'good-token', 'n2': 'bad-token', 'n3': 'broken-token'}
+        results = pcs_auth.check_auth_nodes('0.10', self.known_hosts(tokens), sorted(tokens.keys()), CHECK_TIMEOUT)
+        self.assertEqual(results, {'n1': 'authorized', 'n2': 'unauthorized', 'n3': 'error'})
+
+    def test_hanging_nodes_cost_one_timeout(self):
+        tokens = {'n1': 'hang-token', 'n2': 'hang-token', 'n3': 'hang-token', 'n4': 'good-token'}
+        start = time.time()
+        results = pcs_auth.check_auth_nodes('0.10', self.known_hosts(tokens), sorted(tokens.keys()), CHECK_TIMEOUT)
+        self.assertLess(time.time() - start, CHECK_TIMEOUT * 2)
+        self.assertEqual(results, {'n1': 'unreachable', 'n2': 'unreachable', 'n3': 'unreachable', 'n4': 'authorized'})
+
+    def test_pcs09_tokens(self):
+        # pcs-0.9 contacts node by its name
+        port = self.server.server_address[1]
+        tokens_data = {'tokens': {'localhost': 'bad-token'}, 'ports': {'localhost': port}}
+        results = pcs_auth.check_auth_nodes('0.9', tokens_data, ['localhost'], CHECK_TIMEOUT)
+        self.assertEqual(results, {'localhost': 'unauthorized'})
+
+
+if __name__ == '__main__':
+    unittest.main()